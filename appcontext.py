@@ -0,0 +1,102 @@
+import configparser
+import threading
+
+CONFIG_FILE = 'config.ini'
+
+
+class AppContext:
+    """Configuration and heavy clients of a run, created on first use instead of at import time.
+
+    Importing a module of the pipeline no longer reads config.ini, connects to Neo4j, loads the
+    Wikidata cache or wraps stdout for colorama. Commands take what they need from the context, so
+    e.g. `python main.py benchmark-stats` runs without credentials or a database, and a missing
+    section of config.ini only fails the command that actually uses it. The Gemini SDK is configured
+    by llmbackend.GeminiBackend on its first call in the same way.
+
+    Example:
+        >>> driver = app_context.neo4j_driver  # connects on first access, None if the connection failed
+        >>> api_key = app_context.config['nytimes']['api_key']
+    """
+
+    def __init__(self, config_file: str = CONFIG_FILE):
+        self.config_file = config_file
+        self._config = None
+        self._neo4j_driver = None
+        self._colorama_initialized = False
+        self._lock = threading.RLock()
+
+    @property
+    def config(self) -> configparser.ConfigParser:
+        """config.ini, read on first access. Missing files give an empty config."""
+        with self._lock:
+            if self._config is None:
+                self._config = configparser.ConfigParser()
+                self._config.read(self.config_file)
+            return self._config
+
+    @property
+    def neo4j_driver(self):
+        """Neo4j driver of the run, connected on first access, None if the connection failed."""
+        with self._lock:
+            if self._neo4j_driver is None:
+                self._neo4j_driver = self.connect_neo4j()
+            return self._neo4j_driver
+
+    def connect_neo4j(self):
+        """Establishes a new connection to the Neo4j database."""
+        from neo4j import GraphDatabase
+
+        try:
+            driver = GraphDatabase.driver(
+                self.config['neo4j']['uri'],
+                auth=(self.config['neo4j']['username'], self.config['neo4j']['password'])
+            )
+            driver.verify_connectivity()
+            print("Connection successful!")
+            return driver
+        except Exception as e:
+            print(f"Connection failed: {e}")
+            return None
+
+    async def connect_neo4j_async(self):
+        """Establishes a new asyncio connection to the Neo4j database, used by graphbuilder_async."""
+        from neo4j import AsyncGraphDatabase
+
+        try:
+            driver = AsyncGraphDatabase.driver(
+                self.config['neo4j']['uri'],
+                auth=(self.config['neo4j']['username'], self.config['neo4j']['password'])
+            )
+            await driver.verify_connectivity()
+            print("Async connection successful!")
+            return driver
+        except Exception as e:
+            print(f"Async connection failed: {e}")
+            return None
+
+    @property
+    def wikidata_cache(self):
+        """The process-wide WikidataCache, whose file is loaded on its first lookup."""
+        from wikidata.wikidataCache import wikidata_cache
+
+        return wikidata_cache
+
+    def init_colorama(self):
+        """Initializes colorama for colored output, once."""
+        with self._lock:
+            if not self._colorama_initialized:
+                import colorama
+
+                colorama.init()
+                self._colorama_initialized = True
+
+    def close(self):
+        """Closes the Neo4j driver if one was connected."""
+        with self._lock:
+            if self._neo4j_driver is not None:
+                self._neo4j_driver.close()
+                self._neo4j_driver = None
+
+
+# Context of the running process, see main.py
+app_context = AppContext()
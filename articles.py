@@ -1,73 +1,198 @@
 import json
-import configparser
-import google.generativeai as genai
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from typing import Dict, List, Optional
+
 import requests
-#from newspaper import Article
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-# Initialize the generative model
-model = genai.GenerativeModel("gemini-1.5-pro-latest")
-config = configparser.ConfigParser()
-config.read('config.ini')
-genai.configure(api_key=config['gemini']['api_key'])
+from appcontext import app_context
+from llmbackend import generate_text
 
 output_file_path = "files/benchmarking_data/real_articles_temp.json"
 
+NYT_SEARCH_URL = "https://api.nytimes.com/svc/search/v2/articlesearch.json"
+NYT_PAGE_SIZE = 10  # documents per result page of the Article Search API
+NYT_MAX_PAGE = 100  # the API refuses pages beyond this
+NYT_SOURCES = "\"The New York Times\",  \"International New York Times\", \"International Herald Tribune\""
+
+
+class ArticleFetcher:
+    """Fetches, scrapes and summarizes news articles with pooled connections and a bounded worker pool.
+
+    All requests share one requests.Session, so connections to the NYT API and to the article
+    pages are kept alive and reused, and failed requests (connection errors, 429 and 5xx answers)
+    are retried with backoff. Search requests are paginated beyond the first page of NYT_PAGE_SIZE
+    results and spaced by `min_request_interval` seconds across all threads, as the Article Search
+    API allows 5 requests per minute. Scraping a result page and summarizing it with the LLM runs
+    on `max_workers` threads, so the searches of the next company overlap with the downloads and
+    LLM calls of the previous ones.
+
+    Article text is extracted with newspaper4k when it is installed, otherwise from the <p>
+    elements of the page. Results whose page cannot be downloaded fall back to the abstract of
+    the search result.
+
+    Point `search_url` at a local nytstandin.NytStandInServer to run the pipeline offline.
+
+    Example:
+        >>> with ArticleFetcher(max_workers=8) as fetcher:
+        ...     real_articles = fetcher.generate_real_articles(["Adidas AG", "Airbus SE"], max_articles=20)
+        >>> fetcher.print_stats()
+    """
+
+    def __init__(self, max_workers: int = 8, pool_size: int = 16, search_url: str = NYT_SEARCH_URL,
+                 api_key: Optional[str] = None, min_request_interval: float = 12.0, timeout: float = 30.0,
+                 retries: int = 3):
+        self.max_workers = max_workers
+        self.search_url = search_url
+        self.api_key = api_key
+        self.min_request_interval = min_request_interval
+        self.timeout = timeout
+        self.stats = {"search requests": 0, "scraped": 0, "scrape failures": 0, "summarized": 0}
+        self._session = requests.Session()
+        retry = Retry(total=retries, backoff_factor=1.0, status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=("GET",))
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="article-fetch")
+        self._last_search = 0.0
+        self._search_lock = threading.Lock()  # spaces the search requests of all threads
+        self._stats_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def search(self, search_term: str, max_articles: int = 10) -> List[Dict]:
+        """Returns up to max_articles NYT search results (docs) for a search term, reading as many pages as needed."""
+        docs = []
+        page = 0
+        while len(docs) < max_articles and page < NYT_MAX_PAGE:
+            response = self._search_page(search_term, page)
+            page_docs = response.get("docs") or []
+            docs.extend(page_docs)
+            hits = (response.get("meta") or {}).get("hits")
+            if len(page_docs) < NYT_PAGE_SIZE or (hits is not None and (page + 1) * NYT_PAGE_SIZE >= hits):
+                break
+            page += 1
+        return docs[:max_articles]
+
+    def scrape(self, url: str) -> Optional[str]:
+        """Downloads an article page over the pooled session and returns its text, None if that fails."""
+        try:
+            response = self._session.get(url, timeout=self.timeout)
+            response.raise_for_status()
+            text = _extract_text(response.text, url)
+        except Exception as e:
+            print(f"An error occurred: {e}")
+            text = None
+        self._count("scraped" if text else "scrape failures")
+        return text
+
+    def fetch_articles(self, search_term: str, max_articles: int = 10) -> List[Dict]:
+        """Searches, then scrapes and summarizes the results on the worker pool; articles are in result order."""
+        return [future.result() for future in self._submit(search_term, max_articles)]
+
+    def generate_real_articles(self, companies: List[str], max_articles: int = 10) -> Dict[str, Dict[str, Dict]]:
+        """Builds the real articles JSON ({company: {"article_1": article, ...}}) for several companies.
+
+        The searches run one after the other in the calling thread, while the results found so far
+        are already being scraped and summarized by the workers.
+        """
+        pending = {}
+        for company in companies:
+            print(f"\nFetching articles for company: {company}")
+            pending[company] = self._submit(company, max_articles)
+
+        real_articles = {}
+        for company, futures in pending.items():
+            real_articles[company] = {f"article_{idx}": future.result() for idx, future in enumerate(futures, 1)}
+            print(f"Completed processing for company: {company} ({len(futures)} articles)")
+        print("All companies processed. Returning real articles JSON.")
+        return real_articles
+
+    def print_stats(self):
+        print(f"\n--- Article Fetch Statistics ---")
+        print(f"Search requests: {self.stats['search requests']}, scraped pages: {self.stats['scraped']} "
+              f"(failed: {self.stats['scrape failures']}), summarized articles: {self.stats['summarized']}")
+        print()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self._session.close()
+
+    def _submit(self, search_term: str, max_articles: int) -> List:
+        docs = self.search(search_term, max_articles)
+        print(f"Found {len(docs)} articles for {search_term}.")
+        return [self._executor.submit(self._process, news_item) for news_item in docs]
+
+    def _search_page(self, search_term: str, page: int) -> Dict:
+        params = {"q": search_term, "fq": f"source:({NYT_SOURCES})", "sort": "relevance", "page": page,
+                  "api-key": self.api_key or app_context.config['nytimes']['api_key']}
+        with self._search_lock:
+            wait = self._last_search + self.min_request_interval - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                response = self._session.get(self.search_url, params=params, timeout=self.timeout)
+            finally:
+                self._last_search = time.monotonic()
+        self._count("search requests")
+        response.raise_for_status()
+        return response.json()['response']
+
+    def _process(self, news_item: Dict) -> Dict:
+        """Scrapes and summarizes one search result into an article of the real articles JSON."""
+        print(f"Processing article: {news_item.get('snippet')}")
+        full_text = self.scrape(news_item['web_url']) or news_item.get('lead_paragraph') or news_item.get('abstract')
+        summary = preprocess_news(full_text)
+        self._count("summarized")
+        return {
+            "text": summary,
+            "source": news_item.get('source'),
+            "date": news_item.get('pub_date'),
+            "benchmarking": {
+                "model update triples": {
+                    "unchanged": [],
+                    "added": [],
+                    "deleted": []
+                },
+                "correct update": None,
+                "wikidata structure": None
+            }
+        }
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self.stats[key] += 1
+
 
 def scrape_article(url):
-    try:
-        # Initialize the article object
-        article = Article(url)
-        # Download and parse the article
-        article.download()
-        article.parse()
-        return article.text
-    except Exception as e:
-        print(f"An error occurred: {e}")
-        return None
+    """Returns the text of the article at url, None if it cannot be downloaded."""
+    with ArticleFetcher(max_workers=1) as fetcher:
+        return fetcher.scrape(url)
 
 
 def fetch_news(search_term, max_articles=10):
     """
-    Fetch news articles for a given search term from Google RSS feed.
+    Fetch news articles for a given search term from the NYT Article Search API.
 
     Args:
-        search_term (str): The search term for querying Google News RSS.
-        max_articles (int): Maximum number of articles to fetch.
+        search_term (str): The search term for querying the NYT Article Search API.
+        max_articles (int): Maximum number of articles to fetch, read from several result pages if needed.
 
     Returns:
         list: A list of dictionaries, each containing details of a news article.
     """
-    search_term = search_term.replace(" ", "+")
-    bugfree_sources = "\"The New York Times\",  \"International New York Times\", \"International Herald Tribune\""
-    bugfree_sources = bugfree_sources.replace(" ", "+")
-    articles = []
-    response = requests.get(
-        f"https://api.nytimes.com/svc/search/v2/articlesearch.json?q={search_term}&fq=source:({bugfree_sources})&sort=relevance&api-key={config['nytimes']['api_key']}")
-    data = response.json()['response']['docs']
-    # print(data)
-
-    if True:
-        print(f"Found {len(data)} articles.")
-        for news_item in data[:max_articles]:  # Limit the number of articles
-            print(f"Processing article: {news_item['snippet']}")
-            full_text = scrape_article(news_item['web_url'])
-            summary = preprocess_news(full_text)
-            article = {
-                "text": summary,
-                "source": news_item['source'],
-                "date": news_item['pub_date'],
-                "benchmarking": {
-                    "model update triples": {
-                        "unchanged": [],
-                        "added": [],
-                        "deleted": []
-                    },
-                    "correct update": None,
-                    "wikidata structure": None
-                }
-            }
-            articles.append(article)
-    else:
+    with ArticleFetcher() as fetcher:
+        articles = fetcher.fetch_articles(search_term, max_articles)
+    if not articles:
         print(f"No news found for the term: {search_term}")
     return articles
 
@@ -78,35 +203,25 @@ def preprocess_news(full_text):
     You are a summarization assistant. Your task is to access the full text of the article {full_text} and then summarize this article from this into a single sentence. Keep the main event and relevant company details. 
     
     """
-    result = model.generate_content(prompt, generation_config={"temperature": 0.2})
-    return result.text.strip()
+    result = generate_text(prompt, generation_config={"temperature": 0.2})
+    return result.strip()
 
 
-def generate_real_articles(companies):
+def generate_real_articles(companies, max_articles=10, max_workers=8):
     """
     Build a JSON structure for real articles.
 
     Args:
         companies (list): List of company names for which to fetch articles.
+        max_articles (int): Maximum number of articles per company.
+        max_workers (int): Threads scraping and summarizing articles concurrently.
 
     Returns:
         dict: A dictionary structured as real articles JSON.
     """
-    real_articles = {}
-
-    for company in companies:
-        print(f"\nFetching articles for company: {company}")
-        articles = fetch_news(company)  # Fetch news articles for the company
-        company_data = {company: {}}
-
-        for idx, article in enumerate(articles, 1):
-            article_key = f"article_{idx}"
-            print(f"Adding article {idx} to {company}'s data.")
-            company_data[company][article_key] = article  # Directly assign the article data
-
-        real_articles.update(company_data)
-        print(f"Completed processing for company: {company}")
-    print("All companies processed. Returning synthetic articles JSON.")
+    with ArticleFetcher(max_workers=max_workers) as fetcher:
+        real_articles = fetcher.generate_real_articles(companies, max_articles)
+    fetcher.print_stats()
     return real_articles
 
 
@@ -116,3 +231,42 @@ def save_to_json(data, filename=output_file_path):
     with open(filename, "w") as file:
         json.dump(data, file, indent=4)
     print("Data successfully saved.")
+
+
+"""functions below are helper functions"""
+
+
+class _ParagraphParser(HTMLParser):
+    """Collects the text of <p> elements, the fallback extraction without newspaper4k."""
+
+    def __init__(self):
+        super().__init__()
+        self.paragraphs = []
+        self._depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "p":
+            self._depth += 1
+            self.paragraphs.append("")
+
+    def handle_endtag(self, tag):
+        if tag == "p" and self._depth:
+            self._depth -= 1
+
+    def handle_data(self, data):
+        if self._depth:
+            self.paragraphs[-1] += data
+
+
+def _extract_text(html: str, url: str) -> Optional[str]:
+    try:
+        from newspaper import Article
+    except ImportError:
+        parser = _ParagraphParser()
+        parser.feed(html)
+        text = "\n\n".join(" ".join(paragraph.split()) for paragraph in parser.paragraphs if paragraph.strip())
+        return text or None
+    article = Article(url)
+    article.download(input_html=html)
+    article.parse()
+    return article.text or None
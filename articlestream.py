@@ -0,0 +1,237 @@
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from colorama import Fore, Style
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# (company, article key)
+ArticleKey = Tuple[str, str]
+
+# Source of the articles read from stdin in a ProgressStore
+STDIN_SOURCE = "-"
+
+
+class ProgressStore:
+    """Append-only record of the articles an ingestion run has finished, one JSON line per article.
+
+    Marking an article appends one short line and flushes it, so progress survives crashes and a
+    restarted run skips what was already done. Every line names the source the article was read from
+    (see iter_articles), and finished keys are only kept while a restart would read their source again:
+    once all articles of a spool file are finished, the file is moved to "done" and its keys are
+    released, and released keys are compacted out of the file on the next start. Memory and the file
+    therefore stay bounded by the spool files still pending, however long the stream runs. Articles
+    from stdin cannot be read again and are not kept at all.
+
+    Example:
+        >>> progress = ProgressStore("files/stream_progress.jsonl")
+        >>> progress.mark_done(("Adidas AG", "12"), status="updated")
+        >>> progress.is_done(("Adidas AG", "12"))
+        True
+    """
+
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self._done: Dict[str, Dict[ArticleKey, Dict]] = {}  # source -> finished key -> its line
+        self._reading: Dict[ArticleKey, List[str]] = {}  # key -> sources it was read from and is not finished
+        self._sources: Dict[str, Dict] = {}  # source -> {"pending": unfinished keys, "on_complete": callback}
+        self._lock = threading.Lock()
+        directory = os.path.dirname(filepath)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if os.path.exists(filepath):
+            self._load()
+        self._file = open(filepath, 'a', encoding='utf-8')
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(keys) for keys in self._done.values())
+
+    def is_done(self, key: ArticleKey) -> bool:
+        with self._lock:
+            return any(key in keys for keys in self._done.values())
+
+    def mark_done(self, key: ArticleKey, status: str = "done"):
+        """Records a finished article and releases its spool file once all of the file's articles are finished."""
+        with self._lock:
+            source = self._reading[key][0] if key in self._reading else ""
+            entry = {"company": key[0], "article_key": key[1], "status": status, "source": source,
+                     "time": str(datetime.now(timezone.utc))}
+            if source != STDIN_SOURCE:
+                self._done.setdefault(source, {})[key] = entry
+            self._write(entry)
+            self._finish(key)
+
+    def skip(self, key: ArticleKey):
+        """Finishes an article read by iter_articles without recording it, e.g. one about another company."""
+        with self._lock:
+            self._finish(key)
+
+    def track(self, key: ArticleKey, source: str):
+        """Called by iter_articles for every article it yields, see complete_source."""
+        with self._lock:
+            self._reading.setdefault(key, []).append(source)
+            self._sources.setdefault(source, {"pending": 0, "on_complete": None})["pending"] += 1
+
+    def complete_source(self, source: str, on_complete: Callable[[], None]):
+        """Calls on_complete and releases the source's keys once all articles read from it are finished.
+
+        Called by iter_articles when a spool file is fully read; on_complete moves the file to "done".
+        """
+        with self._lock:
+            state = self._sources.setdefault(source, {"pending": 0, "on_complete": None})
+            state["on_complete"] = on_complete
+            if not state["pending"]:
+                self._release(source)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def _load(self):
+        released = False
+        with open(self.filepath, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # a line cut off by a crash
+                if "released" in entry:
+                    self._done.pop(entry["released"], None)
+                    released = True
+                else:
+                    source = entry.get("source", "")
+                    self._done.setdefault(source, {})[(entry["company"], entry["article_key"])] = entry
+
+        if released:  # compact the file to the keys still needed
+            temp_file = f"{self.filepath}.tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                for keys in self._done.values():
+                    for entry in keys.values():
+                        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            os.replace(temp_file, self.filepath)
+
+    def _write(self, entry: Dict):
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def _finish(self, key: ArticleKey):
+        sources = self._reading.get(key)
+        if not sources:
+            return
+        source = sources.pop(0)
+        if not sources:
+            del self._reading[key]
+        state = self._sources[source]
+        state["pending"] -= 1
+        if not state["pending"] and state["on_complete"] is not None:
+            self._release(source)
+
+    def _release(self, source: str):
+        on_complete = self._sources.pop(source)["on_complete"]
+        on_complete()
+        self._done.pop(source, None)
+        self._write({"released": source, "time": str(datetime.now(timezone.utc))})
+
+
+def iter_articles(source: str, follow: bool = False, poll_seconds: float = 2.0,
+                  progress: Optional[ProgressStore] = None) -> Iterator[Tuple[ArticleKey, str]]:
+    """Yields ((company, article key), text) from a JSON Lines feed as the articles arrive.
+
+    Every line is an object with "company", "article_key" and "text". Lines that are not valid JSON or
+    miss a field are reported and skipped.
+
+    Args:
+        source: A .jsonl file, "-" for stdin, or a spool directory whose *.jsonl files are read in name
+            order. Spool files are moved to its "done" subdirectory once they are finished. Producers
+            should write a spool file under another name and rename it to *.jsonl once it is complete.
+        follow: Keep polling the spool directory for new files instead of stopping once it is empty
+        poll_seconds: Polling interval of a followed spool directory
+        progress: ProgressStore the consumer finishes every yielded article in, with mark_done or skip.
+            A spool file is then only moved to "done" once all its articles are finished, so articles
+            still queued for processing are read again after a crash. Without it, spool files are
+            moved as soon as they are fully read.
+    """
+    if source == "-":
+        yield from _iter_tracked(_iter_lines(sys.stdin, "stdin"), STDIN_SOURCE, progress)
+    elif os.path.isdir(source):
+        yield from _iter_spool(source, follow, poll_seconds, progress)
+    else:
+        with open(source, 'r', encoding='utf-8') as f:
+            yield from _iter_tracked(_iter_lines(f, source), source, progress)
+
+
+def write_articles_jsonl(json_filepath: str, jsonl_filepath: str, companies: Optional[list] = None) -> int:
+    """Converts an articles JSON file grouped by company (like the benchmarking data) to a JSON Lines feed.
+
+    Returns:
+        int: Number of articles written
+    """
+    with open(json_filepath, 'r', encoding='utf-8') as f:
+        articles_json = json.load(f)
+    count = 0
+    with open(jsonl_filepath, 'w', encoding='utf-8') as f:
+        for company, articles in articles_json.items():
+            if companies is not None and company not in companies:
+                continue
+            for article_key, article_data in articles.items():
+                f.write(json.dumps({"company": company, "article_key": article_key, "text": article_data["text"]},
+                                   ensure_ascii=False) + "\n")
+                count += 1
+    return count
+
+
+"""functions below are helper functions"""
+
+
+def _iter_lines(lines, source_name: str) -> Iterator[Tuple[ArticleKey, str]]:
+    for line_number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            entry = json.loads(line)
+            key, text = (entry["company"], str(entry["article_key"])), entry["text"]
+        except (json.JSONDecodeError, KeyError, TypeError) as e:
+            print(Fore.RED + f"Skipping invalid article in {source_name}, line {line_number}: {e}" + Style.RESET_ALL)
+            continue
+        yield key, text
+
+
+def _iter_tracked(articles: Iterator[Tuple[ArticleKey, str]], source: str,
+                  progress: Optional[ProgressStore]) -> Iterator[Tuple[ArticleKey, str]]:
+    for key, text in articles:
+        if progress is not None:
+            progress.track(key, source)
+        yield key, text
+
+
+def _iter_spool(directory: str, follow: bool, poll_seconds: float,
+                progress: Optional[ProgressStore]) -> Iterator[Tuple[ArticleKey, str]]:
+    done_directory = os.path.join(directory, "done")
+    os.makedirs(done_directory, exist_ok=True)
+    unfinished = set()  # spool files read completely whose articles are not all finished yet
+    while True:
+        filenames = sorted(name for name in os.listdir(directory)
+                           if name.endswith(".jsonl") and os.path.join(directory, name) not in unfinished)
+        if not filenames:
+            if not follow:
+                return
+            time.sleep(poll_seconds)
+            continue
+        for filename in filenames:
+            filepath = os.path.join(directory, filename)
+
+            def move_to_done(filepath=filepath, filename=filename):
+                os.replace(filepath, os.path.join(done_directory, filename))
+                unfinished.discard(filepath)
+
+            with open(filepath, 'r', encoding='utf-8') as f:
+                yield from _iter_tracked(_iter_lines(f, filepath), filepath, progress)
+            if progress is None:
+                move_to_done()
+            else:
+                unfinished.add(filepath)
+                progress.complete_source(filepath, move_to_done)
@@ -0,0 +1,391 @@
+import json
+import re
+import time
+from colorama import Fore, Style
+from typing import Dict, List, Optional
+
+from graphbuilder import LATEST_CUSTOM_ID_QUERY, RELATIONSHIP_LABELS
+from graphupdater import BATCH_CREATE_NODES_QUERY, BATCH_CREATE_RELATIONSHIPS_QUERY, BATCH_END_RELATIONSHIPS_QUERY, \
+    EXISTING_NODES_QUERY, classify_article, company_graph_name, update_company_neighbourhood
+from llmbackend import get_llm_backend
+from llmcache import llm_response_cache
+from neighbourhoodcache import NEIGHBOURHOOD_QUERY, NeighbourhoodCache
+from preclassifier import PreClassifier
+from tracing import tracer
+from typeresolver import NODE_LABEL_BY_NAME_QUERY
+
+GOLDEN_FILE = "files/benchmarking_data/synthetic_articles_benchmarked_manual.json"
+
+# Tracer spans of graphupdater reported by the harness, in pipeline order
+STAGES = ("classification", "triple retrieval", "change extraction", "sanity checks", "entity resolution",
+          "type determination", "node properties", "graph write")
+
+
+class InMemoryGraph:
+    """Stand-in for Neo4j in the benchmark harness, answering the queries of the updater from dicts.
+
+    Passed as the `driver` of graphupdater.update_company_neighbourhood (and of a NeighbourhoodCache),
+    it plays the part of a transaction: session_scope, execute_read and execute_write hand it to the
+    query helpers as it is, which call `run`. Only the statements the updater runs for an article are
+    understood, anything else raises a ValueError instead of silently answering wrong.
+
+    Nodes are kept across articles, so IDs the entity index learned from earlier writes stay valid;
+    seed only replaces the relationships of a company.
+    """
+
+    def __init__(self):
+        self.nodes = {}  # wikidata_id -> {"name", "label", "properties"}
+        self.relationships = {}  # rel_id -> {"type", "source", "target", "end_time", "quarantined"}
+        self._next_id = 0
+        self._handlers = [
+            (_query_pattern(NEIGHBOURHOOD_QUERY), self._neighbourhood),
+            (_query_pattern(NODE_LABEL_BY_NAME_QUERY), self._node_label),
+            (_query_pattern(LATEST_CUSTOM_ID_QUERY), self._latest_custom_id),
+            (_query_pattern(EXISTING_NODES_QUERY), self._existing_nodes),
+            (_query_pattern(BATCH_CREATE_NODES_QUERY, "label"), self._create_nodes),
+            (_query_pattern(BATCH_END_RELATIONSHIPS_QUERY), self._end_relationships),
+            (_query_pattern(BATCH_CREATE_RELATIONSHIPS_QUERY, "rel_type"), self._create_relationships),
+        ]
+
+    def seed(self, company: str, triples: List[Dict]):
+        """Replaces the relationships of a company by active relationships for the triples.
+
+        The relationships of the company and of the node_from nodes of the triples are removed first.
+        Nodes are looked up by name and created with a "HarnessID" if missing, labelled after the
+        relationship type (graphbuilder.RELATIONSHIP_LABELS).
+        """
+        names = {company} | {triple["node_from"] for triple in triples}
+        seeded_ids = {wikidata_id for wikidata_id, node in self.nodes.items() if node["name"] in names}
+        self.relationships = {rel_id: rel for rel_id, rel in self.relationships.items()
+                              if rel["source"] not in seeded_ids and rel["target"] not in seeded_ids}
+        self._node_id(company, "Company")
+        for triple in triples:
+            labels = RELATIONSHIP_LABELS.get(triple["relationship"], (None, None))
+            source, target = self._node_id(triple["node_from"], labels[0]), self._node_id(triple["node_to"], labels[1])
+            self.relationships[self._new_id("HarnessRel")] = {"type": triple["relationship"], "source": source,
+                                                             "target": target, "end_time": "NA",
+                                                             "quarantined": False}
+
+    def run(self, query: str, parameters: Optional[Dict] = None, **kwargs) -> "_Result":
+        parameters = dict(parameters or {}, **kwargs)
+        normalized = " ".join(query.split())
+        for pattern, handler in self._handlers:
+            match = pattern.fullmatch(normalized)
+            if match:
+                return _Result(handler(**match.groupdict(), **parameters))
+        raise ValueError(f"Query not supported by the in-memory graph: {normalized}")
+
+    def _neighbourhood(self, node_name: str) -> List[Dict]:
+        records = []
+        for node_id in [wikidata_id for wikidata_id, node in self.nodes.items() if node["name"] == node_name]:
+            incident = [(rel_id, rel) for rel_id, rel in self.relationships.items()
+                        if node_id in (rel["source"], rel["target"]) and not rel["quarantined"]]
+            for rel_id, rel in incident:
+                connected_id = rel["target"] if rel["source"] == node_id else rel["source"]
+                records.append({"node_id": node_id, "node_label": self.nodes[node_id]["label"], "rel_id": rel_id,
+                                "rel_type": rel["type"], "end_time": rel["end_time"],
+                                "outgoing": rel["source"] == node_id, "connected_id": connected_id,
+                                "connected_name": self.nodes[connected_id]["name"],
+                                "connected_label": self.nodes[connected_id]["label"]})
+            if not incident:
+                records.append({"node_id": node_id, "node_label": self.nodes[node_id]["label"], "rel_id": None,
+                                "rel_type": None, "end_time": None, "outgoing": None, "connected_id": None,
+                                "connected_name": None, "connected_label": None})
+        return records
+
+    def _node_label(self, name: str) -> List[Dict]:
+        return [{"label": node["label"]} for node in self.nodes.values() if node["name"] == name][:1]
+
+    def _latest_custom_id(self, starts_with: str) -> List[Dict]:
+        ids = [int(wikidata_id[len(starts_with):]) for wikidata_id in self.nodes
+               if wikidata_id.startswith(starts_with) and wikidata_id[len(starts_with):].isdigit()]
+        return [{"custom_id": max(ids)}] if ids else []
+
+    def _existing_nodes(self, wikidata_ids: List[str]) -> List[Dict]:
+        return [{"wikidata_id": wikidata_id} for wikidata_id in dict.fromkeys(wikidata_ids)
+                if wikidata_id in self.nodes]
+
+    def _create_nodes(self, label: str, nodes: List[Dict]) -> List[Dict]:
+        created = []
+        for properties in nodes:
+            if properties["wikidata_id"] not in self.nodes:
+                self.nodes[properties["wikidata_id"]] = {"name": properties.get("name"), "label": label,
+                                                         "properties": dict(properties)}
+                created.append({"wikidata_id": properties["wikidata_id"]})
+        return created
+
+    def _end_relationships(self, endings: List[Dict], end_time: str) -> List[Dict]:
+        ended = []
+        for ending in endings:
+            for rel_id, rel in self.relationships.items():
+                if rel["type"] == ending["rel_type"] and _is_active(rel) and \
+                        {rel["source"], rel["target"]} == {ending["source_id"], ending["target_id"]}:
+                    rel["end_time"] = end_time
+                    ended.append({"rel": dict(ending, rel_id=rel_id, end_time=end_time)})
+        return ended
+
+    def _create_relationships(self, rel_type: str, relationships: List[Dict], start_time: str) -> List[Dict]:
+        created = []
+        for row in relationships:
+            if row["source_id"] not in self.nodes or row["target_id"] not in self.nodes:
+                continue
+            if any(rel["type"] == rel_type and rel["source"] == row["source_id"] and
+                   rel["target"] == row["target_id"] and _is_active(rel) for rel in self.relationships.values()):
+                continue
+            rel_id = self._new_id("HarnessRel")
+            self.relationships[rel_id] = {"type": rel_type, "source": row["source_id"], "target": row["target_id"],
+                                          "start_time": start_time, "end_time": "NA", "quarantined": False}
+            created.append({"rel": dict(row, rel_id=rel_id)})
+        return created
+
+    def _node_id(self, name: str, label: Optional[str]) -> str:
+        for wikidata_id, node in self.nodes.items():
+            if node["name"] == name:
+                return wikidata_id
+        wikidata_id = self._new_id("HarnessID")
+        self.nodes[wikidata_id] = {"name": name, "label": label,
+                                   "properties": {"wikidata_id": wikidata_id, "name": name}}
+        return wikidata_id
+
+    def _new_id(self, prefix: str) -> str:
+        self._next_id += 1
+        return f"{prefix}{self._next_id}"
+
+
+class _Result:
+    """The part of a neo4j.Result the updater uses: iteration over the records, single() and consume()."""
+
+    def __init__(self, records: List[Dict]):
+        self._records = records
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def single(self) -> Optional[Dict]:
+        return self._records[0] if self._records else None
+
+    def consume(self):
+        return None
+
+
+def run_benchmark_harness(filepath: str = GOLDEN_FILE, companies: Optional[List[str]] = None,
+                          node_types: Optional[List[str]] = None, max_articles: Optional[int] = None,
+                          with_llm_sanity_check: bool = False, output_filepath: Optional[str] = None,
+                          with_preclassifier: bool = False) -> Dict:
+    """Scores the update pipeline against golden labels without a human in the loop and without Neo4j.
+
+    The golden labels are the "model update triples" of the articles whose update was judged correct
+    ("correct update" is true) in a benchmarked articles file. For every such article, an in-memory
+    graph (InMemoryGraph) is seeded with the triples the model was shown (the golden unchanged and
+    deleted triples), the article is classified like in graphupdater.update_neo4j_graph and updated by
+    graphupdater.update_company_neighbourhood against the in-memory graph, and the added, deleted and
+    unchanged triples it returns are compared with the golden ones. Latencies are those of the tracer
+    spans of the updater (STAGES).
+
+    With with_preclassifier, every article is also run through a preclassifier.PreClassifier (without
+    using its answer) to measure how often it resolves an article and how precise that is, both
+    against the LLM classification and against the golden labels (the company of the article and
+    the node types of the golden added and deleted triples, "None" if there are none).
+
+    Run it against the StubBackend or the LLM response cache (strict replay) to get reproducible
+    numbers offline; set wikidata_cache.offline to keep company names from being looked up online.
+
+    Args:
+        filepath: Benchmarked articles JSON file grouped by company
+        companies: Companies to classify against, defaults to all companies of the file
+        node_types: Node types to classify against, defaults to the target labels of RELATIONSHIP_LABELS
+        max_articles: Stop after this many scored articles
+        with_llm_sanity_check: Whether the updater runs llm_sanity_check in its sanity checks
+        output_filepath: Optional JSON file the report is written to
+        with_preclassifier: Whether the precision of the PreClassifier is measured
+
+    Returns:
+        dict: Report with "articles", "accuracy" (exact and per triple category), "change precision",
+            "change recall", "articles per second", "llm calls per article" and per stage "latency"
+            ({"p50", "p95"} in seconds), and "preclassifier" ({"resolved", "avoidance rate", "precision vs llm",
+            "precision vs golden"}) with with_preclassifier
+    """
+    with open(filepath, 'r', encoding='utf-8') as f:
+        articles_json = json.load(f)
+    companies = companies or list(articles_json)
+    node_types = node_types or sorted({labels[1] for labels in RELATIONSHIP_LABELS.values() if labels[1]})
+
+    graph = InMemoryGraph()
+    neighbourhood_cache = NeighbourhoodCache(graph)
+    preclassifier = PreClassifier(companies, node_types) if with_preclassifier else None
+    tracer.reset()
+    counts = {"articles": 0, "skipped": 0, "errors": 0, "exact": 0, "company": 0, "added": 0, "deleted": 0,
+              "unchanged": 0, "true positive changes": 0, "predicted changes": 0, "golden changes": 0,
+              "pre resolved": 0, "pre agrees with llm": 0, "pre correct": 0}
+    llm_calls_before = _llm_calls()
+    start_time = time.perf_counter()
+
+    for company, articles in articles_json.items():
+        if company not in companies:
+            continue
+        for article_key, article_data in articles.items():
+            if max_articles is not None and counts["articles"] >= max_articles:
+                break
+            benchmarking = article_data.get("benchmarking") or {}
+            golden = benchmarking.get("model update triples")
+            if not benchmarking.get("correct update") or not golden:
+                counts["skipped"] += 1
+                continue
+
+            counts["articles"] += 1
+            try:
+                result, is_company_correct = _run_article(article_data["text"], company, golden, companies,
+                                                          node_types, graph, neighbourhood_cache,
+                                                          with_llm_sanity_check, preclassifier, counts)
+            except Exception as e:
+                print(Fore.RED + f"Harness failed on {company} - {article_key}: {e}" + Style.RESET_ALL)
+                counts["errors"] += 1
+                result, is_company_correct = {"added": [], "deleted": [], "unchanged": []}, False
+            _score(result, golden, is_company_correct, counts)
+
+    elapsed = time.perf_counter() - start_time
+    report = _build_report(counts, tracer.summary(), elapsed, _llm_calls() - llm_calls_before,
+                           preclassifier is not None)
+    _print_report(report)
+    if output_filepath:
+        with open(output_filepath, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=4)
+    return report
+
+
+"""functions below are helper functions"""
+
+
+def _run_article(article: str, company: str, golden: Dict, companies: List[str], node_types: List[str],
+                 graph: InMemoryGraph, neighbourhood_cache: NeighbourhoodCache, with_llm_sanity_check: bool,
+                 preclassifier: Optional[PreClassifier], counts: Dict):
+    """Runs one article through the updater, returns ({"added", "deleted", "unchanged"}, whether the company was found).
+
+    The golden triples name the company like the graph does, by its Wikidata label. If an offline Wikidata cache
+    lacks that label, company_graph_name falls back to the listed name and the updater finds no triples, as it
+    would against Neo4j.
+    """
+    expected_company = company_graph_name(company)
+    graph.seed(expected_company, (golden.get("unchanged") or []) + (golden.get("deleted") or []))
+    neighbourhood_cache.invalidate()  # the seed replaced relationships outside of the updater
+
+    with tracer.span("classification"):
+        found_company, node_type = classify_article(article, list(companies), list(node_types), 1, 3)
+    if preclassifier is not None:
+        _score_preclassifier(preclassifier.classify(article), (found_company, node_type), expected_company, golden,
+                             counts)
+
+    added, deleted, unchanged = update_company_neighbourhood(article, found_company, node_type, list(node_types),
+                                                             graph, neighbourhood_cache,
+                                                             with_llm_sanity_check=with_llm_sanity_check)
+    return {"added": added or [], "deleted": deleted or [], "unchanged": unchanged or []}, \
+        found_company == expected_company
+
+
+def _score(result: Dict, golden: Dict, is_company_correct: bool, counts: Dict):
+    is_exact = True
+    for category in ("added", "deleted", "unchanged"):
+        is_equal = _triple_keys(result[category]) == _triple_keys(golden.get(category, []))
+        counts[category] += is_equal
+        is_exact = is_exact and is_equal
+    counts["exact"] += is_exact
+    counts["company"] += is_company_correct
+
+    predicted = {("added",) + key for key in _triple_keys(result["added"])} | \
+                {("deleted",) + key for key in _triple_keys(result["deleted"])}
+    expected = {("added",) + key for key in _triple_keys(golden.get("added", []))} | \
+               {("deleted",) + key for key in _triple_keys(golden.get("deleted", []))}
+    counts["true positive changes"] += len(predicted & expected)
+    counts["predicted changes"] += len(predicted)
+    counts["golden changes"] += len(expected)
+
+
+def _score_preclassifier(resolved: Optional[tuple], llm_classification: tuple, expected_company: str, golden: Dict,
+                         counts: Dict):
+    if resolved is None:
+        return
+    company, node_type = company_graph_name(resolved[0]), resolved[1]
+    golden_node_types = {RELATIONSHIP_LABELS.get(triple.get("relationship"), (None, None))[1]
+                         for triple in (golden.get("added") or []) + (golden.get("deleted") or [])} or {"None"}
+    counts["pre resolved"] += 1
+    counts["pre agrees with llm"] += (company, node_type) == tuple(llm_classification)
+    counts["pre correct"] += company == expected_company and node_type in golden_node_types
+
+
+def _build_report(counts: Dict, spans: Dict[str, Dict[str, float]], elapsed: float, llm_calls: int,
+                  with_preclassifier: bool = False) -> Dict:
+    articles = counts["articles"]
+    report = {
+        "articles": articles,
+        "skipped": counts["skipped"],
+        "errors": counts["errors"],
+        "accuracy": {key: counts[key] / articles if articles else 0.0
+                     for key in ("exact", "company", "added", "deleted", "unchanged")},
+        "change precision": _ratio(counts["true positive changes"], counts["predicted changes"]),
+        "change recall": _ratio(counts["true positive changes"], counts["golden changes"]),
+        "seconds": elapsed,
+        "articles per second": articles / elapsed if elapsed > 0 else 0.0,
+        "llm calls per article": llm_calls / articles if articles else 0.0,
+        "latency": {stage: {"p50": spans.get(stage, {}).get("p50", 0.0), "p95": spans.get(stage, {}).get("p95", 0.0)}
+                    for stage in STAGES},
+    }
+    if with_preclassifier:
+        report["preclassifier"] = {
+            "resolved": counts["pre resolved"],
+            "avoidance rate": _ratio(counts["pre resolved"], articles),
+            "precision vs llm": _ratio(counts["pre agrees with llm"], counts["pre resolved"]),
+            "precision vs golden": _ratio(counts["pre correct"], counts["pre resolved"]),
+        }
+    return report
+
+
+def _print_report(report: Dict):
+    print(Fore.LIGHTMAGENTA_EX + "\n=== Benchmark Harness ===" + Style.RESET_ALL)
+    print(f"Scored articles: {report['articles']} (skipped without golden labels: {report['skipped']}, "
+          f"errors: {report['errors']})")
+    accuracy = report["accuracy"]
+    print(f"Exact update accuracy: {accuracy['exact'] * 100:.1f}% (company {accuracy['company'] * 100:.1f}%, "
+          f"added {accuracy['added'] * 100:.1f}%, deleted {accuracy['deleted'] * 100:.1f}%, "
+          f"unchanged {accuracy['unchanged'] * 100:.1f}%)")
+    print(f"Changes: precision {report['change precision'] * 100:.1f}%, recall {report['change recall'] * 100:.1f}%")
+    print(f"Throughput: {report['articles per second']:.2f} articles/s, "
+          f"{report['llm calls per article']:.2f} LLM calls per article")
+    for stage, latency in report["latency"].items():
+        print(f"  {stage}: p50 {latency['p50'] * 1000:.1f}ms, p95 {latency['p95'] * 1000:.1f}ms")
+    if "preclassifier" in report:
+        pre = report["preclassifier"]
+        print(f"Pre-classifier: resolved {pre['resolved']} articles ({pre['avoidance rate'] * 100:.1f}%), "
+              f"precision {pre['precision vs golden'] * 100:.1f}% against the golden labels, "
+              f"{pre['precision vs llm'] * 100:.1f}% agreement with the LLM")
+
+
+def _llm_calls() -> int:
+    """LLM calls made so far, answered by the backend or the response cache."""
+    return get_llm_backend().calls + llm_response_cache.hits
+
+
+def _ratio(numerator: int, denominator: int) -> float:
+    return numerator / denominator if denominator else 0.0
+
+
+def _query_pattern(template: str, *fields: str) -> re.Pattern:
+    """Regex matching a query template (whitespace-normalized), format fields of the template become named groups."""
+    text = " ".join((template.format(**{field: f"HARNESSFIELD{field}" for field in fields}) if fields else
+                     template).split())
+    pattern = re.escape(text)
+    for field in fields:
+        pattern = pattern.replace(f"HARNESSFIELD{field}", f"(?P<{field}>[^`]+)", 1)
+        pattern = pattern.replace(f"HARNESSFIELD{field}", f"(?P={field})")
+    return re.compile(pattern)
+
+
+def _is_active(rel: Dict) -> bool:
+    return rel["end_time"] in (None, "NA") and not rel["quarantined"]
+
+
+def _triple_key(triple: Dict):
+    return triple.get("node_from"), triple.get("relationship"), triple.get("node_to")
+
+
+def _triple_keys(triples: List[Dict]) -> set:
+    return {_triple_key(triple) for triple in triples or []}
@@ -0,0 +1,338 @@
+import asyncio
+import json
+import statistics
+import subprocess
+import sys
+import time
+from typing import List, Dict, Callable, Optional, Tuple
+
+from colorama import Fore, Style
+
+from entityindex import EntityIndex
+from entitymatcher import NgramMatcher
+from graphbuilder import find_node_by_wikidata_id, get_relationship_triples
+from graphbuilder_async import find_nodes_by_wikidata_ids_async, get_relationship_triples_for_companies_async
+from graphupdater import update_neo4j_graph, update_neo4j_graph_batch
+from llmcache import llm_response_cache
+from main import connect_to_neo4j, connect_to_neo4j_async
+from neighbourhoodcache import NeighbourhoodCache
+from wikidata.wikidata import wikidata_wbsearchentities
+from wikidata.wikidataCache import WikidataCache
+
+
+def benchmark_sync_vs_async(wikidata_ids: List[str], companies: List[str], repetitions: int = 3) -> Dict:
+    """Compares the sync helpers of graphbuilder with their asyncio counterparts on the same workload.
+
+    Two workloads are timed against the Neo4j instance configured in config.ini:
+    - node existence checks for a whole frontier of Wikidata IDs
+    - relationship triples for several companies
+
+    Args:
+        wikidata_ids: Wikidata IDs to look up, e.g. the children of a company node
+        companies: Company names to retrieve relationship triples for
+        repetitions: How often each workload is repeated, the median is reported
+
+    Returns:
+        dict: Median seconds per workload and path, e.g. {"node lookups": {"sync": 0.8, "async": 0.1}}
+    """
+    driver = connect_to_neo4j()
+    if not driver:
+        return {}
+
+    async def _run_async():
+        async_driver = await connect_to_neo4j_async()
+        if not async_driver:
+            return None
+        try:
+            return {
+                "node lookups": await _time_async(
+                    lambda: find_nodes_by_wikidata_ids_async(wikidata_ids, async_driver), repetitions),
+                "company triples": await _time_async(
+                    lambda: get_relationship_triples_for_companies_async(companies, driver=async_driver),
+                    repetitions),
+            }
+        finally:
+            await async_driver.close()
+
+    try:
+        sync_results = {
+            "node lookups": _time_sync(
+                lambda: [find_node_by_wikidata_id(wikidata_id, driver) for wikidata_id in wikidata_ids], repetitions),
+            "company triples": _time_sync(
+                lambda: [get_relationship_triples(company, driver=driver) for company in companies], repetitions),
+        }
+    finally:
+        driver.close()
+
+    async_results = asyncio.run(_run_async())
+    if async_results is None:
+        return {}
+
+    results = {workload: {"sync": sync_results[workload], "async": async_results[workload]}
+               for workload in sync_results}
+
+    print(Fore.LIGHTMAGENTA_EX + "\n=== Sync vs. async Neo4j helpers ===" + Style.RESET_ALL)
+    for workload, timings in results.items():
+        speedup = timings["sync"] / timings["async"] if timings["async"] > 0 else float("inf")
+        print(f"{workload}: sync {timings['sync']:.3f}s, async {timings['async']:.3f}s (x{speedup:.1f})")
+    return results
+
+
+def benchmark_batch_sizes(filepath: str, companies: List[str], included_nodes: List[str],
+                          batch_sizes: Tuple[int, ...] = (1, 2, 4, 8), max_articles_per_company: int = None) -> Dict[
+    int, float]:
+    """Measures the article throughput of classification and triple extraction for different batch sizes.
+
+    Runs the update of every article of the given companies without writing to the graph
+    (write=False), once per batch size; batch size 1 is the per-article path of update_neo4j_graph.
+    The LLM response cache is disabled during the runs, so every batch size pays its own LLM round
+    trips. The company neighbourhoods are loaded once and shared, so Neo4j latency does not skew
+    the comparison.
+
+    Args:
+        filepath: JSON file with articles grouped by company, like the benchmarking data
+        companies: Companies whose articles are processed
+        included_nodes: Node types to classify into
+        batch_sizes: Batch sizes to compare
+        max_articles_per_company: Optional limit of articles per company
+
+    Returns:
+        dict: Articles per minute for every batch size
+    """
+    with open(filepath, 'r', encoding='utf-8') as f:
+        articles_json = json.load(f)
+    articles_by_company = {company: [article["text"] for article in articles.values()][:max_articles_per_company]
+                           for company, articles in articles_json.items() if company in companies}
+    article_count = sum(len(texts) for texts in articles_by_company.values())
+    if not article_count:
+        return {}
+
+    driver = connect_to_neo4j()
+    if not driver:
+        return {}
+
+    neighbourhood_cache = NeighbourhoodCache(driver)
+    cache_enabled, llm_response_cache.enabled = llm_response_cache.enabled, False
+    results = {}
+    try:
+        for batch_size in batch_sizes:
+            start_time = time.perf_counter()
+            for company, texts in articles_by_company.items():
+                for batch_start in range(0, len(texts), batch_size):
+                    batch = texts[batch_start:batch_start + batch_size]
+                    if batch_size > 1:
+                        update_neo4j_graph_batch(batch, company, list(companies), list(included_nodes),
+                                                 included_nodes, driver, neighbourhood_cache, write=False)
+                    else:
+                        update_neo4j_graph(batch[0], list(companies), list(included_nodes), included_nodes,
+                                           driver, neighbourhood_cache, write=False)
+            elapsed = time.perf_counter() - start_time
+            results[batch_size] = article_count / elapsed * 60 if elapsed > 0 else float("inf")
+    finally:
+        llm_response_cache.enabled = cache_enabled
+        driver.close()
+
+    print(Fore.LIGHTMAGENTA_EX + f"\n=== Update throughput for {article_count} articles ===" + Style.RESET_ALL)
+    for batch_size, articles_per_minute in results.items():
+        print(f"batch size {batch_size}: {articles_per_minute:.1f} articles/min "
+              f"(x{articles_per_minute / results[batch_sizes[0]]:.1f})")
+    return results
+
+
+def benchmark_entity_resolution(filepath: str = "files/benchmarking_data/synthetic_articles_benchmarked.json",
+                                fuzzy: bool = True, vectorized: bool = True) -> Dict:
+    """Compares node ID resolution of entity names with the local EntityIndex against the previous lookups.
+
+    The names are all node names of the triples in the benchmark file, i.e. the names the LLM produced
+    and kept for the synthetic articles. The previous path asks Neo4j (find_node_by_wikidata_id with the
+    name) and then Wikidata (wbsearchentities, possibly served by the Wikidata cache) for every name.
+    The index is built from the graph and the Wikidata cache, its build time is reported separately.
+
+    Args:
+        filepath: JSON file with benchmarked articles grouped by company
+        fuzzy: Whether the index may resolve names by trigram similarity
+        vectorized: Whether fuzzy matching uses the NumPy/SciPy NgramMatcher (as the updater does)
+
+    Returns:
+        dict: Names, the share resolved by the index, agreement with the previous path (among names
+            both resolved) and the average milliseconds per name of both paths
+    """
+    names = sorted(_benchmark_entity_names(filepath))
+    if not names:
+        return {}
+
+    driver = connect_to_neo4j()
+    if not driver:
+        return {}
+
+    try:
+        start_time = time.perf_counter()
+        index = EntityIndex(min_similarity=0.75, matcher=NgramMatcher()) if vectorized else EntityIndex()
+        index.add_from_wikidata_cache()
+        index.add_from_graph(driver)
+        build_seconds = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        local_ids = index.resolve_many(names, fuzzy=fuzzy)
+        index_seconds = time.perf_counter() - start_time
+
+        retrievals_before = WikidataCache.internet_retrievals
+        start_time = time.perf_counter()
+        previous_ids = {}
+        for name in names:
+            find_node_by_wikidata_id(name, driver)  # looked up with the name, so only the round trip counts
+            previous_ids[name] = wikidata_wbsearchentities(name)
+        previous_seconds = time.perf_counter() - start_time
+        wikidata_requests = WikidataCache.internet_retrievals - retrievals_before
+    finally:
+        driver.close()
+
+    resolved = [name for name in names if local_ids[name]]
+    compared = [name for name in resolved if previous_ids[name] != "No wikidata entry found"]
+    agreeing = [name for name in compared if local_ids[name] == previous_ids[name]]
+    results = {
+        "names": len(names),
+        "resolved_locally": len(resolved) / len(names),
+        "agreement": len(agreeing) / len(compared) if compared else None,
+        "index_ms_per_name": index_seconds / len(names) * 1000,
+        "previous_ms_per_name": previous_seconds / len(names) * 1000,
+    }
+
+    print(Fore.LIGHTMAGENTA_EX + f"\n=== Entity resolution for {len(names)} names ===" + Style.RESET_ALL)
+    print(f"Index built in {build_seconds:.2f}s with {len(index)} names")
+    index.print_stats()
+    print(f"Resolved locally: {results['resolved_locally'] * 100:.1f}% "
+          f"({index.stats['exact']} exact, {index.stats['fuzzy']} fuzzy)")
+    if compared:
+        print(f"Same ID as Neo4j/Wikidata for {len(agreeing)} of {len(compared)} names resolved by both")
+    print(f"Index: {results['index_ms_per_name']:.3f} ms/name, Neo4j + Wikidata: "
+          f"{results['previous_ms_per_name']:.1f} ms/name ({len(names)} Neo4j queries, "
+          f"{wikidata_requests} Wikidata requests)")
+    return results
+
+
+def benchmark_import_time(repetitions: int = 5) -> Dict:
+    """Measures the startup cost of `import main` with lazy imports against importing everything eagerly.
+
+    Every import runs in a fresh interpreter, so nothing is cached between repetitions. "lazy" is
+    what a command like `python main.py benchmark-stats` pays now, "eager" what every command paid
+    before: all pipeline modules (Neo4j driver, numpy, scipy, requests) plus loading the Wikidata
+    and LLM response caches. Neither needs config.ini or a running database.
+
+    Args:
+        repetitions: How often each import is repeated, the median is reported
+
+    Returns:
+        dict: Median seconds per variant, e.g. {"lazy": 0.05, "eager": 0.9}
+    """
+    statements = {
+        "lazy": "import main",
+        "eager": "import main, articles, benchmarkharness, bulkexport, dedup, expansionplanner, graphupdater, "
+                 "neighbourhoodcache, preclassifier, updatepipeline; "
+                 "from appcontext import app_context; from llmcache import llm_response_cache; "
+                 "app_context.wikidata_cache.cache; llm_response_cache.cache",
+    }
+    results = {variant: _time_sync(lambda: subprocess.run([sys.executable, "-c", statement], check=True),
+                                   repetitions)
+               for variant, statement in statements.items()}
+
+    print(Fore.LIGHTMAGENTA_EX + f"\n=== Import time (median of {repetitions}) ===" + Style.RESET_ALL)
+    print(f"Lazy `import main`: {results['lazy'] * 1000:.0f} ms")
+    print(f"Eager imports and cache loads: {results['eager'] * 1000:.0f} ms "
+          f"({results['eager'] / results['lazy']:.1f}x)")
+    return results
+
+
+def benchmark_article_fetch(filepath: str = "files/benchmarking_data/synthetic_articles.json",
+                            companies: Optional[List[str]] = None, max_articles: int = 25,
+                            worker_counts: Tuple[int, ...] = (1, 8), latency: float = 0.05,
+                            llm_latency: float = 0.2) -> Dict:
+    """Times articles.ArticleFetcher against the local NYT stand-in with different worker pool sizes.
+
+    The articles of `filepath` are served by a nytstandin.NytStandInServer adding `latency` seconds
+    to every request, and the summaries come from the StubBackend with `llm_latency` seconds per
+    call, so neither an API key nor network access is needed. One worker corresponds to the former
+    sequential fetch of one article after the other. More than NYT_PAGE_SIZE articles per company
+    exercise the pagination.
+
+    Args:
+        filepath: Articles JSON file grouped by company served by the stand-in
+        companies: Companies to fetch articles for, defaults to the first four of the file
+        max_articles: Articles per company
+        worker_counts: Worker pool sizes to compare
+        latency: Seconds the stand-in adds to every search and article request
+        llm_latency: Seconds the StubBackend takes per summary
+
+    Returns:
+        dict: Seconds and articles per second by worker count, e.g. {8: {"seconds": 3.1, "articles per second": 32}}
+    """
+    from articles import ArticleFetcher
+    from llmbackend import StubBackend, get_llm_backend, set_llm_backend
+    from nytstandin import NytStandInServer
+
+    previous_backend = get_llm_backend()
+    set_llm_backend(StubBackend(latency=llm_latency))
+    results = {}
+    try:
+        with NytStandInServer.from_articles_file(filepath, latency=latency) as server:
+            companies = companies or server.companies[:4]
+            for workers in worker_counts:
+                with ArticleFetcher(max_workers=workers, search_url=server.search_url, api_key="stand-in",
+                                    min_request_interval=0.0) as fetcher:
+                    start_time = time.perf_counter()
+                    real_articles = fetcher.generate_real_articles(companies, max_articles)
+                    seconds = time.perf_counter() - start_time
+                articles = sum(len(company_articles) for company_articles in real_articles.values())
+                results[workers] = {"seconds": seconds, "articles": articles,
+                                    "articles per second": articles / seconds if seconds else 0.0,
+                                    "search requests": fetcher.stats["search requests"]}
+    finally:
+        set_llm_backend(previous_backend)
+
+    print(Fore.LIGHTMAGENTA_EX + f"\n=== Article fetch for {len(companies)} companies ===" + Style.RESET_ALL)
+    for workers, result in results.items():
+        print(f"{workers} workers: {result['articles']} articles in {result['seconds']:.2f}s "
+              f"({result['articles per second']:.1f} articles/s, {result['search requests']} search requests)")
+    return results
+
+
+"""functions below are helper functions"""
+
+
+def _time_sync(workload: Callable, repetitions: int) -> float:
+    timings = []
+    for _ in range(repetitions):
+        start_time = time.perf_counter()
+        workload()
+        timings.append(time.perf_counter() - start_time)
+    return statistics.median(timings)
+
+
+def _benchmark_entity_names(filepath: str) -> set:
+    with open(filepath, 'r', encoding='utf-8') as f:
+        articles_json = json.load(f)
+    names = set()
+    for articles in articles_json.values():
+        for article in articles.values():
+            triples_by_change = article.get("benchmarking", {}).get("model update triples", {})
+            for triples in triples_by_change.values():
+                for triple in triples or []:
+                    names.update(triple.get(key) for key in ("node_from", "node_to") if triple.get(key))
+    return names
+
+
+async def _time_async(workload: Callable, repetitions: int) -> float:
+    timings = []
+    for _ in range(repetitions):
+        start_time = time.perf_counter()
+        await workload()
+        timings.append(time.perf_counter() - start_time)
+    return statistics.median(timings)
+
+
+if __name__ == "__main__":
+    benchmark_companies = ["Adidas AG", "Airbus SE", "BASF SE", "Vonovia SE"]
+    benchmark_sync_vs_async(
+        wikidata_ids=[wikidata_wbsearchentities(company) for company in benchmark_companies],
+        companies=benchmark_companies,
+    )
@@ -0,0 +1,171 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+CREATE_TABLE_STATEMENT = """
+    CREATE TABLE IF NOT EXISTS benchmark_results (
+        company TEXT NOT NULL,
+        article_key TEXT NOT NULL,
+        model_update_triples TEXT,
+        correct_update INTEGER,
+        wikidata_structure INTEGER,
+        updated_at TEXT NOT NULL,
+        PRIMARY KEY (company, article_key)
+    )
+"""
+
+UPSERT_STATEMENT = """
+    INSERT INTO benchmark_results (company, article_key, model_update_triples, correct_update, wikidata_structure,
+                                   updated_at)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (company, article_key) DO UPDATE SET
+        model_update_triples = excluded.model_update_triples,
+        correct_update = excluded.correct_update,
+        wikidata_structure = excluded.wikidata_structure,
+        updated_at = excluded.updated_at
+"""
+
+
+class BenchmarkStore:
+    """SQLite store of benchmark results keyed by (company, article_key).
+
+    Replaces writing the results into the articles JSON file, which had to be rewritten as a whole
+    after every article. Looking up and recording the result of one article is a primary key
+    access. The legacy format (the articles file with a "benchmarking" entry per article) is only
+    materialized on demand with export_json, and existing results can be taken over with import_json.
+
+    The results of an article are stored as the legacy "benchmarking" dict:
+    {"model update triples": {"unchanged", "added", "deleted"}, "correct update": bool,
+    "wikidata structure": bool}, with missing answers as None.
+
+    Example:
+        >>> store = BenchmarkStore(benchmark_store_path("files/benchmarking_data/synthetic_articles_benchmarked.json"))
+        >>> store.record("Adidas AG", "1", {"model update triples": {...}, "correct update": True,
+        ...                                 "wikidata structure": True})
+        >>> store.is_benchmarked("Adidas AG", "1")
+        True
+    """
+
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        directory = os.path.dirname(filepath)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(filepath, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(CREATE_TABLE_STATEMENT)
+        self._connection.commit()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM benchmark_results").fetchone()[0]
+
+    def get(self, company: str, article_key: str) -> Optional[Dict]:
+        """Returns the benchmarking dict of an article, None if it has no results."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT model_update_triples, correct_update, wikidata_structure FROM benchmark_results "
+                "WHERE company = ? AND article_key = ?", (company, str(article_key))).fetchone()
+        return _to_benchmarking(row) if row else None
+
+    def is_benchmarked(self, company: str, article_key: str) -> bool:
+        """Whether the update of an article has been judged, like the old skip check on "correct update"."""
+        benchmarking = self.get(company, article_key)
+        return benchmarking is not None and benchmarking.get("correct update") is not None
+
+    def record(self, company: str, article_key: str, benchmarking: Dict):
+        """Inserts or replaces the results of an article."""
+        triples = benchmarking.get("model update triples")
+        with self._lock:
+            self._connection.execute(UPSERT_STATEMENT, (
+                company, str(article_key),
+                json.dumps(triples, ensure_ascii=False) if triples is not None else None,
+                _to_int(benchmarking.get("correct update")), _to_int(benchmarking.get("wikidata structure")),
+                str(datetime.now(timezone.utc))))
+            self._connection.commit()
+
+    def all(self) -> Dict[str, Dict[str, Dict]]:
+        """Returns all results as {company: {article_key: benchmarking dict}}."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT company, article_key, model_update_triples, correct_update, wikidata_structure "
+                "FROM benchmark_results ORDER BY company, article_key").fetchall()
+        results = {}
+        for company, article_key, *row in rows:
+            results.setdefault(company, {})[article_key] = _to_benchmarking(row)
+        return results
+
+    def import_json(self, filepath: str, overwrite: bool = False) -> int:
+        """Takes over the "benchmarking" entries of a legacy articles JSON file.
+
+        Args:
+            filepath: Articles JSON file grouped by company
+            overwrite: Whether existing results in the store are replaced
+
+        Returns:
+            int: Number of imported articles
+        """
+        with open(filepath, 'r', encoding='utf-8') as f:
+            articles_json = json.load(f)
+        imported = 0
+        for company, articles in articles_json.items():
+            for article_key, article_data in articles.items():
+                benchmarking = article_data.get("benchmarking")
+                if not benchmarking or (not overwrite and self.get(company, article_key) is not None):
+                    continue
+                self.record(company, article_key, benchmarking)
+                imported += 1
+        return imported
+
+    def export_json(self, articles_filepath: str, output_filepath: Optional[str] = None) -> int:
+        """Materializes the legacy format: the articles file with the stored results as "benchmarking" entries.
+
+        Args:
+            articles_filepath: Articles JSON file grouped by company, providing texts and metadata
+            output_filepath: Where to write the result, defaults to articles_filepath itself
+
+        Returns:
+            int: Number of articles with results
+        """
+        with open(articles_filepath, 'r', encoding='utf-8') as f:
+            articles_json = json.load(f)
+        exported = 0
+        for company, results in self.all().items():
+            for article_key, benchmarking in results.items():
+                article = articles_json.get(company, {}).get(article_key)
+                if article is None:
+                    continue
+                article["benchmarking"] = benchmarking
+                exported += 1
+        with open(output_filepath or articles_filepath, 'w', encoding='utf-8') as f:
+            json.dump(articles_json, f, indent=4, ensure_ascii=False)
+        return exported
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+def benchmark_store_path(articles_filepath: str) -> str:
+    """Store belonging to an articles file, e.g. synthetic_articles_benchmarked.json -> ....sqlite3."""
+    return os.path.splitext(articles_filepath)[0] + ".sqlite3"
+
+
+"""functions below are helper functions"""
+
+
+def _to_int(value: Optional[bool]) -> Optional[int]:
+    return None if value is None else int(bool(value))
+
+
+def _to_benchmarking(row: List) -> Dict:
+    triples, correct_update, wikidata_structure = row
+    benchmarking = {"correct update": None if correct_update is None else bool(correct_update),
+                    "wikidata structure": None if wikidata_structure is None else bool(wikidata_structure)}
+    if triples is not None:
+        benchmarking = {"model update triples": json.loads(triples), **benchmarking}
+    return benchmarking
@@ -0,0 +1,238 @@
+import csv
+import os
+import re
+from datetime import datetime
+from colorama import Fore, Style
+from typing import Dict, List, Tuple, Any
+
+from wikidata.wikidata import wikidata_wbsearchentities
+from graphbuilder import build_node_properties, _iter_relationship_candidates
+
+
+class AdminImportCsvWriter:
+    """Streams nodes and relationships to CSV files in the `neo4j-admin database import` format.
+
+    Every node label and relationship type gets its own header file and data file, e.g.
+    `nodes_Company_header.csv` / `nodes_Company.csv` and `relationships_OWNS_header.csv` /
+    `relationships_OWNS.csv`. Rows are written as soon as they are added, so memory only grows with
+    the deduplication keys, not with the exported properties.
+
+    Nodes are deduplicated by Wikidata ID, relationships by (type, source, target, start_time, end_time),
+    which are the same uniqueness checks create_new_node and create_relationship perform in the database.
+
+    Property types follow what the Bolt path stores, so an incremental build on top of an imported
+    database finds the imported relationships (CHECK_RELATIONSHIP_QUERY compares start_time and
+    end_time with the values it would write). Relationship times are Neo4j DateTime values, written
+    in `start_time:datetime` / `end_time:datetime` columns, unknown times are the string "NA". As a
+    column has a single type, the relationships of a type are split into one file per combination
+    of typed and "NA" times, e.g. `relationships_OWNS_datetime_NA.csv`. Node date properties like
+    `inception` are stored as strings by build_node_properties and stay untyped.
+
+    Example:
+        >>> with AdminImportCsvWriter("files/bulk_import") as writer:
+        ...     writer.add_node("Q3895", "Company", {"name": "Adidas", "wikidata_id": "Q3895"})
+        ...     writer.add_node("Q1726", "City", {"name": "Munich", "wikidata_id": "Q1726"})
+        ...     writer.add_relationship("HAS_HEADQUARTER_IN", "Q3895", "Q1726", datetime(1949, 8, 18, tzinfo=timezone.utc),
+        ...                             "NA")
+        >>> " ".join(writer.import_command())
+        'neo4j-admin database import full --nodes=... --relationships=... neo4j'
+    """
+
+    relationship_columns = ["start_time", "end_time"]  # typed :datetime unless "NA", see _relationship_file
+
+    def __init__(self, output_dir: str = 'files/bulk_import'):
+        self.output_dir = output_dir
+        os.makedirs(output_dir, exist_ok=True)
+
+        self.node_labels = {}  # wikidata_id -> label
+        self.relationship_keys = set()
+        self.duplicate_nodes = 0
+        self.duplicate_relationships = 0
+        self.expanded_levels = {}  # wikidata_id -> shallowest level the node has been expanded on
+
+        self._node_columns = {}  # label -> property columns
+        self._files = {}  # (kind, name) -> (file handle, csv writer)
+        self._file_paths = {"nodes": [], "relationships": []}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def has_node(self, wikidata_id: str) -> bool:
+        return wikidata_id in self.node_labels
+
+    def add_node(self, wikidata_id: str, label: str, properties: Dict[str, Any]) -> bool:
+        """Writes a node row unless a node with this Wikidata ID has already been exported.
+
+        The property columns of a label are fixed by its first node. Properties unknown to the
+        header of that label are dropped with a warning.
+
+        Returns:
+            bool: True if the node was written, False if it was a duplicate
+        """
+        if wikidata_id in self.node_labels:
+            self.duplicate_nodes += 1
+            return False
+        self.node_labels[wikidata_id] = label
+
+        if label not in self._node_columns:
+            self._node_columns[label] = [key for key in properties if key != "wikidata_id"]
+            header = ["wikidata_id:ID"] + self._node_columns[label] + [":LABEL"]
+            self._open("nodes", label, header)
+
+        columns = self._node_columns[label]
+        unknown = [key for key in properties if key not in columns and key != "wikidata_id"]
+        if unknown:
+            print(Fore.YELLOW + f"Dropping properties {unknown} of node '{wikidata_id}', they are not part of the "
+                                f"'{label}' header" + Style.RESET_ALL)
+
+        row = [wikidata_id] + [_format_value(properties.get(column)) for column in columns] + [label]
+        self._files[("nodes", label)][1].writerow(row)
+        return True
+
+    def add_relationship(self, rel_type: str, source_id: str, target_id: str, start_time, end_time) -> bool:
+        """Writes a relationship row unless an identical relationship has already been exported.
+
+        Returns:
+            bool: True if the relationship was written, False if it was a duplicate
+        """
+        key = (rel_type, source_id, target_id, _format_value(start_time), _format_value(end_time))
+        if key in self.relationship_keys:
+            self.duplicate_relationships += 1
+            return False
+        self.relationship_keys.add(key)
+
+        file_name, header = _relationship_file(rel_type, self.relationship_columns, [start_time, end_time])
+        if ("relationships", file_name) not in self._files:
+            self._open("relationships", file_name, header)
+
+        self._files[("relationships", file_name)][1].writerow([source_id, target_id, key[3], key[4], rel_type])
+        return True
+
+    def import_command(self, database: str = "neo4j") -> List[str]:
+        """Returns the neo4j-admin command importing all written files into an empty database."""
+        command = ["neo4j-admin", "database", "import", "full"]
+        command += [f"--nodes={header},{data}" for header, data in self._file_paths["nodes"]]
+        command += [f"--relationships={header},{data}" for header, data in self._file_paths["relationships"]]
+        command.append(database)
+        return command
+
+    def close(self):
+        for file, _ in self._files.values():
+            file.close()
+
+    def print_stats(self):
+        print(f"\n--- Bulk export statistics ---")
+        print(f"Nodes written: {len(self.node_labels)} ({self.duplicate_nodes} duplicates skipped)")
+        print(f"Relationships written: {len(self.relationship_keys)} "
+              f"({self.duplicate_relationships} duplicates skipped)")
+        print(f"Node files: {len(self._file_paths['nodes'])}, "
+              f"relationship files: {len(self._file_paths['relationships'])}")
+        print("Import with: " + " ".join(self.import_command()) + "\n")
+
+    def _open(self, kind: str, name: str, header: List[str]):
+        file_name = f"{kind}_{_safe_file_name(name)}"
+        header_path = os.path.join(self.output_dir, f"{file_name}_header.csv")
+        data_path = os.path.join(self.output_dir, f"{file_name}.csv")
+
+        with open(header_path, "w", newline="", encoding="utf-8") as f:
+            csv.writer(f).writerow(header)
+
+        data_file = open(data_path, "w", newline="", encoding="utf-8")
+        self._files[(kind, name)] = (data_file, csv.writer(data_file))
+        self._file_paths[kind].append((header_path, data_path))
+
+
+def export_graph_from_root(root_name: str, root_label: str, date_range: Tuple[datetime, datetime],
+                           included_node_types: List[str], max_depth: int, writer: AdminImportCsvWriter,
+                           planner=None) -> str:
+    """
+    Runs the Wikidata expansion of graphbuilder.build_graph_from_root, but writes to CSV instead of Neo4j.
+
+    Nodes and relationships are streamed to the writer level by level. A node that has already been
+    expanded (e.g. from another root) on the same or a shallower level is not looked up again.
+
+    Args:
+        root_name: Name of the root node to start graph from
+        root_label: Type/label of the root node
+        date_range: Tuple of (start_date, end_date) to filter relationships
+        included_node_types: List of node types to include in graph
+        max_depth: Maximum depth of graph expansion
+        writer: AdminImportCsvWriter receiving the nodes and relationships
+        planner: Optional expansionplanner.ExpansionPlanner choosing the relationships within its budget
+
+    Returns:
+        str: Wikidata ID of the root node
+    """
+    root_id = wikidata_wbsearchentities(root_name)
+    if not writer.has_node(root_id):
+        writer.add_node(root_id, root_label, build_node_properties(root_id, root_label, root_name))
+    queue = [root_id]
+    date_from, date_until = date_range
+
+    if planner is not None:
+        for source_id, rel_info, rel in planner.plan(root_id, root_label, included_node_types, date_range,
+                                                     max_depth):
+            if not writer.has_node(rel["id"]):
+                writer.add_node(rel["id"], rel_info["label"], build_node_properties(rel["id"], rel_info["label"], None))
+            writer.add_relationship(rel_info["relationship_type"], source_id, rel["id"],
+                                    rel["start_time"], rel["end_time"])
+        planner.print_stats()
+        return root_id
+
+    expanded_levels = writer.expanded_levels
+    for level in range(max_depth):
+        print(Fore.BLUE + f"\--Exporting {root_name} graph: depth {level}---" + Style.RESET_ALL)
+
+        next_queue = []
+        for node_id in dict.fromkeys(queue):
+            if expanded_levels.get(node_id, max_depth) <= level:
+                continue
+            expanded_levels[node_id] = level
+
+            for rel_info, rel in _iter_relationship_candidates(node_id, writer.node_labels[node_id],
+                                                               included_node_types, date_from, date_until):
+                if not writer.has_node(rel["id"]):
+                    properties = build_node_properties(rel["id"], rel_info["label"], None)
+                    writer.add_node(rel["id"], rel_info["label"], properties)
+
+                writer.add_relationship(rel_info["relationship_type"], node_id, rel["id"],
+                                        rel["start_time"], rel["end_time"])
+                next_queue.append(rel["id"])
+
+        queue = next_queue
+        print(Fore.BLUE + f"---Completed {root_name} export: depth {level}---" + Style.RESET_ALL)
+
+    return root_id
+
+
+"""functions below are helper functions"""
+
+
+def _relationship_file(rel_type: str, columns: List[str], values: List[Any]) -> Tuple[str, List[str]]:
+    """File name and header of the relationships of a type whose time columns have the types of `values`.
+
+    Datetime values get a `:datetime` column, so they are imported as Neo4j DateTime like the ones
+    create_relationship writes. Other values ("NA") stay strings, which is also what the Bolt path stores.
+    """
+    is_datetime = [isinstance(value, datetime) for value in values]
+    header = [":START_ID", ":END_ID"]
+    header += [f"{column}:datetime" if typed else column for column, typed in zip(columns, is_datetime)]
+    header.append(":TYPE")
+    file_name = "_".join([rel_type] + ["datetime" if typed else "NA" for typed in is_datetime])
+    return file_name, header
+
+
+def _format_value(value) -> str:
+    """Formats a property value for the CSV files. Datetimes are written as ISO strings, None as empty field."""
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _safe_file_name(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_-]", "_", name)
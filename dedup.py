@@ -0,0 +1,167 @@
+import re
+import threading
+import time
+import zlib
+from collections import deque
+from datetime import datetime
+from typing import Hashable, List, Optional, Tuple
+
+import numpy as np
+
+_PRIME = (1 << 61) - 1  # Mersenne prime of the MinHash permutations
+_MAX_HASH = (1 << 32) - 1
+
+
+class ArticleDeduplicator:
+    """Detects near-duplicate articles (wire copies, updates, syndicated versions) before they reach the updater.
+
+    Every article text is reduced to a MinHash signature of its word shingles. The signatures are
+    kept in an LSH index of `bands` bands, so only articles sharing a band are compared, and a
+    candidate counts as a duplicate if the estimated Jaccard similarity of the shingle sets is at
+    least `threshold` and the two articles are at most `window_seconds` apart. Articles falling out
+    of the window are evicted, so memory stays bounded for long-running feeds.
+
+    check only compares an article with the indexed ones; the caller indexes an article with add once
+    its update succeeded. A failed or interrupted update therefore never hides the other copies of its
+    event, the next copy is processed instead. A duplicate is merged into the article it duplicates
+    (see duplicates_of), and the caller skips it, saving the LLM calls of a second update of the same event.
+
+    Example:
+        >>> deduplicator = ArticleDeduplicator(threshold=0.7, window_seconds=3 * 24 * 3600)
+        >>> deduplicator.check(("Adidas AG", "1"), "Adidas AG acquires TrackYourRun ...")
+        >>> deduplicator.add(("Adidas AG", "1"), "Adidas AG acquires TrackYourRun ...")  # after its update
+        >>> deduplicator.check(("Adidas AG", "2"), "Adidas AG acquires TrackYourRun, ...")
+        ('Adidas AG', '1')
+    """
+
+    def __init__(self, threshold: float = 0.7, num_perm: int = 128, bands: int = 32, shingle_size: int = 2,
+                 window_seconds: float = 3 * 24 * 3600, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.threshold = threshold
+        self.bands = bands
+        self.shingle_size = shingle_size
+        self.window_seconds = window_seconds
+        self.stats = {"checked": 0, "duplicates": 0, "evicted": 0}
+        generator = np.random.RandomState(seed)
+        self._a = generator.randint(1, _PRIME, num_perm, dtype=np.uint64)
+        self._b = generator.randint(0, _PRIME, num_perm, dtype=np.uint64)
+        self._rows = num_perm // bands
+        self._entries = {}  # key -> (signature, timestamp)
+        self._buckets = {}  # (band, band bytes) -> set of keys
+        self._order = deque()  # keys in insertion order, for eviction
+        self._newest = float("-inf")
+        self._duplicates = {}  # key -> keys of the articles merged into it
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def check(self, key: Hashable, text: str, timestamp: Optional[float] = None) -> Optional[Hashable]:
+        """Returns the key of the indexed article `text` nearly duplicates, None if there is none.
+
+        The article itself is not indexed, see add.
+
+        Args:
+            key: Key of the article, e.g. (company, article key)
+            text: Text of the article
+            timestamp: Publication time in seconds since the epoch (see article_timestamp), defaults to now
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        signature, band_keys = self._band_keys(text)
+
+        with self._lock:
+            self.stats["checked"] += 1
+            self._evict(timestamp)
+
+            candidates = set()
+            for band_key in band_keys:
+                candidates.update(self._buckets.get(band_key, ()))
+            best, best_similarity = None, 0.0
+            for candidate in candidates:
+                candidate_signature, candidate_timestamp = self._entries[candidate]
+                if abs(timestamp - candidate_timestamp) > self.window_seconds:
+                    continue
+                similarity = float(np.mean(signature == candidate_signature))
+                if similarity >= self.threshold and similarity > best_similarity:
+                    best, best_similarity = candidate, similarity
+            if best is not None:
+                self.stats["duplicates"] += 1
+                self._duplicates.setdefault(best, []).append(key)
+            return best
+
+    def add(self, key: Hashable, text: str, timestamp: Optional[float] = None):
+        """Indexes an article whose update succeeded, so later copies of it are found by check."""
+        timestamp = time.time() if timestamp is None else timestamp
+        signature, band_keys = self._band_keys(text)
+
+        with self._lock:
+            self._evict(timestamp)
+            if key not in self._entries:
+                self._entries[key] = (signature, timestamp)
+                self._order.append(key)
+                for band_key in band_keys:
+                    self._buckets.setdefault(band_key, set()).add(key)
+
+    def duplicates_of(self, key: Hashable) -> List[Hashable]:
+        """Keys of the articles merged into the article `key` as its duplicates."""
+        with self._lock:
+            return list(self._duplicates.get(key, []))
+
+    def print_stats(self, llm_calls_per_article: Optional[float] = None):
+        print(f"\n--- Article Deduplication Statistics ---")
+        print(f"Checked articles: {self.stats['checked']}, skipped near-duplicates: {self.stats['duplicates']}, "
+              f"indexed: {len(self)}, evicted from the window: {self.stats['evicted']}")
+        if llm_calls_per_article:
+            print(f"Saved about {self.stats['duplicates'] * llm_calls_per_article:.0f} LLM calls "
+                  f"({llm_calls_per_article:.1f} per updated article)")
+        print()
+
+    def _band_keys(self, text: str) -> Tuple[np.ndarray, List[Tuple[int, bytes]]]:
+        signature = self._signature(text)
+        return signature, [(band, signature[band * self._rows:(band + 1) * self._rows].tobytes())
+                           for band in range(self.bands)]
+
+    def _signature(self, text: str) -> np.ndarray:
+        hashes = np.array(list(_shingle_hashes(text, self.shingle_size)) or [0], dtype=np.uint64)
+        # (a * hash + b) mod prime as universal hash family, the uint64 products wrap around like in datasketch
+        permuted = (np.outer(hashes, self._a) + self._b) % np.uint64(_PRIME) & np.uint64(_MAX_HASH)
+        return permuted.min(axis=0)
+
+    def _evict(self, timestamp: float):
+        """Drops the articles older than the window, measured from the newest article seen."""
+        self._newest = max(self._newest, timestamp)
+        while self._order and self._entries[self._order[0]][1] < self._newest - self.window_seconds:
+            key = self._order.popleft()
+            signature, _ = self._entries.pop(key)
+            for band in range(self.bands):
+                band_key = (band, signature[band * self._rows:(band + 1) * self._rows].tobytes())
+                bucket = self._buckets.get(band_key)
+                if bucket is not None:
+                    bucket.discard(key)
+                    if not bucket:
+                        del self._buckets[band_key]
+            self._duplicates.pop(key, None)
+            self.stats["evicted"] += 1
+
+
+def article_timestamp(date: Optional[str]) -> Optional[float]:
+    """'2024-11-29T10:00:27+0000' (the NYT pub_date of an article) -> seconds since the epoch, None if missing."""
+    if not date:
+        return None
+    for date_format in ("%Y-%m-%dT%H:%M:%S%z", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(date, date_format).timestamp()
+        except ValueError:
+            continue
+    return None
+
+
+"""functions below are helper functions"""
+
+
+def _shingle_hashes(text: str, shingle_size: int) -> set:
+    words = re.findall(r"\w+", text.casefold())
+    shingles = [" ".join(words[index:index + shingle_size])
+                for index in range(max(len(words) - shingle_size + 1, 1))]
+    return {zlib.crc32(shingle.encode("utf-8")) for shingle in shingles if shingle}
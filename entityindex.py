@@ -0,0 +1,212 @@
+import re
+import threading
+import unicodedata
+from colorama import Fore, Style
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from graphbuilder import session_scope
+from wikidata.wikidataCache import wikidata_cache
+
+GRAPH_NODE_NAMES_QUERY = """
+    MATCH (n) WHERE n.wikidata_id IS NOT NULL AND n.name IS NOT NULL
+    RETURN n.wikidata_id as wikidata_id, n.name as name, labels(n)[0] as label
+"""
+
+# Legal forms dropped from normalized names, so "Adidas AG" and "adidas" share a key
+_LEGAL_FORMS = {"ag", "se", "kgaa", "co", "gmbh", "plc", "inc", "nv", "sa", "ltd", "llc", "corp", "corporation",
+                "holding"}
+
+
+class EntityIndex:
+    """Resolves entity names produced by the LLM to node IDs without Neo4j or Wikidata round trips.
+
+    Names are normalized (case, accents, punctuation and legal forms are ignored, see normalize_name)
+    and mapped to the Wikidata IDs (or CustomIDs) of the nodes they denote. The index is filled from
+    the `name` properties of the graph (add_from_graph), the labels, aliases and past searches in the
+    Wikidata cache (add_from_wikidata_cache) and the nodes the updater writes (add).
+
+    `resolve` first looks the normalized name up exactly. If that fails and `fuzzy` is set, candidates
+    sharing character trigrams are scored with the Dice coefficient of their trigram sets, and the best
+    one is accepted if it scores at least `min_similarity` and beats the runner-up by `min_margin`.
+    A name that denotes several IDs is ambiguous and not resolved. Everything is thread-safe.
+
+    For tens of thousands of names, pass an entitymatcher.NgramMatcher as `matcher`: fuzzy candidates
+    are then scored by TF-IDF cosine similarity of hashed n-grams in NumPy/SciPy, and resolve_many
+    scores all names of an article in one sparse matrix product.
+
+    Example:
+        >>> entity_index.add_from_graph(driver)
+        >>> entity_index.resolve("adidas")
+        'Q3895'
+        >>> entity_index.lookup("Adidas Runtastik", top_k=1)
+        [('Q2167410', 0.88)]
+    """
+
+    def __init__(self, min_similarity: float = 0.8, min_margin: float = 0.05, matcher=None):
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+        self.matcher = matcher
+        self.stats = {"exact": 0, "fuzzy": 0, "ambiguous": 0, "misses": 0}
+        self._ids_by_key = {}  # normalized name -> set of node IDs
+        self._labels = {}  # node ID -> node label, if known
+        self._trigrams = {}  # normalized name -> set of its trigrams
+        self._keys_by_trigram = {}  # trigram -> set of normalized names
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._ids_by_key)
+
+    def add(self, node_id: str, names: Iterable[str], label: Optional[str] = None):
+        """Registers names (e.g. the name and the aliases of a node) under a node ID."""
+        with self._lock:
+            if label:
+                self._labels[node_id] = label
+            for name in names:
+                key = normalize_name(name or "")
+                if not key:
+                    continue
+                self._ids_by_key.setdefault(key, set()).add(node_id)
+                if self.matcher is not None:
+                    self.matcher.add([key])
+                elif key not in self._trigrams:
+                    self._trigrams[key] = _trigrams(key)
+                    for trigram in self._trigrams[key]:
+                        self._keys_by_trigram.setdefault(trigram, set()).add(key)
+
+    def add_from_graph(self, driver) -> int:
+        """Adds the name of every node in the graph, returns the number of nodes."""
+        with session_scope(driver) as session:
+            records = list(session.run(GRAPH_NODE_NAMES_QUERY))
+        for record in records:
+            self.add(record["wikidata_id"], [record["name"]], record["label"])
+        print(Fore.BLUE + f"Entity index: added {len(records)} node names from the graph" + Style.RESET_ALL)
+        return len(records)
+
+    def add_from_wikidata_cache(self, cache=wikidata_cache) -> int:
+        """Adds English labels and aliases of cached entities and the results of cached searches.
+
+        Returns:
+            int: Number of entities and searches added
+        """
+        with cache._lock:
+            entities = list(cache.cache.get("wbgetentities", {}).items())
+            searches = list(cache.cache.get("wbsearchentities", {}).items())
+
+        added = 0
+        for entity_id, data in entities:
+            entity = (data or {}).get("entities", {}).get(entity_id, {})
+            names = [entity.get("labels", {}).get("en", {}).get("value")]
+            names += [alias.get("value") for alias in entity.get("aliases", {}).get("en", [])]
+            if any(names):
+                self.add(entity_id, names)
+                added += 1
+        for query_string, data in searches:
+            results = (data or {}).get("search") or []
+            if results and results[0].get("id"):
+                result = results[0]
+                self.add(result["id"], [query_string, result.get("label")] + list(result.get("aliases", [])))
+                added += 1
+        print(Fore.BLUE + f"Entity index: added {added} entities and searches from the Wikidata cache" +
+              Style.RESET_ALL)
+        return added
+
+    def resolve(self, name: str, fuzzy: bool = True) -> Optional[str]:
+        """Returns the node ID of a name, None if it is unknown or ambiguous."""
+        return self.resolve_many([name], fuzzy)[name]
+
+    def resolve_many(self, names: Iterable[str], fuzzy: bool = True) -> Dict[str, Optional[str]]:
+        """Resolves several names at once, e.g. all entities of an article, see resolve."""
+        resolved = {}
+        unmatched = {}  # normalized name -> names
+        with self._lock:
+            for name in names:
+                key = normalize_name(name or "")
+                ids = self._ids_by_key.get(key)
+                if ids and len(ids) == 1:
+                    self._count("exact")
+                    resolved[name] = next(iter(ids))
+                elif ids:
+                    self._count("ambiguous")
+                    resolved[name] = None
+                elif fuzzy and key:
+                    unmatched.setdefault(key, []).append(name)
+                else:
+                    self._count("misses")
+                    resolved[name] = None
+
+            for key, candidates in zip(unmatched, self._score_many(list(unmatched), top_k=2)):
+                accepted = candidates and candidates[0][1] >= self.min_similarity and \
+                    (len(candidates) == 1 or candidates[0][1] - candidates[1][1] >= self.min_margin)
+                for name in unmatched[key]:
+                    self._count("fuzzy" if accepted else "misses")
+                    resolved[name] = candidates[0][0] if accepted else None
+        return resolved
+
+    def lookup(self, name: str, top_k: int = 5) -> List[Tuple[str, float]]:
+        """Returns the top_k (node ID, similarity) candidates of a name, exact matches scoring 1.0."""
+        key = normalize_name(name or "")
+        with self._lock:
+            return self._score_many([key], top_k)[0] if key else []
+
+    def get_label(self, node_id: str) -> Optional[str]:
+        with self._lock:
+            return self._labels.get(node_id)
+
+    def resolution_rate(self) -> float:
+        """Share of resolve calls answered by the index."""
+        total = sum(self.stats.values())
+        return (self.stats["exact"] + self.stats["fuzzy"]) / total if total else 0.0
+
+    def print_stats(self):
+        print(f"\n--- Entity Index Statistics ---")
+        print(f"Names: {len(self)}, IDs: {len({node_id for ids in self._ids_by_key.values() for node_id in ids})}")
+        print(f"Resolved exactly: {self.stats['exact']}, fuzzily: {self.stats['fuzzy']}, "
+              f"ambiguous: {self.stats['ambiguous']}, misses: {self.stats['misses']} "
+              f"(resolution rate {self.resolution_rate() * 100:.1f}%)\n")
+
+    def _score_many(self, keys: List[str], top_k: int) -> List[List[Tuple[str, float]]]:
+        if self.matcher is None:
+            return [self._score(key, top_k) for key in keys]
+        results = []
+        for candidates in self.matcher.query(keys, top_k=top_k * 2):  # a name can denote several IDs
+            best = {}
+            for candidate, similarity in candidates:
+                for node_id in self._ids_by_key[candidate]:
+                    best[node_id] = max(best.get(node_id, 0.0), similarity)
+            results.append(sorted(best.items(), key=lambda item: (-item[1], item[0]))[:top_k])
+        return results
+
+    def _score(self, key: str, top_k: int) -> List[Tuple[str, float]]:
+        trigrams = _trigrams(key)
+        shared = {}
+        for trigram in trigrams:
+            for candidate in self._keys_by_trigram.get(trigram, ()):
+                shared[candidate] = shared.get(candidate, 0) + 1
+
+        best = {}  # node ID -> best similarity of any of its names
+        for candidate, count in shared.items():
+            similarity = 2 * count / (len(trigrams) + len(self._trigrams[candidate]))
+            for node_id in self._ids_by_key[candidate]:
+                best[node_id] = max(best.get(node_id, 0.0), similarity)
+        return sorted(best.items(), key=lambda item: (-item[1], item[0]))[:top_k]
+
+    def _count(self, key: str):
+        self.stats[key] += 1
+
+
+def normalize_name(name: str) -> str:
+    """'Bjørn  Gulden' -> 'bjorn gulden', 'Henkel AG & Co. KGaA' -> 'henkel'."""
+    name = unicodedata.normalize("NFKD", name.replace("ø", "o").replace("Ø", "O").replace("ß", "ss"))
+    name = "".join(char for char in name if not unicodedata.combining(char)).casefold()
+    words = re.findall(r"\w+", name.replace("&", " "))
+    while len(words) > 1 and words[-1] in _LEGAL_FORMS:
+        words.pop()
+    return " ".join(words)
+
+
+"""functions below are helper functions"""
+
+
+def _trigrams(key: str) -> Set[str]:
+    padded = f"  {key} "
+    return {padded[index:index + 3] for index in range(len(padded) - 2)}
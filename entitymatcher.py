@@ -0,0 +1,112 @@
+import threading
+import zlib
+from typing import Iterable, List, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+
+
+class NgramMatcher:
+    """Vectorized nearest-name search over character n-grams, for entity linking over large node sets.
+
+    Every name is a row of a sparse matrix of hashed character n-gram counts (hashing keeps the
+    feature space fixed, so names can be added at any time without refitting a vocabulary). Queries
+    are TF-IDF weighted and answered with the cosine similarity of all query names against all
+    indexed names in one sparse matrix product, so resolving the entities of a whole article (or
+    batch of articles) costs a single call instead of a Python loop over every known name.
+
+    Names added since the last query are appended to the matrix on the next query. The document
+    frequencies are updated on every add; the IDF weights of the indexed rows are recomputed lazily,
+    in one vectorized pass, the next time a query follows an add.
+
+    The matcher works on the strings it is given, normalizing them is up to the caller
+    (see entityindex.EntityIndex, which uses it for its fuzzy matching).
+
+    Example:
+        >>> matcher = NgramMatcher()
+        >>> matcher.add(["adidas runtastic", "siemens energy", "siemens healthineers"])
+        >>> matcher.query(["adidas runtastik", "siemens"], top_k=1)
+        [[('adidas runtastic', 0.84)], [('siemens energy', 0.63)]]
+    """
+
+    def __init__(self, n: int = 3, n_features: int = 2 ** 18):
+        self.n = n
+        self.n_features = n_features
+        self._names = []  # row -> name
+        self._rows = {}  # name -> row
+        self._pending = []  # (feature indices, counts) of names not in the matrix yet
+        self._counts = sp.csr_matrix((0, n_features), dtype=np.float32)
+        self._document_frequencies = np.zeros(n_features, dtype=np.int64)
+        self._weighted = None  # TF-IDF rows with unit length, None if outdated
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def add(self, names: Iterable[str]):
+        """Adds names that are not indexed yet."""
+        with self._lock:
+            for name in names:
+                if not name or name in self._rows:
+                    continue
+                indices, counts = self._features(name)
+                self._rows[name] = len(self._names)
+                self._names.append(name)
+                self._pending.append((indices, counts))
+                self._document_frequencies[indices] += 1
+                self._weighted = None
+
+    def query(self, names: List[str], top_k: int = 5) -> List[List[Tuple[str, float]]]:
+        """Returns the top_k (indexed name, cosine similarity) of every query name, best first."""
+        if not names:
+            return []
+        with self._lock:
+            weighted, idf = self._get_weighted()
+            if weighted.shape[0] == 0:
+                return [[] for _ in names]
+            queries = self._normalize(self._vectorize(names).multiply(idf).tocsr())
+            similarities = (queries @ weighted.T).tocsr()
+
+            results = []
+            for row in range(len(names)):
+                start, end = similarities.indptr[row], similarities.indptr[row + 1]
+                scores, columns = similarities.data[start:end], similarities.indices[start:end]
+                if len(scores) > top_k:
+                    best = np.argpartition(-scores, top_k - 1)[:top_k]
+                    scores, columns = scores[best], columns[best]
+                order = np.lexsort((columns, -scores))
+                results.append([(self._names[columns[index]], min(float(scores[index]), 1.0)) for index in order])
+            return results
+
+    def _get_weighted(self) -> Tuple[sp.csr_matrix, np.ndarray]:
+        idf = self._idf()
+        if self._pending:
+            self._counts = sp.vstack([self._counts, self._to_matrix(self._pending)], format="csr")
+            self._pending = []
+        if self._weighted is None:
+            self._weighted = self._normalize(self._counts.multiply(idf).tocsr())
+        return self._weighted, idf
+
+    def _idf(self) -> np.ndarray:
+        return (np.log((1 + len(self._names)) / (1 + self._document_frequencies)) + 1).astype(np.float32)
+
+    def _vectorize(self, names: List[str]) -> sp.csr_matrix:
+        return self._to_matrix([self._features(name) for name in names])
+
+    def _to_matrix(self, features: List[Tuple[np.ndarray, np.ndarray]]) -> sp.csr_matrix:
+        indptr = np.cumsum([0] + [len(indices) for indices, _ in features])
+        indices = np.concatenate([indices for indices, _ in features])
+        counts = np.concatenate([counts for _, counts in features]).astype(np.float32)
+        return sp.csr_matrix((counts, indices, indptr), shape=(len(features), self.n_features))
+
+    def _features(self, name: str) -> Tuple[np.ndarray, np.ndarray]:
+        padded = " " * (self.n - 1) + name + " "
+        hashes = [zlib.crc32(padded[index:index + self.n].encode("utf-8")) % self.n_features
+                  for index in range(max(len(padded) - self.n + 1, 1))]
+        return np.unique(np.array(hashes, dtype=np.int64), return_counts=True)
+
+    @staticmethod
+    def _normalize(matrix: sp.csr_matrix) -> sp.csr_matrix:
+        lengths = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        lengths[lengths == 0] = 1.0
+        return sp.diags(1.0 / lengths).dot(matrix).tocsr()
@@ -0,0 +1,152 @@
+import heapq
+import itertools
+from datetime import datetime
+from colorama import Fore, Style
+from typing import Dict, List, Optional, Tuple, Iterator
+
+from graphbuilder import _iter_relationship_candidates
+
+
+class ExpansionBudget:
+    """Global limits of one graph build, `None` means unlimited.
+
+    Args:
+        max_nodes: Maximum number of nodes added by the build, including the root
+        max_edges: Maximum number of relationships added by the build
+        max_requests: Maximum number of Wikidata entity lookups, one per expanded node and one per
+            added node (its properties). Cache hits are counted as well, so a budget always leads to
+            the same graph regardless of the cache state.
+    """
+
+    def __init__(self, max_nodes: Optional[int] = None, max_edges: Optional[int] = None,
+                 max_requests: Optional[int] = None):
+        self.max_nodes = max_nodes
+        self.max_edges = max_edges
+        self.max_requests = max_requests
+
+    def __repr__(self):
+        return f"ExpansionBudget(max_nodes={self.max_nodes}, max_edges={self.max_edges}, " \
+               f"max_requests={self.max_requests})"
+
+
+class ExpansionPlanner:
+    """Plans a budgeted, best-first expansion of the graph around a root node.
+
+    Instead of truncating every Wikidata property to max_branching_factor claims in the order Wikidata
+    returns them, all candidate relationships of the expanded nodes are ranked in one priority queue
+    and added best first until the budget is spent. A candidate's score is the sum of
+
+    - `current_weight` if the relationship has not ended (no end time)
+    - the weight of its Wikidata rank (`rank_weights`), deprecated claims are skipped by default
+    - the priority of the target label (`label_priority`, defaults to the order of included_node_types)
+    - minus `depth_penalty` per level, so close relationships win over distant ones
+
+    The planner only decides what to add, writing is left to the caller (see
+    graphbuilder.build_graph_from_root and bulkexport.export_graph_from_root).
+
+    Example:
+        >>> planner = ExpansionPlanner(ExpansionBudget(max_nodes=200, max_edges=400))
+        >>> build_graph_from_root("Adidas AG", "Company", date_range, included_nodes, 2, driver, planner=planner)
+    """
+
+    default_rank_weights = {"preferred": 1.0, "normal": 0.0, "deprecated": None}
+
+    def __init__(self, budget: ExpansionBudget, label_priority: Optional[Dict[str, float]] = None,
+                 current_weight: float = 2.0, rank_weights: Optional[Dict[str, Optional[float]]] = None,
+                 depth_penalty: float = 1.5):
+        self.budget = budget
+        self.label_priority = label_priority
+        self.current_weight = current_weight
+        self.rank_weights = rank_weights if rank_weights is not None else self.default_rank_weights
+        self.depth_penalty = depth_penalty
+        self.stats = {}
+
+    def score(self, rel_info: Dict, rel: Dict, depth: int, label_priority: Dict[str, float]) -> Optional[float]:
+        """Scores a candidate relationship, higher is better. Returns None for candidates to skip."""
+        rank_weight = self.rank_weights.get(rel.get("rank", "normal"), 0.0)
+        if rank_weight is None:
+            return None
+
+        score = rank_weight + label_priority.get(rel_info["label"], 0.0) - self.depth_penalty * depth
+        if rel["end_time"] == "NA":
+            score += self.current_weight
+        return score
+
+    def plan(self, root_id: str, root_label: str, included_node_types: List[str],
+             date_range: Tuple[datetime, datetime], max_depth: int) -> Iterator[Tuple[str, Dict, Dict]]:
+        """Yields the relationships to add as (source_id, rel_info, wikidata_entry), best first.
+
+        The root node itself counts against the node and request budget. Every yielded relationship
+        whose target has not been seen before in this build is a new node the caller has to create.
+        Nodes are expanded (up to max_depth) as soon as their first relationship is added.
+        """
+        date_from, date_until = date_range
+        label_priority = self.label_priority or _default_label_priority(included_node_types)
+        self.stats = {"nodes": 1, "edges": 0, "requests": 1, "candidates": 0, "skipped_candidates": 0}
+
+        heap = []
+        tie_breaker = itertools.count()  # keeps Wikidata order among equal scores
+        known_nodes = {root_id}
+        seen_edges = set()
+
+        def expand(node_id: str, node_label: str, depth: int):
+            self.stats["requests"] += 1
+            for rel_info, rel in _iter_relationship_candidates(node_id, node_label, included_node_types,
+                                                               date_from, date_until, truncate=False):
+                self.stats["candidates"] += 1
+                score = self.score(rel_info, rel, depth, label_priority)
+                if score is None:
+                    self.stats["skipped_candidates"] += 1
+                    continue
+                heapq.heappush(heap, (-score, next(tie_breaker), depth, node_id, rel_info, rel))
+
+        expand(root_id, root_label, 0)
+
+        while heap:
+            if not self._within(self.stats["edges"], self.budget.max_edges):
+                break
+
+            _, _, depth, source_id, rel_info, rel = heapq.heappop(heap)
+            edge_key = (rel_info["relationship_type"], source_id, rel["id"], rel["start_time"], rel["end_time"])
+            if edge_key in seen_edges:
+                continue
+
+            is_new_node = rel["id"] not in known_nodes
+            if is_new_node and not (self._within(self.stats["nodes"], self.budget.max_nodes) and
+                                    self._within(self.stats["requests"], self.budget.max_requests)):
+                self.stats["skipped_candidates"] += 1
+                continue
+
+            seen_edges.add(edge_key)
+            self.stats["edges"] += 1
+            if is_new_node:
+                known_nodes.add(rel["id"])
+                self.stats["nodes"] += 1
+                self.stats["requests"] += 1
+
+            yield source_id, rel_info, rel
+
+            if is_new_node and depth + 1 < max_depth and \
+                    self._within(self.stats["requests"], self.budget.max_requests):
+                expand(rel["id"], rel_info["label"], depth + 1)
+
+        self.stats["skipped_candidates"] += len(heap)
+
+    def print_stats(self):
+        print(Fore.BLUE + f"Expansion planner: {self.stats.get('nodes', 0)} nodes, {self.stats.get('edges', 0)} "
+                          f"relationships and {self.stats.get('requests', 0)} Wikidata lookups within {self.budget}, "
+                          f"{self.stats.get('skipped_candidates', 0)} of {self.stats.get('candidates', 0)} "
+                          f"candidates skipped" + Style.RESET_ALL)
+
+    @staticmethod
+    def _within(used: int, limit: Optional[int]) -> bool:
+        return limit is None or used < limit
+
+
+"""functions below are helper functions"""
+
+
+def _default_label_priority(included_node_types: List[str]) -> Dict[str, float]:
+    """Earlier entries of included_node_types get a higher priority, from 1.0 down to almost 0."""
+    count = len(included_node_types)
+    return {label: (count - index) / count for index, label in enumerate(included_node_types)}
@@ -1,14 +1,117 @@
+from contextlib import contextmanager
 from datetime import datetime, timezone
-from neo4j import Driver
+from neo4j import Driver, Session
 from colorama import Fore, Style
-from typing import Optional, Dict, Union, List, Any, Tuple
+from typing import Optional, Dict, Union, List, Any, Tuple, Callable
+from tracing import tracer
 from wikidata.wikidata import wikidata_wbgetentities, wikidata_wbsearchentities
 
 max_branching_factor = 12
 
+# Cypher statements shared by the sync helpers below and their asyncio counterparts in graphbuilder_async.py
+FIND_NODE_QUERY = """
+    MATCH (n {wikidata_id: $wikidata_id})
+    RETURN n, labels(n) as label, n.name as name
+"""
+
+CREATE_NODE_QUERY = """
+    CREATE (n:`{label}`)
+    SET n = $properties
+    RETURN n.wikidata_id as wikidata_id
+"""
+
+CHECK_RELATIONSHIP_QUERY = """
+    MATCH (source {{wikidata_id: $source_id}})-[r:{rel_type}]->(target {{wikidata_id: $target_id}})
+    WHERE r.start_time = $start_time AND r.end_time = $end_time
+    RETURN r
+"""
+
+CREATE_RELATIONSHIP_QUERY = """
+    MATCH (source {{wikidata_id: $source_id}})
+    MATCH (target {{wikidata_id: $target_id}})
+    CREATE (source)-[r:{rel_type} {{
+        start_time: $start_time,
+        end_time: $end_time
+    }}]->(target)
+    RETURN source, target, r, elementId(r) as rel_id
+"""
+
+RELATIONSHIP_TRIPLES_QUERY = """
+    MATCH (n) WHERE n.name = $node_name
+    MATCH (n)-[r]-(connected)
+    WHERE labels(connected)[0] = $node_label
+      AND (NOT $active_only OR r.end_time IS NULL OR r.end_time = "NA")
+      AND NOT coalesce(r.quarantined, false)
+    RETURN type(r) as relationship_type, connected.name as connected_node_name
+"""
+
+RELATIONSHIP_TRIPLES_ALL_LABELS_QUERY = """
+    MATCH (n) WHERE n.name = $node_name
+    MATCH (n)-[r]-(connected)
+    WHERE (NOT $active_only OR r.end_time IS NULL OR r.end_time = "NA")
+      AND NOT coalesce(r.quarantined, false)
+    RETURN type(r) as relationship_type,
+           connected.name as connected_node_name,
+           labels(connected) as connected_labels
+"""
+
+SINGLE_NODE_RELATIONSHIPS_QUERY = """
+    MATCH (n {wikidata_id: $node_id})
+    OPTIONAL MATCH (n)-[r]-(connected)
+    RETURN collect({
+        type: type(r),
+        id: elementId(r),
+        end_time: r.end_time
+    }) as relationships
+"""
+
+TWO_NODES_RELATIONSHIPS_QUERY = """
+    MATCH (source {wikidata_id: $source_id})
+    MATCH (target {wikidata_id: $target_id})
+    OPTIONAL MATCH (source)-[r]-(target)
+    RETURN collect({type: type(r), id: elementId(r)}) as relationships
+"""
+
+UPDATE_RELATIONSHIP_PROPERTY_QUERY = """
+    MATCH ()-[r]-()
+    WHERE elementId(r) = $element_id
+    SET r.{rel_property} = $new_value
+    RETURN r.{rel_property} as new_property_value
+"""
+
+LATEST_CUSTOM_ID_QUERY = """
+    MATCH (n)
+    WHERE n.wikidata_id STARTS WITH $starts_with
+    RETURN toInteger(substring(n.wikidata_id, size($starts_with))) as custom_id
+    ORDER BY custom_id DESC
+    LIMIT 1
+"""
+
+# Labels of the start and end node implied by a relationship type, as created by _get_relationship_dict
+# (PARTNERS_WITH is only created by the updater). None where several labels are possible.
+RELATIONSHIP_LABELS = {
+    "IS_LISTED_IN": ("Company", "StockMarketIndex"),
+    "IS_ACTIVE_IN": ("Company", "Industry_Field"),
+    "OWNS": ("Company", "Company"),
+    "IS_OWNED_BY": ("Company", "Company"),
+    "PARTNERS_WITH": ("Company", "Company"),
+    "HAS_HEADQUARTER_IN": ("Company", "City"),
+    "OFFERS": ("Company", "Product_or_Service"),
+    "WAS_FOUNDED_BY": ("Company", "Founder"),
+    "IS_MANAGED_BY": ("Company", "Manager"),
+    "HAS_BOARD_MEMBER": ("Company", "Board_Member"),
+    "HAS_FINANCIAL_DATA": ("Company", "Financial_Data"),
+    "LOCATED_IN": ("City", "Country"),
+    "EMPLOYED_BY": (None, "Company"),
+}
+
+# Callbacks (wikidata_id, label, properties) called for every node created by create_new_node, e.g. to keep
+# the entity index of the updater up to date, see add_node_created_listener
+node_created_listeners = []
+
 
 def build_graph_from_root(root_name: str, root_label: str, date_range: Tuple[datetime, datetime],
-                          included_node_types: List[str], max_depth: int, driver: Driver) -> str:
+                          included_node_types: List[str], max_depth: int, driver: Driver, planner=None) -> str:
     """
     Builds a graph network from a root node, expanding relationships to specified depth.
 
@@ -22,95 +125,114 @@ def build_graph_from_root(root_name: str, root_label: str, date_range: Tuple[dat
         date_range: Tuple of (start_date, end_date) to filter relationships
         included_node_types: List of node types to include in graph
         max_depth: Maximum depth of graph expansion
-        driver: Neo4j driver instance
+        driver: Neo4j driver or session instance
+        planner: Optional expansionplanner.ExpansionPlanner. If given, relationships are added best first
+            within the planner's budget instead of level by level with max_branching_factor claims per property
 
     Returns:
         str: Wikidata ID of the root node
+
+    Note:
+        The whole build shares one session. Every logical step (creating the root, expanding one node)
+        runs as one managed write transaction, which the driver retries on transient errors. Wikidata
+        lookups happen before the transaction is opened, so a retry only repeats the Cypher statements.
     """
+    with session_scope(driver) as session:
+        # Create root node
+        root_id = wikidata_wbsearchentities(root_name)
+        properties = build_node_properties(root_id, root_label, root_name)
+        queue = [execute_write(session, lambda tx: create_new_node(root_id, root_label, properties, tx))]
+        date_from, date_until = date_range
+
+        if planner is not None:
+            _build_planned_graph(root_id, root_label, date_range, included_node_types, max_depth, session, planner)
+            return root_id
+
+        # Build graph iteratively
+        for level in range(max_depth):
+            print(Fore.BLUE + f"\--Building {root_name} graph: depth {level}---" + Style.RESET_ALL)
+
+            next_queue = []
+            for node_id in queue:
+                if not node_id:
+                    continue
 
-    # Create root node
-    root_id = wikidata_wbsearchentities(root_name)
-    properties = build_node_properties(root_id, root_label, root_name)
-    queue = [create_new_node(root_id, root_label, properties, driver)]
-    date_from, date_until = date_range
+                # Get current node info
+                node = execute_read(session, lambda tx: find_node_by_wikidata_id(node_id, tx))
+                if not node:
+                    raise ValueError(f"Node {node_id} not found in graph")
 
-    # Build graph iteratively
-    for level in range(max_depth):
-        print(Fore.BLUE + f"\--Building {root_name} graph: depth {level}---" + Style.RESET_ALL)
+                # Collect related nodes from Wikidata, then write them in one transaction
+                expansion = [
+                    (rel_info, rel, build_node_properties(rel['id'], rel_info["label"], None))
+                    for rel_info, rel in _iter_relationship_candidates(node_id, node.get("label"),
+                                                                       included_node_types, date_from, date_until)
+                ]
+                next_queue.extend(execute_write(session, _write_node_expansion, node_id, expansion))
 
-        next_queue = []
-        for node_id in queue:
-            if not node_id:
-                continue
+            queue = next_queue
+            print(Fore.BLUE + f"---Completed {root_name} graph: depth {level}---" + Style.RESET_ALL)
 
-            # Get current node info
-            node = find_node_by_wikidata_id(node_id, driver)
-            if not node:
-                raise ValueError(f"Node {node_id} not found in graph")
+    return root_id
 
-            # Process relationships
-            relationships = _get_relationship_dict(node_id, node.get("label")).items()
-            for _, rel_info in relationships:
-                if rel_info["label"] not in included_node_types:
-                    continue
 
-                # Create related nodes and relationships
-                for rel in rel_info["wikidata_entries"]:
-                    if not _is_date_in_range(
-                            rel["start_time"],
-                            rel["end_time"],
-                            date_from,
-                            date_until
-                    ):
-                        continue
-
-                    # Create new node
-                    properties = build_node_properties(
-                        rel['id'],
-                        rel_info["label"],
-                        None
-                    )
-                    new_id = create_new_node(
-                        rel["id"],
-                        rel_info["label"],
-                        properties,
-                        driver
-                    )
-
-                    if new_id:
-                        # Create relationship
-                        create_relationship(
-                            rel_info["relationship_type"],
-                            node_id,
-                            rel["id"],
-                            rel["start_time"],
-                            rel["end_time"],
-                            driver
-                        )
-                        next_queue.append(new_id)
-
-        queue = next_queue
-        print(Fore.BLUE + f"---Completed {root_name} graph: depth {level}---" + Style.RESET_ALL)
+@contextmanager
+def session_scope(driver):
+    """Yields a session to run queries in, reusing an existing unit of work where possible.
 
-    return root_id
+    All helpers of this module accept either a Neo4j driver, a session or a transaction as their `driver`
+    argument. For a driver a fresh session is opened (and closed afterwards), while sessions and
+    transactions are used as they are. Nested helper calls therefore share the caller's session or
+    transaction instead of acquiring another connection from the pool.
 
+    Args:
+        driver: Neo4j driver, session or transaction
 
-def find_node_by_wikidata_id(wikidata_id: str, driver) -> Union[Dict, bool]:
-    """Helper function to find node by Wikidata ID."""
-    query = """
-        MATCH (n {wikidata_id: $wikidata_id})
-        RETURN n, labels(n) as label, n.name as name
+    Yields:
+        An object with a `run` method (session or transaction)
     """
+    if isinstance(driver, Driver):
+        with driver.session() as session:
+            yield session
+    else:
+        yield driver
 
-    with driver.session() as session:
-        result = session.run(query, wikidata_id=wikidata_id).single()
 
-        if result:
-            return {
-                "name": result.get("name"),
-                "label": result.get("label")[0]
-            }
-        return False
+def execute_write(driver, transaction_function, *args, **kwargs):
+    """Runs a transaction function as one managed write transaction.
+
+    Managed transactions are retried by the driver on transient errors (e.g. deadlocks, leader switches).
+    When `driver` already is a transaction, the function simply joins it.
+
+    Args:
+        driver: Neo4j driver, session or transaction
+        transaction_function: Callable taking the transaction as first argument
+        *args, **kwargs: Further arguments for the transaction function
+
+    Returns:
+        The return value of the transaction function
+    """
+    if isinstance(driver, (Driver, Session)):
+        with tracer.span("neo4j write", function=getattr(transaction_function, "__name__", "")), \
+                session_scope(driver) as session:
+            return session.execute_write(transaction_function, *args, **kwargs)
+    return transaction_function(driver, *args, **kwargs)
+
+
+def execute_read(driver, transaction_function, *args, **kwargs):
+    """Runs a transaction function as one managed read transaction, see execute_write."""
+    if isinstance(driver, (Driver, Session)):
+        with tracer.span("neo4j read", function=getattr(transaction_function, "__name__", "")), \
+                session_scope(driver) as session:
+            return session.execute_read(transaction_function, *args, **kwargs)
+    return transaction_function(driver, *args, **kwargs)
+
+
+def find_node_by_wikidata_id(wikidata_id: str, driver) -> Union[Dict, bool]:
+    """Helper function to find node by Wikidata ID."""
+    with session_scope(driver) as session:
+        result = session.run(FIND_NODE_QUERY, wikidata_id=wikidata_id).single()
+        return _format_node(result)
 
 
 def create_new_node(wikidata_id: str, label: str, properties: dict, driver) -> Union[str, Any]:
@@ -121,7 +243,7 @@ def create_new_node(wikidata_id: str, label: str, properties: dict, driver) -> U
     If the node already exists, it simply returns the `wikidata_id` and logs a message.
 
     Args:
-        driver: The Neo4j driver instance.
+        driver: The Neo4j driver, session or transaction.
         wikidata_id: The Wikidata ID of the node.  Used as a unique identifier.
         label: The label to apply to the new node (e.g., "Company", "Manager").
         properties: A dictionary of properties to set on the new node.
@@ -134,19 +256,15 @@ def create_new_node(wikidata_id: str, label: str, properties: dict, driver) -> U
         Exception: If an error occurs during node creation.
     """
 
-    with driver.session() as session:
-        if not find_node_by_wikidata_id(wikidata_id, driver):
+    with session_scope(driver) as session:
+        if not find_node_by_wikidata_id(wikidata_id, session):
 
-            create_query = f"""
-                CREATE (n:`{label}`)
-                SET n = $properties
-                RETURN n.wikidata_id as wikidata_id
-            """
-            result = session.run(create_query, properties=properties).single()
+            result = session.run(CREATE_NODE_QUERY.format(label=label), properties=properties).single()
 
             if result and result.get("wikidata_id"):
                 print(
                     Fore.GREEN + f"Successfully created node with wikidataID '{wikidata_id}' and node properties '{properties}'")
+                notify_node_created(wikidata_id, label, properties)
                 return result.get("wikidata_id")
             else:
                 raise Exception(
@@ -158,6 +276,21 @@ def create_new_node(wikidata_id: str, label: str, properties: dict, driver) -> U
             return wikidata_id
 
 
+def add_node_created_listener(listener: Callable[[str, str, Dict], None]):
+    """Registers a callback called with (wikidata_id, label, properties) for every node created from now on.
+
+    Listeners run right after the CREATE statement, inside the caller's transaction if there is one,
+    and must not raise.
+    """
+    node_created_listeners.append(listener)
+
+
+def notify_node_created(wikidata_id: str, label: str, properties: Dict):
+    """Calls the node created listeners, for writers creating nodes without create_new_node."""
+    for listener in node_created_listeners:
+        listener(wikidata_id, label, properties)
+
+
 def create_relationship(rel_type: str, org_wikidata_id: str, rel_wikidata_id: str,
                         rel_wikidata_start_time: str, rel_wikidata_end_time: str, driver, name_org_node=None,
                         name_rel_node=None):
@@ -172,11 +305,12 @@ def create_relationship(rel_type: str, org_wikidata_id: str, rel_wikidata_id: st
         rel_wikidata_id: Wikidata ID of the related node
         rel_wikidata_start_time: Start time of the relationship
         rel_wikidata_end_time: End time of the relationship
-        driver: Neo4j driver instance
+        driver: Neo4j driver, session or transaction
         name_org_node: Optional name for organization node (for logging)
         name_rel_node: Optional name for related node (for logging)
 
     Returns:
+        str: Element ID of the created relationship
         bool: False if relationship already exists or creation fails
 
     """
@@ -188,44 +322,23 @@ def create_relationship(rel_type: str, org_wikidata_id: str, rel_wikidata_id: st
         "end_time": rel_wikidata_end_time
     }
 
-    # Check if relationship exists
-    check_query = f"""
-        MATCH (source {{wikidata_id: $source_id}})-[r:{rel_type}]->(target {{wikidata_id: $target_id}})
-        WHERE r.start_time = $start_time AND r.end_time = $end_time
-        RETURN r
-    """
-
-    with driver.session() as session:
-        if list(session.run(check_query, params)):
+    with session_scope(driver) as session:
+        # Check if relationship exists
+        if list(session.run(CHECK_RELATIONSHIP_QUERY.format(rel_type=rel_type), params)):
             print(
                 Fore.GREEN + f"Relationship {rel_type} between {org_wikidata_id} and {rel_wikidata_id} already exists" + Style.RESET_ALL)
             return False
 
         # Create relationship if it doesn't exist
-        create_query = f"""
-            MATCH (source {{wikidata_id: $source_id}})
-            MATCH (target {{wikidata_id: $target_id}})
-            CREATE (source)-[r:{rel_type} {{
-                start_time: $start_time,
-                end_time: $end_time
-            }}]->(target)
-            RETURN source, target, r
-        """
-        result = session.run(create_query, params)
-        if list(result):
-            if name_org_node is not None and name_rel_node is not None:
-                print(
-                    Fore.GREEN + f"Successfully created relationship between node '{name_org_node}' with wikidataID '{org_wikidata_id}' and node '{name_rel_node}' with wikidataID' {rel_wikidata_id}' of type '{rel_type}'" + Style.RESET_ALL)
-            else:
-                print(
-                    Fore.GREEN + f"Successfully created relationship between node with wikidataID '{org_wikidata_id}' and node with wikidataID' {rel_wikidata_id}' of type '{rel_type}'" + Style.RESET_ALL)
-
-            return True
+        records = list(session.run(CREATE_RELATIONSHIP_QUERY.format(rel_type=rel_type), params))
+        if records:
+            _print_relationship_created(rel_type, org_wikidata_id, rel_wikidata_id, name_org_node, name_rel_node)
+            return records[0]["rel_id"]
         else:
             return False
 
 
-def get_relationship_triples(node_name: str, node_label: str = None, driver=None):
+def get_relationship_triples(node_name: str, node_label: str = None, driver=None, active_only: bool = False):
     """Retrieves relationship triples (source, relationship, target) for a given node.
 
         Queries Neo4j database to find all relationships connected to the specified node,
@@ -234,8 +347,9 @@ def get_relationship_triples(node_name: str, node_label: str = None, driver=None
 
         Args:
             node_name: Name of the node to find relationships for
-            driver: Neo4j driver instance
+            driver: Neo4j driver, session or transaction
             node_label: Optional label to filter connected nodes by
+            active_only: Skip relationships that have ended (end time other than "NA")
 
         Returns:
             List[Dict[str, str]]: List of relationship triples, each containing:
@@ -250,43 +364,19 @@ def get_relationship_triples(node_name: str, node_label: str = None, driver=None
             ]
         """
 
-    query = """
-        MATCH (n) WHERE n.name = $node_name
-        MATCH (n)-[r]-(connected)
-        WHERE labels(connected)[0] = $node_label
-        RETURN type(r) as relationship_type, connected.name as connected_node_name
-        """
-
-    query_all_node_labels = """
-        MATCH (n) WHERE n.name = $node_name
-        MATCH (n)-[r]-(connected)
-        RETURN type(r) as relationship_type, 
-               connected.name as connected_node_name,
-               labels(connected) as connected_labels
-    """
-
-    with driver.session() as session:
+    with session_scope(driver) as session:
         try:
             if node_label is not None:
-                result = session.run(query,
+                result = session.run(RELATIONSHIP_TRIPLES_QUERY,
                                      node_name=node_name,
-                                     node_label=node_label)
-            else:
-                result = session.run(query_all_node_labels,
-                                     node_name=node_name)
-
-            relationships = []
-            for record in result:
-                relationships.append({"node_from": node_name.replace("'", ""),
-                                      "relationship": record["relationship_type"].replace("'", ""),
-                                      "node_to": record["connected_node_name"].replace("'",
-                                                                                       "")})  # escaping " ' " to prevent issues with the json formatting later
-
-            if relationships:
-                return relationships
+                                     node_label=node_label,
+                                     active_only=active_only)
             else:
-                print(f"No relationships found for node '{node_name}'")
-                return None
+                result = session.run(RELATIONSHIP_TRIPLES_ALL_LABELS_QUERY,
+                                     node_name=node_name,
+                                     active_only=active_only)
+
+            return _format_relationship_triples(node_name, list(result))
         except Exception as e:
             raise Exception(f"Error executing query: {str(e)}")
 
@@ -301,7 +391,7 @@ def get_node_relationships(source_wikidata_id: str = None, target_wikidata_id: s
     Args:
         source_wikidata_id: Wikidata ID of the source node
         target_wikidata_id: Optional Wikidata ID of the target node
-        driver: Neo4j driver instance
+        driver: Neo4j driver, session or transaction
 
     Returns:
         list: List of dictionaries containing relationship information:
@@ -317,7 +407,7 @@ def get_node_relationships(source_wikidata_id: str = None, target_wikidata_id: s
         print(Fore.RED + "Error: No driver provided" + Style.RESET_ALL)
         return []
 
-    with driver.session() as session:
+    with session_scope(driver) as session:
         try:
             # Query for relationships between two specific nodes
             if source_wikidata_id and target_wikidata_id:
@@ -325,7 +415,7 @@ def get_node_relationships(source_wikidata_id: str = None, target_wikidata_id: s
                                                                                                       [])
             # Query for all relationships of a single node
             elif source_wikidata_id:
-                relationships = _query_single_node(source_wikidata_id, driver).get("relationships", [])
+                relationships = _query_single_node(source_wikidata_id, session).get("relationships", [])
             else:
                 raise KeyError(
                     Fore.RED +
@@ -333,16 +423,7 @@ def get_node_relationships(source_wikidata_id: str = None, target_wikidata_id: s
                     Style.RESET_ALL
                 )
 
-            # Format and return relationships
-            return [
-                {
-                    'rel_type': rel['type'],
-                    'rel_id': rel['id'],
-                    'rel_end_time': rel.get('end_time', 'NA')
-                }
-                # for rel in (result["outgoing"] + result["incoming"])
-                for rel in relationships
-            ]
+            return _format_node_relationships(relationships)
 
         except Exception as e:
             raise Exception(f"Error processing relationships: {str(e)}")
@@ -426,7 +507,7 @@ def update_relationship_property(elementID: str, rel_property: str, new_property
         elementID: The unique identifier of the relationship
         rel_property: Name of the property to update
         new_property_value: New value to set for the property
-        driver: Neo4j driver instance
+        driver: Neo4j driver, session or transaction
 
     Returns:
         tuple: (elementID, new_property_value) if update successful
@@ -434,19 +515,14 @@ def update_relationship_property(elementID: str, rel_property: str, new_property
     Raises:
         ValueError: If the relationship update fails
     """
-    update_query = f"""
-        MATCH ()-[r]-() 
-        WHERE elementId(r) = $element_id
-        SET r.{rel_property} = $new_value
-        RETURN r.{rel_property} as new_property_value
-    """
+    update_query = UPDATE_RELATIONSHIP_PROPERTY_QUERY.format(rel_property=rel_property)
 
     params = {
         "element_id": elementID,
         "new_value": new_property_value
     }
 
-    with driver.session() as session:
+    with session_scope(driver) as session:
         result = session.run(update_query, params)
         if result:
             return elementID, new_property_value
@@ -457,7 +533,7 @@ def update_relationship_property(elementID: str, rel_property: str, new_property
 
 
 def reset_graph(driver):
-    with driver.session() as session:
+    with session_scope(driver) as session:
         session.run("MATCH(n) DETACH DELETE n")
 
 
@@ -470,21 +546,13 @@ def get_latest_custom_id(starts_with: str, driver: Driver) -> int:
 
     Args:
         starts_with: what kind of custom id to search for ("customID", "financialID")
-        driver: Neo4j driver instance for database connection
+        driver: Neo4j driver, session or transaction for database connection
 
     Returns:
         int: Highest CustomID number found, or 0 if no CustomID nodes exist
     """
-    query = f"""
-        MATCH (n)
-        WHERE n.wikidata_id STARTS WITH '{starts_with}'
-        RETURN toInteger(substring(n.wikidata_id, {len(starts_with)})) as custom_id
-        ORDER BY custom_id DESC
-        LIMIT 1
-    """
-
-    with driver.session() as session:
-        result = session.run(query).single()
+    with session_scope(driver) as session:
+        result = session.run(LATEST_CUSTOM_ID_QUERY, starts_with=starts_with).single()
         return result["custom_id"] if result else 0
 
 
@@ -553,29 +621,18 @@ def _get_label_specific_properties(label: str, wikidata_id: str, data: Dict) ->
         raise KeyError(f"Unsupported entity type: {label}")
 
 
-def _query_single_node(node_id: str, driver):
+def _query_single_node(node_id: str, session):
     """Queries all relationships for a given node in Neo4j.
 
     Args:
-        driver: Neo4j driver object
         node_id: Wikidata ID of the node to query
+        session: Neo4j session or transaction object
 
     Returns:
         Record containing list of relationships with their types and end times
 
     """
-
-    query = """
-        MATCH (n {wikidata_id: $node_id})
-        OPTIONAL MATCH (n)-[r]-(connected)
-        RETURN collect({
-            type: type(r),
-            id: elementId(r),
-            end_time: r.end_time
-        }) as relationships
-    """
-    with driver.session() as session:
-        return session.run(query, node_id=node_id).single()
+    return session.run(SINGLE_NODE_RELATIONSHIPS_QUERY, node_id=node_id).single()
 
 
 def _query_two_nodes(session, source_id: str, target_id: str):
@@ -591,13 +648,53 @@ def _query_two_nodes(session, source_id: str, target_id: str):
         Record containing list of relationships between nodes
     """
 
-    query = """
-        MATCH (source {wikidata_id: $source_id})
-        MATCH (target {wikidata_id: $target_id})
-        OPTIONAL MATCH (source)-[r]-(target)
-        RETURN collect({type: type(r), id: elementId(r)}) as relationships
-    """
-    return session.run(query, source_id=source_id, target_id=target_id).single()
+    return session.run(TWO_NODES_RELATIONSHIPS_QUERY, source_id=source_id, target_id=target_id).single()
+
+
+def _format_node(record) -> Union[Dict, bool]:
+    """Helper function to turn a FIND_NODE_QUERY record into the node dict returned by the finders."""
+    if record:
+        return {
+            "name": record.get("name"),
+            "label": record.get("label")[0]
+        }
+    return False
+
+
+def _format_relationship_triples(node_name: str, records: list) -> Optional[List[Dict[str, str]]]:
+    """Helper function to turn relationship records into the triples returned by get_relationship_triples."""
+    relationships = []
+    for record in records:
+        relationships.append({"node_from": node_name.replace("'", ""),
+                              "relationship": record["relationship_type"].replace("'", ""),
+                              "node_to": record["connected_node_name"].replace("'",
+                                                                               "")})  # escaping " ' " to prevent issues with the json formatting later
+
+    if relationships:
+        return relationships
+    print(f"No relationships found for node '{node_name}'")
+    return None
+
+
+def _format_node_relationships(relationships: list) -> list:
+    """Helper function to format relationship records as returned by get_node_relationships."""
+    return [
+        {
+            'rel_type': rel['type'],
+            'rel_id': rel['id'],
+            'rel_end_time': rel.get('end_time', 'NA')
+        }
+        for rel in relationships
+    ]
+
+
+def _print_relationship_created(rel_type, org_wikidata_id, rel_wikidata_id, name_org_node=None, name_rel_node=None):
+    if name_org_node is not None and name_rel_node is not None:
+        print(
+            Fore.GREEN + f"Successfully created relationship between node '{name_org_node}' with wikidataID '{org_wikidata_id}' and node '{name_rel_node}' with wikidataID' {rel_wikidata_id}' of type '{rel_type}'" + Style.RESET_ALL)
+    else:
+        print(
+            Fore.GREEN + f"Successfully created relationship between node with wikidataID '{org_wikidata_id}' and node with wikidataID' {rel_wikidata_id}' of type '{rel_type}'" + Style.RESET_ALL)
 
 
 def _clean_string(text: str) -> str:
@@ -605,59 +702,139 @@ def _clean_string(text: str) -> str:
     return text.replace("'", "")
 
 
-def _get_relationship_dict(wikidata_id, label):
+def _build_planned_graph(root_id: str, root_label: str, date_range: Tuple[datetime, datetime],
+                         included_node_types: List[str], max_depth: int, session, planner) -> None:
+    """Writes the relationships chosen by an ExpansionPlanner, one transaction per source node.
+
+    The plan only reads Wikidata, so it is completed first and its relationships are grouped by source
+    node like the expansions of the level by level build. Groups are written in the order their source
+    node was first expanded, which is after the node itself was created by an earlier group. A target
+    can be reached from several sources in any order, so every relationship carries the properties of
+    its target and whichever group is written first creates it.
+    """
+    node_properties = {root_id: None}  # wikidata_id -> properties of the planned nodes, the root exists already
+    expansions = {}  # source_id -> [(rel_info, wikidata_entry, node_properties)], in planning order
+    for source_id, rel_info, rel in planner.plan(root_id, root_label, included_node_types, date_range, max_depth):
+        if rel["id"] not in node_properties:
+            node_properties[rel["id"]] = build_node_properties(rel["id"], rel_info["label"], None)
+        expansions.setdefault(source_id, []).append((rel_info, rel, node_properties[rel["id"]]))
+
+    for source_id, expansion in expansions.items():
+        execute_write(session, _write_node_expansion, source_id, expansion)
+    planner.print_stats()
+
+
+def _write_node_expansion(tx, node_id: str, expansion: list) -> List[str]:
+    """Transaction function creating the related nodes and relationships found for one node.
+
+    Args:
+        tx: Neo4j transaction
+        node_id: Wikidata ID of the expanded node
+        expansion: List of (rel_info, wikidata_entry, node_properties) tuples
+
+    Returns:
+        list: Wikidata IDs of the related nodes, to be expanded on the next level
+    """
+    new_ids = []
+    for rel_info, rel, properties in expansion:
+        # Create new node
+        new_id = create_new_node(
+            rel["id"],
+            rel_info["label"],
+            properties,
+            tx
+        )
+
+        if new_id:
+            # Create relationship
+            create_relationship(
+                rel_info["relationship_type"],
+                node_id,
+                rel["id"],
+                rel["start_time"],
+                rel["end_time"],
+                tx
+            )
+            new_ids.append(new_id)
+    return new_ids
+
+
+def _iter_relationship_candidates(node_id: str, node_label: str, included_node_types: List[str],
+                                  date_from: datetime, date_until: datetime, truncate: bool = True):
+    """Yields (rel_info, wikidata_entry) pairs for every relationship of a node that should be added to the graph.
+
+    This is the Wikidata expansion step of build_graph_from_root: relationships whose target label is not
+    included or whose validity lies outside the date range are skipped. With truncate=False the claims are
+    not cut to max_branching_factor, which the ExpansionPlanner uses to rank all candidates itself.
+    """
+    for _, rel_info in _get_relationship_dict(node_id, node_label, truncate).items():
+        if rel_info["label"] not in included_node_types:
+            continue
+
+        for rel in rel_info["wikidata_entries"]:
+            if not _is_date_in_range(
+                    rel["start_time"],
+                    rel["end_time"],
+                    date_from,
+                    date_until
+            ):
+                continue
+            yield rel_info, rel
+
+
+def _get_relationship_dict(wikidata_id, label, truncate=True):
     data = wikidata_wbgetentities(wikidata_id)
     try:
         if label == "Company":
             relationship_dict = {
                 "StockMarketIndex": {
-                    "wikidata_entries": _get_wikidata_rels(data, wikidata_id, ["P361"]),
+                    "wikidata_entries": _get_wikidata_rels(data, wikidata_id, ["P361"], truncate),
                     "label": "StockMarketIndex",
                     "relationship_type": "IS_LISTED_IN",
                 },
                 "Industry_Field": {
-                    "wikidata_entries": _get_wikidata_rels(data, wikidata_id, ["P452"]),
+                    "wikidata_entries": _get_wikidata_rels(data, wikidata_id, ["P452"], truncate),
                     "label": "Industry_Field",
                     "relationship_type": "IS_ACTIVE_IN",
                 },
                 "Subsidiary": {
-                    "wikidata_entries": _get_wikidata_rels(data, wikidata_id, ["P355"]),
+                    "wikidata_entries": _get_wikidata_rels(data, wikidata_id, ["P355"], truncate),
                     # removed P1830 because also included buildings, football clubs etx
                     "label": "Company",
                     "relationship_type": "OWNS",
                 },
                 "Owner": {
-                    "wikidata_entries": _get_wikidata_rels(data, wikidata_id, ["127"]),
+                    "wikidata_entries": _get_wikidata_rels(data, wikidata_id, ["127"], truncate),
                     "label": "Company",
                     "relationship_type": "IS_OWNED_BY",
                 },
                 "City": {
-                    "wikidata_entries": _get_wikidata_rels(data, wikidata_id, ["P159"]),
+                    "wikidata_entries": _get_wikidata_rels(data, wikidata_id, ["P159"], truncate),
                     "label": "City",
                     "relationship_type": "HAS_HEADQUARTER_IN",
                 },
                 "Product_or_Service": {
-                    "wikidata_entries": _get_wikidata_rels(data, wikidata_id, ["P1056"]),
+                    "wikidata_entries": _get_wikidata_rels(data, wikidata_id, ["P1056"], truncate),
                     "label": "Product_or_Service",
                     "relationship_type": "OFFERS",
                 },
                 "Founder": {
-                    "wikidata_entries": _get_wikidata_rels(data, wikidata_id, ["P112"]),
+                    "wikidata_entries": _get_wikidata_rels(data, wikidata_id, ["P112"], truncate),
                     "label": "Founder",
                     "relationship_type": "WAS_FOUNDED_BY",
                 },
                 "Manager": {
-                    "wikidata_entries": _get_wikidata_rels(data, wikidata_id, ["P169", "P1037"]),
+                    "wikidata_entries": _get_wikidata_rels(data, wikidata_id, ["P169", "P1037"], truncate),
                     "label": "Manager",
                     "relationship_type": "IS_MANAGED_BY",
                 },
                 "Board_Member": {
-                    "wikidata_entries": _get_wikidata_rels(data, wikidata_id, ["P3320"]),
+                    "wikidata_entries": _get_wikidata_rels(data, wikidata_id, ["P3320"], truncate),
                     "label": "Board_Member",
                     "relationship_type": "HAS_BOARD_MEMBER",
                 },
                 "Financial_Data": {
-                    "wikidata_entries": _get_wikidata_financial_rels(data, wikidata_id, ["P2139"]),
+                    "wikidata_entries": _get_wikidata_financial_rels(data, wikidata_id, ["P2139"], truncate),
                     "label": "Financial_Data",
                     "relationship_type": "HAS_FINANCIAL_DATA",
                 }
@@ -670,7 +847,7 @@ def _get_relationship_dict(wikidata_id, label):
         elif label == "City":
             relationship_dict = {
                 "Country": {
-                    "wikidata_entries": _get_wikidata_rels(data, wikidata_id, ["P17"]),
+                    "wikidata_entries": _get_wikidata_rels(data, wikidata_id, ["P17"], truncate),
                     "label": "Country",
                     "relationship_type": "LOCATED_IN",
                 }
@@ -682,7 +859,7 @@ def _get_relationship_dict(wikidata_id, label):
         elif label in ["Manager", "Founder", "Board_Member"]:
             relationship_dict = {
                 "Employer": {
-                    "wikidata_entries": _get_wikidata_rels(data, wikidata_id, ["P108"]),
+                    "wikidata_entries": _get_wikidata_rels(data, wikidata_id, ["P108"], truncate),
                     "label": "Company",
                     "relationship_type": "EMPLOYED_BY",
                 }
@@ -696,7 +873,7 @@ def _get_relationship_dict(wikidata_id, label):
         raise KeyError(f"KeyError for label: '{label}': {e}")
 
 
-def _get_wikidata_rels(data: dict, wikidata_id: str, property_ids: list) -> list[
+def _get_wikidata_rels(data: dict, wikidata_id: str, property_ids: list, truncate: bool = True) -> list[
     dict[str, Union[Union[datetime, str], Any]]]:
     result = []
 
@@ -723,15 +900,16 @@ def _get_wikidata_rels(data: dict, wikidata_id: str, property_ids: list) -> list
                 print(
                     Fore.YELLOW + f"Key Error for single relationship for wikidata_id {wikidata_id}, skipping this relationship. Error {e}" + Style.RESET_ALL)
                 continue
-            result.append({"id": id, "start_time": start_time, "end_time": end_time})
+            result.append({"id": id, "start_time": start_time, "end_time": end_time,
+                           "rank": entry.get("rank", "normal")})
 
-    if max_branching_factor is not None:
+    if truncate and max_branching_factor is not None:
         result = result[:max_branching_factor]
 
     return result
 
 
-def _get_wikidata_financial_rels(data: dict, wikidata_id: str, property_ids: list) -> list[
+def _get_wikidata_financial_rels(data: dict, wikidata_id: str, property_ids: list, truncate: bool = True) -> list[
     dict[str, Union[Union[datetime, str], Any]]]:
     # note: maybe there is a more elegant way to get the notes, as we now rely on P2129/total_revenue,
     # which might not be available although other financial data might be available
@@ -761,9 +939,10 @@ def _get_wikidata_financial_rels(data: dict, wikidata_id: str, property_ids: lis
                 print(
                     Fore.YELLOW + f"Key Error for financial relationship for wikidata_id {wikidata_id}, skipping this relationship. Error {e}" + Style.RESET_ALL)
                 continue
-            result.append({"id": id, "start_time": start_time, "end_time": end_time})
+            result.append({"id": id, "start_time": start_time, "end_time": end_time,
+                           "rank": entry.get("rank", "normal")})
 
-    if max_branching_factor is not None:
+    if truncate and max_branching_factor is not None:
         result = result[:max_branching_factor]
 
     return result
@@ -893,7 +1072,7 @@ def delete_relationship_by_id(relationship_id: str, driver) -> bool:
     """
 
     try:
-        with driver.session() as session:
+        with session_scope(driver) as session:
             result = session.run(delete_query,
                                  relationship_id=relationship_id).single()
 
@@ -912,7 +1091,7 @@ def delete_node(wikidata_id: str, driver) -> Union[str, bool]:
     from the Neo4j database using the provided Wikidata ID as identifier.
 
     Args:
-        driver: The Neo4j driver instance.
+        driver: The Neo4j driver, session or transaction.
         wikidata_id: The Wikidata ID of the node to delete.
 
     Returns:
@@ -933,7 +1112,7 @@ def delete_node(wikidata_id: str, driver) -> Union[str, bool]:
     """
 
     try:
-        with driver.session() as session:
+        with session_scope(driver) as session:
             result = session.run(delete_query, wikidata_id=wikidata_id).single()
 
             if result and result["deleted_count"] > 0:
@@ -0,0 +1,281 @@
+import asyncio
+from datetime import datetime
+from neo4j import AsyncDriver
+from colorama import Fore, Style
+from typing import Optional, Dict, Union, List, Any, Tuple, Iterable
+
+from wikidata.wikidata import wikidata_wbsearchentities_async
+from graphbuilder import FIND_NODE_QUERY, CREATE_NODE_QUERY, CHECK_RELATIONSHIP_QUERY, \
+    CREATE_RELATIONSHIP_QUERY, RELATIONSHIP_TRIPLES_QUERY, RELATIONSHIP_TRIPLES_ALL_LABELS_QUERY, \
+    SINGLE_NODE_RELATIONSHIPS_QUERY, TWO_NODES_RELATIONSHIPS_QUERY, UPDATE_RELATIONSHIP_PROPERTY_QUERY, \
+    build_node_properties, notify_node_created, _iter_relationship_candidates, _format_node, _format_relationship_triples, \
+    _format_node_relationships, _print_relationship_created
+
+# Upper bound of concurrently running queries per gather call, should stay below the driver's max_connection_pool_size
+max_concurrency = 16
+
+
+async def build_graph_from_root_async(root_name: str, root_label: str, date_range: Tuple[datetime, datetime],
+                                      included_node_types: List[str], max_depth: int, driver: AsyncDriver) -> str:
+    """
+    Asyncio variant of graphbuilder.build_graph_from_root.
+
+    Expands the graph level by level like the sync builder, but processes a whole frontier at once:
+    Wikidata lookups, node existence checks, node creations and relationship creations of one level
+    are each awaited concurrently over the driver's connection pool. Children referenced by several
+    parents of the same level are only created (and expanded) once, and node properties are only
+    fetched from Wikidata for children that are not in the graph yet. Every node and relationship is
+    written in its own managed transaction, which the driver retries on transient errors.
+
+    Args:
+        root_name: Name of the root node to start graph from
+        root_label: Type/label of the root node
+        date_range: Tuple of (start_date, end_date) to filter relationships
+        included_node_types: List of node types to include in graph
+        max_depth: Maximum depth of graph expansion
+        driver: Neo4j async driver instance
+
+    Returns:
+        str: Wikidata ID of the root node
+    """
+    root_id = await wikidata_wbsearchentities_async(root_name)
+    properties = await asyncio.to_thread(build_node_properties, root_id, root_label, root_name)
+    queue = [await create_new_node_async(root_id, root_label, properties, driver)]
+    date_from, date_until = date_range
+    expanded = set()
+
+    for level in range(max_depth):
+        print(Fore.BLUE + f"\--Building {root_name} graph asynchronously: depth {level}---" + Style.RESET_ALL)
+
+        queue = [node_id for node_id in dict.fromkeys(queue) if node_id and node_id not in expanded]
+        expanded.update(queue)
+        nodes = await find_nodes_by_wikidata_ids_async(queue, driver)
+        missing = [node_id for node_id, node in nodes.items() if not node]
+        if missing:
+            raise ValueError(f"Nodes {missing} not found in graph")
+
+        # Wikidata expansion of the whole frontier
+        candidates_per_node = await _gather_bounded(
+            asyncio.to_thread(lambda n=node_id: list(
+                _iter_relationship_candidates(n, nodes[n]["label"], included_node_types, date_from, date_until)))
+            for node_id in queue
+        )
+
+        new_nodes = {}
+        new_relationships = []
+        for node_id, candidates in zip(queue, candidates_per_node):
+            for rel_info, rel in candidates:
+                new_nodes.setdefault(rel["id"], rel_info["label"])
+                new_relationships.append((rel_info["relationship_type"], node_id, rel["id"],
+                                          rel["start_time"], rel["end_time"]))
+
+        # Create missing nodes before the relationships, both concurrently
+        existing = await find_nodes_by_wikidata_ids_async(new_nodes, driver)
+        to_create = [(wikidata_id, label) for wikidata_id, label in new_nodes.items() if not existing[wikidata_id]]
+        node_properties = await _gather_bounded(
+            asyncio.to_thread(build_node_properties, wikidata_id, label, None) for wikidata_id, label in to_create
+        )
+        await _gather_bounded(
+            create_new_node_async(wikidata_id, label, properties, driver)
+            for (wikidata_id, label), properties in zip(to_create, node_properties)
+        )
+        await _gather_bounded(
+            create_relationship_async(*relationship, driver)
+            for relationship in dict.fromkeys(new_relationships)
+        )
+
+        queue = list(new_nodes)
+        print(Fore.BLUE + f"---Completed {root_name} graph asynchronously: depth {level}---" + Style.RESET_ALL)
+
+    return root_id
+
+
+async def find_node_by_wikidata_id_async(wikidata_id: str, driver: AsyncDriver) -> Union[Dict, bool]:
+    """Asyncio variant of graphbuilder.find_node_by_wikidata_id."""
+    async with driver.session() as session:
+        result = await session.run(FIND_NODE_QUERY, wikidata_id=wikidata_id)
+        return _format_node(await result.single())
+
+
+async def find_nodes_by_wikidata_ids_async(wikidata_ids: Iterable[str], driver: AsyncDriver) -> Dict[
+    str, Union[Dict, bool]]:
+    """Checks the existence of many nodes concurrently, e.g. for a whole expansion frontier.
+
+    Returns:
+        dict: Mapping of every given Wikidata ID to its node dict, or False if the node does not exist
+    """
+    wikidata_ids = list(dict.fromkeys(wikidata_ids))
+    nodes = await _gather_bounded(find_node_by_wikidata_id_async(wikidata_id, driver) for wikidata_id in wikidata_ids)
+    return dict(zip(wikidata_ids, nodes))
+
+
+async def create_new_node_async(wikidata_id: str, label: str, properties: dict, driver: AsyncDriver) -> Union[
+    str, Any]:
+    """Asyncio variant of graphbuilder.create_new_node.
+
+    The existence check and the creation run in one managed write transaction, so concurrent calls
+    for the same node create it once and transient errors are retried by the driver.
+    """
+    async with driver.session() as session:
+        created = await session.execute_write(_create_node_tx, wikidata_id, label, properties)
+
+    if created:
+        print(
+            Fore.GREEN + f"Successfully created node with wikidataID '{wikidata_id}' and node properties '{properties}'")
+        notify_node_created(wikidata_id, label, properties)
+    else:
+        print(
+            Fore.GREEN + f"Node with wikidata_id: {wikidata_id} and properties '{properties}' already exists and has therefore not been added" + Style.RESET_ALL)
+    return wikidata_id
+
+
+async def create_relationship_async(rel_type: str, org_wikidata_id: str, rel_wikidata_id: str,
+                                    rel_wikidata_start_time: str, rel_wikidata_end_time: str, driver: AsyncDriver,
+                                    name_org_node=None, name_rel_node=None) -> Union[str, bool]:
+    """Asyncio variant of graphbuilder.create_relationship, checking and creating in one managed write transaction."""
+    params = {
+        "source_id": org_wikidata_id,
+        "target_id": rel_wikidata_id,
+        "start_time": rel_wikidata_start_time,
+        "end_time": rel_wikidata_end_time
+    }
+
+    async with driver.session() as session:
+        rel_id = await session.execute_write(_create_relationship_tx, rel_type, params)
+
+    if rel_id is None:
+        print(
+            Fore.GREEN + f"Relationship {rel_type} between {org_wikidata_id} and {rel_wikidata_id} already exists" + Style.RESET_ALL)
+        return False
+    if rel_id:
+        _print_relationship_created(rel_type, org_wikidata_id, rel_wikidata_id, name_org_node, name_rel_node)
+    return rel_id
+
+
+async def get_relationship_triples_async(node_name: str, node_label: str = None, driver: AsyncDriver = None,
+                                         active_only: bool = False) -> Optional[List[Dict[str, str]]]:
+    """Asyncio variant of graphbuilder.get_relationship_triples."""
+    async with driver.session() as session:
+        try:
+            if node_label is not None:
+                result = await session.run(RELATIONSHIP_TRIPLES_QUERY, node_name=node_name, node_label=node_label,
+                                           active_only=active_only)
+            else:
+                result = await session.run(RELATIONSHIP_TRIPLES_ALL_LABELS_QUERY, node_name=node_name,
+                                           active_only=active_only)
+
+            return _format_relationship_triples(node_name, [record async for record in result])
+        except Exception as e:
+            raise Exception(f"Error executing query: {str(e)}")
+
+
+async def get_relationship_triples_for_companies_async(companies: Iterable[str], node_label: str = None,
+                                                       driver: AsyncDriver = None) -> Dict[str, Optional[List[Dict]]]:
+    """Retrieves the relationship triples of several companies concurrently.
+
+    Returns:
+        dict: Mapping of company name to the result of get_relationship_triples for that company
+    """
+    companies = list(dict.fromkeys(companies))
+    triples = await _gather_bounded(
+        get_relationship_triples_async(company, node_label=node_label, driver=driver) for company in companies)
+    return dict(zip(companies, triples))
+
+
+async def get_node_relationships_async(source_wikidata_id: str = None, target_wikidata_id: str = None,
+                                       driver: AsyncDriver = None) -> list:
+    """Asyncio variant of graphbuilder.get_node_relationships."""
+    if driver is None:
+        print(Fore.RED + "Error: No driver provided" + Style.RESET_ALL)
+        return []
+
+    async with driver.session() as session:
+        try:
+            if source_wikidata_id and target_wikidata_id:
+                result = await session.run(TWO_NODES_RELATIONSHIPS_QUERY, source_id=source_wikidata_id,
+                                           target_id=target_wikidata_id)
+            elif source_wikidata_id:
+                result = await session.run(SINGLE_NODE_RELATIONSHIPS_QUERY, node_id=source_wikidata_id)
+            else:
+                raise KeyError(
+                    Fore.RED +
+                    f"Error: No source wikidata_id provided (source: '{source_wikidata_id}', target: '{target_wikidata_id}')" +
+                    Style.RESET_ALL
+                )
+
+            record = await result.single()
+            return _format_node_relationships(record.get("relationships", []) if record else [])
+
+        except Exception as e:
+            raise Exception(f"Error processing relationships: {str(e)}")
+
+
+async def update_relationship_property_async(elementID: str, rel_property: str, new_property_value: str,
+                                             driver: AsyncDriver) -> tuple:
+    """Asyncio variant of graphbuilder.update_relationship_property.
+
+    Raises:
+        ValueError: If no relationship with this element ID exists
+    """
+    params = {
+        "element_id": elementID,
+        "new_value": new_property_value
+    }
+
+    async with driver.session() as session:
+        updated = await session.execute_write(_update_relationship_property_tx, rel_property, params)
+    if updated:
+        return elementID, new_property_value
+
+    raise ValueError(
+        f"Failed to update property '{rel_property}' for relationship '{elementID}'"
+    )
+
+
+"""functions below are helper functions"""
+
+
+async def _gather_bounded(coroutines: Iterable, limit: int = None) -> list:
+    """Awaits coroutines concurrently with at most `limit` (default: max_concurrency) running at the same time.
+
+    Results are returned in the order of the given coroutines, like asyncio.gather.
+    """
+    semaphore = asyncio.Semaphore(limit or max_concurrency)
+
+    async def _bounded(coroutine):
+        async with semaphore:
+            return await coroutine
+
+    return await asyncio.gather(*(_bounded(coroutine) for coroutine in coroutines))
+
+
+async def _create_node_tx(tx, wikidata_id: str, label: str, properties: dict) -> bool:
+    """Creates the node unless it exists. Returns whether it was created."""
+    result = await tx.run(FIND_NODE_QUERY, wikidata_id=wikidata_id)
+    if await result.single():
+        return False
+    if properties is None:
+        raise ValueError(f"Error creating node with wikidata_id: {wikidata_id} and node properties: {properties}")
+
+    result = await tx.run(CREATE_NODE_QUERY.format(label=label), properties=properties)
+    record = await result.single()
+    if not (record and record.get("wikidata_id")):
+        raise Exception(
+            f"Error creating node with wikidata_id: {wikidata_id} and node properties: {properties}")
+    return True
+
+
+async def _create_relationship_tx(tx, rel_type: str, params: Dict) -> Union[str, bool, None]:
+    """Creates the relationship unless it exists. Returns its element ID, None if it existed, False if a node is missing."""
+    result = await tx.run(CHECK_RELATIONSHIP_QUERY.format(rel_type=rel_type), params)
+    if await result.fetch(1):
+        return None
+
+    result = await tx.run(CREATE_RELATIONSHIP_QUERY.format(rel_type=rel_type), params)
+    records = await result.fetch(1)
+    return records[0]["rel_id"] if records else False
+
+
+async def _update_relationship_property_tx(tx, rel_property: str, params: Dict) -> bool:
+    result = await tx.run(UPDATE_RELATIONSHIP_PROPERTY_QUERY.format(rel_property=rel_property), params)
+    return await result.single() is not None
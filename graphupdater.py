@@ -1,29 +1,126 @@
-import configparser
+import asyncio
 import json
 import re
+import threading
 
-import google.generativeai as genai
 from datetime import datetime, timezone
 from colorama import Fore, Style
 from neo4j import Driver
 from typing import List, Dict, Tuple, Optional, Any
 
-from wikidata.wikidata import wikidata_wbsearchentities
-from graphbuilder import create_relationship, get_node_relationships, \
-    get_relationship_triples, update_relationship_property, get_latest_custom_id, \
-    find_node_by_wikidata_id, create_new_node, build_node_properties
+from wikidata.wikidata import wikidata_wbsearchentities, wikidata_wbsearchentities_async
+from llmbackend import generate_text
+from typeresolver import TypeResolver
+from triplecontext import TripleContextBuilder
+from sanitychecker import SpeculativeSanityChecker
+from entityindex import EntityIndex
+from entitymatcher import NgramMatcher
+from llmaccounting import llm_accounting
+from tracing import tracer
+from graphbuilder import get_relationship_triples, get_latest_custom_id, build_node_properties, session_scope, \
+    execute_read, execute_write, add_node_created_listener, notify_node_created
+from graphbuilder_async import _gather_bounded
 
-model = genai.GenerativeModel("gemini-1.5-pro-latest")
-config = configparser.ConfigParser()
-config.read('config.ini')
-genai.configure(api_key=config['gemini']['api_key'])
 
 global custom_id
 custom_id = None
+_custom_id_lock = threading.Lock()  # custom IDs are allocated by concurrent update workers
+
+# Resolves the node types of added triples from the graph and the relationship schema, the LLM is the last resort
+type_resolver = TypeResolver(llm_fallback=lambda triple, nodes_to_include: determine_triple_types(
+    triple, nodes_to_include, 1, 3))
+
+# Resolves LLM-produced entity names to node IDs locally, filled by main and by every node created in the graph
+entity_index = EntityIndex(min_similarity=0.75, matcher=NgramMatcher())  # cosine of TF-IDF n-grams
+add_node_created_listener(lambda wikidata_id, label, properties: entity_index.add(
+    wikidata_id, [properties.get("name")], label))
+
+# Selects the most relevant active triples within a token budget for the change prompts
+triple_context_builder = TripleContextBuilder(token_budget=1500)
+
+# Checks written updates with the LLM in the background once enabled, see _apply_changes
+speculative_checker = SpeculativeSanityChecker(check=lambda *args: llm_sanity_check(*args),
+                                               compensate=lambda *args: _compensate_changes(*args))
+
+# Relationship types the LLM may propose when updating triples
+CHANGE_RELATIONSHIP_TYPES = ["OWNS", "PARTNERS_WITH", "IS_ACTIVE_IN", "IS_MANAGED_BY", "WAS_FOUNDED_BY",
+                             "HAS_BOARD_MEMBER", "HAS_HEADQUARTER_IN", "OFFERS", "IS_LISTED_IN"]
+
+# Batched statements of _write_changes, labels and relationship types cannot be parameters
+BATCH_CREATE_NODES_QUERY = """
+    UNWIND $nodes AS node
+    OPTIONAL MATCH (existing {{wikidata_id: node.wikidata_id}})
+    WITH node, existing WHERE existing IS NULL
+    CREATE (n:`{label}`)
+    SET n = node
+    RETURN n.wikidata_id as wikidata_id
+"""
+
+EXISTING_NODES_QUERY = """
+    UNWIND $wikidata_ids AS wikidata_id
+    MATCH (n {wikidata_id: wikidata_id})
+    RETURN DISTINCT n.wikidata_id as wikidata_id
+"""
+
+BATCH_END_RELATIONSHIPS_QUERY = """
+    UNWIND $endings AS ending
+    MATCH (source {wikidata_id: ending.source_id})-[r]-(target {wikidata_id: ending.target_id})
+    WHERE type(r) = ending.rel_type AND (r.end_time IS NULL OR r.end_time = "NA")
+        AND NOT coalesce(r.quarantined, false)
+    SET r.end_time = $end_time
+    RETURN ending {.*, rel_id: elementId(r), end_time: r.end_time} as rel
+"""
+
+BATCH_CREATE_RELATIONSHIPS_QUERY = """
+    UNWIND $relationships AS rel
+    MATCH (source {{wikidata_id: rel.source_id}})
+    MATCH (target {{wikidata_id: rel.target_id}})
+    WHERE NOT EXISTS {{
+        MATCH (source)-[active:`{rel_type}`]->(target)
+        WHERE (active.end_time IS NULL OR active.end_time = "NA") AND NOT coalesce(active.quarantined, false)
+    }}
+    CREATE (source)-[r:`{rel_type}` {{start_time: $start_time, end_time: "NA"}}]->(target)
+    RETURN rel {{.*, rel_id: elementId(r)}} as rel
+"""
+
+# Compensating statements of _compensate_changes for updates rejected by the reasoning sanity check
+DELETE_RELATIONSHIPS_QUERY = """
+    UNWIND $rel_ids AS rel_id
+    MATCH ()-[r]->() WHERE elementId(r) = rel_id
+    DELETE r
+"""
+
+REACTIVATE_RELATIONSHIPS_QUERY = """
+    UNWIND $relationships AS rel
+    MATCH ()-[r]->() WHERE elementId(r) = rel.rel_id AND r.end_time = rel.end_time
+    SET r.end_time = "NA"
+"""
+
+DELETE_ISOLATED_NODES_QUERY = """
+    UNWIND $wikidata_ids AS wikidata_id
+    MATCH (n {wikidata_id: wikidata_id}) WHERE NOT (n)--()
+    DELETE n
+"""
+
+# Quarantined relationships are kept for review but excluded by every read and write of the updater (the triple
+# queries of graphbuilder, the neighbourhood cache, the batched statements above), a rejected end time is undone
+# and kept as quarantined_end_time
+QUARANTINE_RELATIONSHIPS_QUERY = """
+    UNWIND $rel_ids AS rel_id
+    MATCH ()-[r]->() WHERE elementId(r) = rel_id
+    SET r.quarantined = true, r.quarantine_reason = $reason
+"""
+
+QUARANTINE_ENDINGS_QUERY = """
+    UNWIND $relationships AS rel
+    MATCH ()-[r]->() WHERE elementId(r) = rel.rel_id AND r.end_time = rel.end_time
+    SET r.end_time = "NA", r.quarantined_end_time = rel.end_time, r.quarantine_reason = $reason
+"""
 
 
 def update_neo4j_graph(article: str, companies: List[str], node_types: List[str], nodes_to_include: List[str],
-                       driver) -> Tuple[List[Dict], List[Dict], List[Dict]]:
+                       driver, neighbourhood_cache=None, write: bool = True,
+                       preclassifier=None) -> Tuple[List[Dict], List[Dict], List[Dict]]:
     """Updates Neo4j graph based on article analysis and company relationships.
 
     Identifies changes in company relationships from article content and updates
@@ -35,7 +132,11 @@ def update_neo4j_graph(article: str, companies: List[str], node_types: List[str]
         companies: List of company names to analyze
         node_types: List of possible node types
         nodes_to_include: List of node types to include in graph
-        driver: Neo4j driver instance
+        driver: Neo4j driver or session instance
+        neighbourhood_cache: Optional NeighbourhoodCache serving triple, node and relationship lookups
+            from an in-memory mirror of the company's neighbourhood (kept up to date write-through)
+        write: If False, changes are only determined but neither checked nor written, e.g. for benchmarks
+        preclassifier: Optional preclassifier.PreClassifier resolving obvious articles without LLM call
 
     Returns:
         Tuple containing lists of:
@@ -43,11 +144,45 @@ def update_neo4j_graph(article: str, companies: List[str], node_types: List[str]
         - deleted relationships
         - unchanged relationships
 
+    Note:
+        All graph access of one article shares a single session. The existing triples are read in one
+        managed transaction, and all added and ended relationships of the article are written in one
+        managed write transaction of batched statements (see _write_changes). The driver retries it on
+        transient errors; any other failure rolls the whole update of the article back.
     """
-    # Find central company and node type requiring change
-    company = find_company_at_center(article, companies, 1, 3)
-    node_type = find_node_type(article, node_types)
+    with tracer.span("update article") as span, llm_accounting.article():
+        # Find central company and node type requiring change
+        with tracer.span("classification"):
+            company, node_type = classify_article(article, companies, node_types, 1, 3, preclassifier)
+        if span is not None:
+            span["attributes"].update(company=company, node_type=node_type)
+        return update_company_neighbourhood(article, company, node_type, nodes_to_include, driver,
+                                            neighbourhood_cache, write)
+
+
+def update_company_neighbourhood(article: str, company: str, node_type: str, nodes_to_include: List[str], driver,
+                                 neighbourhood_cache=None, write: bool = True,
+                                 with_llm_sanity_check: bool = True) -> Tuple[
+    List[Dict], List[Dict], List[Dict]]:
+    """Second half of update_neo4j_graph for an already classified article.
+
+    Retrieves the company's triples of the node type, lets the LLM update them and writes the
+    changes. Everything in here reads or writes the company's neighbourhood, so concurrent callers
+    have to serialize it per company (see updatepipeline.ConcurrentUpdatePipeline).
+
+    Args:
+        article: Text content of the article
+        company: Central company as returned by classify_article, or "None"
+        node_type: Node type requiring change as returned by classify_article, or "None"
+        nodes_to_include: List of node types to include in graph
+        driver: Neo4j driver or session instance
+        neighbourhood_cache: Optional NeighbourhoodCache, see update_neo4j_graph
+        write: If False, changes are only determined but neither checked nor written
+        with_llm_sanity_check: If False, the reasoning sanity check is skipped (see _apply_changes)
 
+    Returns:
+        Tuple of added, deleted and unchanged relationships
+    """
     if company == "None":
         print(Fore.RED + f"No central company found in article: '{article}'" + Style.RESET_ALL)
         return [], [], []
@@ -58,39 +193,211 @@ def update_neo4j_graph(article: str, companies: List[str], node_types: List[str]
 
     print(Fore.GREEN + f"Analyzing changes for {company} ({node_type})" + Style.RESET_ALL)
 
-    # Get existing relationships
-    relevant_triples = get_relationship_triples(company, node_label=node_type, driver=driver)
+    with session_scope(driver) as session:
+        # Get existing active relationships, most relevant first within the token budget
+        with tracer.span("triple retrieval"):
+            if neighbourhood_cache is not None:
+                active_triples = neighbourhood_cache.get_relationship_triples(company, node_label=node_type,
+                                                                              active_only=True)
+            else:
+                active_triples = execute_read(session, lambda tx: get_relationship_triples(
+                    company, node_label=node_type, driver=tx, active_only=True))
+            relevant_triples, _ = triple_context_builder.build(article, active_triples)
+
+        # Find changes
+        with tracer.span("change extraction"):
+            added, deleted, unchanged = find_change_triples(
+                article, company, node_type, relevant_triples, 1, 4, session)
+
+        if write:
+            _apply_changes(article, added, deleted, relevant_triples, nodes_to_include, session,
+                           neighbourhood_cache, with_llm_sanity_check)
 
-    # Find changes
-    added, deleted, unchanged = find_change_triples(
-        article, company, node_type, relevant_triples, 1, 4, driver)
+    return added, deleted, unchanged
 
-    # These checks can be used to iterate on find_change_triples for a back and forth until checks are passing, although this will require a lot of extra compute
-    formal_check = formal_sanity_check(added, deleted, relevant_triples)
-    reasoning_check = llm_sanity_check(added, deleted, relevant_triples, article)
-    if formal_check["correct_update"]:
-        print(Fore.GREEN + "Formal sanity check: " + str(formal_check) + Style.RESET_ALL)
-    else:
-        print(Fore.RED + "Formal sanity check: " + str(formal_check) + Style.RESET_ALL)
-    if reasoning_check["correct_update"]:
-        print(Fore.GREEN + "Reasoning sanity check: " + str(reasoning_check) + Style.RESET_ALL)
-    else:
-        print(Fore.RED + "Reasoning sanity check: " + str(reasoning_check) + Style.RESET_ALL)
 
-    # Process additions
-    for triple in added:
-        _add_relationship(triple, nodes_to_include, driver)
+def update_neo4j_graph_batch(articles: List[str], company: str, companies: List[str], node_types: List[str],
+                             nodes_to_include: List[str], driver, neighbourhood_cache=None,
+                             write: bool = True) -> List[Tuple[List[Dict], List[Dict], List[Dict]]]:
+    """Batched variant of update_neo4j_graph for several articles about the same company.
 
-    # Process deletions
-    for triple in deleted:
-        _mark_relationship_ended(triple, driver)
+    One structured LLM call classifies all articles and proposes their updated triples. The prompt
+    contains the company's active triples grouped by node type (each group ranked against all
+    articles of the batch and cut to the triple context budget), so the existing relationships are
+    sent once per batch instead of once per article. Every per-article answer is validated: the
+    company has to be the batch company (or "None"), the node type one of node_types and the triples
+    well-formed with an allowed relationship type. Articles without a valid answer fall back to
+    update_neo4j_graph.
 
-    return added, deleted, unchanged
+    All articles of a batch are diffed against the graph as it was at the start of the batch. Changes
+    are applied article by article in the given order, one transaction each; repeated additions are
+    skipped because an active relationship of the type already exists and repeated deletions find no
+    active relationship to end.
+
+    Args:
+        articles: Texts of the articles, all expected to be about `company`
+        company: Company the articles have been grouped by
+        companies: List of company names to analyze
+        node_types: List of possible node types
+        nodes_to_include: List of node types to include in graph
+        driver: Neo4j driver or session instance
+        neighbourhood_cache: Optional NeighbourhoodCache, see update_neo4j_graph
+        write: If False, changes are only determined but neither checked nor written, e.g. for benchmarks
+
+    Returns:
+        List with the (added, deleted, unchanged) tuple of every article, in the order of `articles`
+    """
+    if "None" not in companies:
+        companies.append("None")
+    if "None" not in node_types:
+        node_types.append("None")
+
+    company_name = wikidata_wbsearchentities(company, id_or_name="name")
+    results = []
+
+    with session_scope(driver) as session:
+        with tracer.span("triple retrieval"):
+            triples_by_node_type = _get_triples_by_node_type(company_name, node_types, session, neighbourhood_cache)
+            batch_text = "\n".join(articles)
+            triples_by_node_type = {node_type: triple_context_builder.build(batch_text, triples)[0]
+                                    for node_type, triples in triples_by_node_type.items()}
+        with tracer.span("change extraction", articles=len(articles)):
+            answers = find_change_triples_batch(articles, company, companies, node_types, triples_by_node_type, 1,
+                                                3)
+
+        for index, article in enumerate(articles):
+            answer = answers.get(index)
+            if answer is None:
+                print(Fore.YELLOW + f"No valid batched answer for article {index}, processing it on its own" +
+                      Style.RESET_ALL)
+                results.append(update_neo4j_graph(article, companies, node_types, nodes_to_include, session,
+                                                  neighbourhood_cache, write=write))
+                continue
+
+            if answer["company"] == "None" or answer["node_type"] == "None":
+                print(Fore.RED + f"No central company or node type requiring change found in article: '{article}'" +
+                      Style.RESET_ALL)
+                results.append(([], [], []))
+                continue
+
+            print(Fore.GREEN + f"Analyzing changes for {company_name} ({answer['node_type']})" + Style.RESET_ALL)
+            relevant_triples = triples_by_node_type.get(answer["node_type"])
+            added, deleted, unchanged = _diff_triples(answer["triples"], relevant_triples or [])
+            if write:
+                _apply_changes(article, added, deleted, relevant_triples, nodes_to_include, session,
+                               neighbourhood_cache)
+            results.append((added, deleted, unchanged))
+
+    return results
+
+
+def find_change_triples_batch(articles: List[str], company: str, companies: List[str], node_types: List[str],
+                              triples_by_node_type: Dict[str, List[Dict]], attempt: int,
+                              max_attempt: int) -> Dict[int, Dict]:
+    """Classifies several articles about one company and proposes their updated triples in one LLM call.
+
+    Args:
+        articles: Texts of the articles
+        company: Company the articles have been grouped by
+        companies: List of company names (including "None")
+        node_types: List of node types (including "None")
+        triples_by_node_type: Existing triples of the company, keyed by the label of the connected node
+        attempt: Current attempt, starting at 1
+        max_attempt: Attempt at which to give up
+
+    Returns:
+        dict: Article index -> {"company", "node_type", "triples"} for every article with a valid answer
+    """
+    if attempt >= max_attempt:
+        return {}
+
+    batch = [{"article_id": index, "text": article.replace("'", "")} for index, article in enumerate(articles)]
+    existing_triples = {node_type: triples for node_type, triples in triples_by_node_type.items() if triples}
+
+    prompt = f"""
+    You are a classification assistant. You provide data to keep a Knowledge Graph about a company up to date. 
+    Your task is to analyze several news articles and, for each article on its own, 
+    1. select the single company which is acting in the article, or "None" if no company is relevant,
+    2. select the SINGLE node_type which is most likely to require a change or update in the knowledge graph, or "None",
+    3. update the existing graph-triples of that node_type according to the article and return them. If no change seems to be required, return them unchanged.
+    You should only make changes when the article describes an event that has happened, but not when it is only vaguely announced.
+    Return a JSON object with the key 'articles', containing one entry with 'article_id', 'company', 'node_type' and 'triples' per article.
+
+    Example input:
+
+    Articles: [{{"article_id": 0, "text": "Allianz SE bought Ergo Group"}}, {{"article_id": 1, "text": "Allianz SE fired its CEO Oliver Bäte, the new CEO is Boris Hilgat"}}]
+    Existing triples by node_type: {{"Company": [{{"node_from": "Allianz SE", "relationship": "OWNS", "node_to": "Dresdner Bank"}}], "Manager": [{{"node_from": "Allianz SE", "relationship": "IS_MANAGED_BY", "node_to": "Oliver Bäte"}}]}}
+    Output: {{"articles": [{{"article_id": 0, "company": "Allianz SE", "node_type": "Company", "triples": [{{"node_from": "Allianz SE", "relationship": "OWNS", "node_to": "Dresdner Bank"}}, {{"node_from": "Allianz SE", "relationship": "OWNS", "node_to": "Ergo Group"}}]}}, {{"article_id": 1, "company": "Allianz SE", "node_type": "Manager", "triples": [{{"node_from": "Allianz SE", "relationship": "IS_MANAGED_BY", "node_to": "Boris Hilgat"}}]}}]}}
+
+    Please analyze the following:
+    Possible companies: {json.dumps(companies, ensure_ascii=False)}
+    Available node_types: {json.dumps(node_types, ensure_ascii=False)}
+    Existing triples by node_type: {json.dumps(existing_triples, ensure_ascii=False)}
+    Articles: {json.dumps(batch, ensure_ascii=False)}
+
+    Please stick to the following relationships: {", ".join(CHANGE_RELATIONSHIP_TYPES)}. If none of these relationships fit, then do not make any changes.
+    """
+
+    triple_schema = {
+        "type": "OBJECT",
+        "properties": {
+            "node_from": {"type": "STRING"},
+            "relationship": {"type": "STRING", "enum": CHANGE_RELATIONSHIP_TYPES},
+            "node_to": {"type": "STRING"},
+        },
+        "required": ["node_from", "relationship", "node_to"],
+    }
+    response_schema = {
+        "type": "OBJECT",
+        "properties": {
+            "articles": {
+                "type": "ARRAY",
+                "items": {
+                    "type": "OBJECT",
+                    "properties": {
+                        "article_id": {"type": "INTEGER"},
+                        "company": {"type": "STRING", "enum": companies},
+                        "node_type": {"type": "STRING", "enum": node_types},
+                        "triples": {"type": "ARRAY", "items": triple_schema},
+                    },
+                    "required": ["article_id", "company", "node_type", "triples"],
+                },
+            },
+        },
+        "required": ["articles"],
+    }
+    result = _generate_result_from_llm(prompt, ResponseSchema=response_schema, temperature=0.2,
+                                       max_output_tokens=1024 * len(articles), attempt=attempt)
+
+    try:
+        entries = json.loads(result).get("articles")
+        if not isinstance(entries, list):
+            raise ValueError("'articles' is not a list")
+    except (json.JSONDecodeError, AttributeError, ValueError) as e:
+        print(Fore.RED + f"JSONDecodeError in batched answer: '{e}' with result: '{result}', try again" +
+              Style.RESET_ALL)
+        return find_change_triples_batch(articles, company, companies, node_types, triples_by_node_type,
+                                         attempt + 1, max_attempt)
+
+    answers = {}
+    for entry in entries:
+        if not isinstance(entry, dict) or entry.get("article_id") not in range(len(articles)):
+            continue
+        if entry.get("company") not in (company, "None") or entry.get("node_type") not in node_types:
+            continue
+        triples = entry.get("triples")
+        if not isinstance(triples, list) or not all(_is_valid_triple(triple) for triple in triples):
+            continue
+        answers[entry["article_id"]] = {"company": entry["company"], "node_type": entry["node_type"],
+                                        "triples": triples}
+
+    print(Fore.GREEN + f"Batched answer valid for {len(answers)} of {len(articles)} articles" + Style.RESET_ALL)
+    return answers
 
 
 def find_change_triples(article, name_company_at_center, node_type_requiring_change, relevant_triples, attempt,
                         max_attempt, driver):
-    if attempt >= max_attempt:
+    if attempt >= max_attempt or (attempt > 1 and llm_accounting.degrade("find_change_triples retry")):
         return False, False, False
 
     print(f"Relevant information retrieved from graph: {relevant_triples}")
@@ -133,30 +440,12 @@ def find_change_triples(article, name_company_at_center, node_type_requiring_cha
     Remember to only output a valid json with the format {{triples:[{{'node_from': '', 'relationship': '', 'node_to': ''}}]}}
     """
 
-    result = model.generate_content(prompt, generation_config=genai.GenerationConfig(temperature=0.2)).text
+    result = generate_text(prompt, generation_config={"temperature": 0.2}, attempt=attempt)
     result = result.replace("```json", "").replace("```", "").replace("'", "\"")
 
     try:
         new_triples = json.loads(result)
-
-        new_triples_set = {json.dumps(t, sort_keys=True) for t in new_triples.get("triples")}
-        old_triples_set = {json.dumps(t, sort_keys=True) for t in relevant_triples}
-
-        intersection = set(new_triples_set).intersection(set(old_triples_set))
-        intersection = [json.loads(s) for s in intersection]
-        print("unchanged: " + str(intersection))
-
-        added = set(new_triples_set).difference(set(old_triples_set))
-        added = [json.loads(s) for s in added]
-        print("added: " + str(added))
-
-        deleted = set(old_triples_set).difference(set(new_triples_set))
-        if "no triples found" in deleted:
-            deleted = deleted.remove("no triples found")
-        deleted = [json.loads(s) for s in deleted]
-        print("deleted: " + str(deleted))
-
-        return added, deleted, intersection
+        return _diff_triples(new_triples.get("triples"), relevant_triples)
     except Exception as e:
         print(Fore.RED + f"JSONDecodeError: '{e}' with result: '{result}', try again" + Style.RESET_ALL)
         find_change_triples(article, name_company_at_center, node_type_requiring_change, relevant_triples, attempt + 1,
@@ -166,7 +455,7 @@ def find_change_triples(article, name_company_at_center, node_type_requiring_cha
 
 
 def determine_triple_types(triple, nodes_to_include, attempt, max_attempt, ):
-    if attempt >= max_attempt:
+    if attempt >= max_attempt or (attempt > 1 and llm_accounting.degrade("determine_triple_types retry")):
         return None, None
 
     prompt = f"""
@@ -195,7 +484,7 @@ def determine_triple_types(triple, nodes_to_include, attempt, max_attempt, ):
         Available node_types: {nodes_to_include}       
         """
 
-    result = model.generate_content(prompt, generation_config=genai.GenerationConfig(temperature=0.2)).text
+    result = generate_text(prompt, generation_config={"temperature": 0.2}, attempt=attempt)
     result = result.replace("```json", "").replace("```", "").replace("'", "\"").replace("Output: ", "")
 
     try:
@@ -214,11 +503,124 @@ def determine_triple_types(triple, nodes_to_include, attempt, max_attempt, ):
         determine_triple_types(triple, nodes_to_include, attempt + 1, max_attempt)
 
 
-def find_company_at_center(article, companies, attempt, max_attempt):
+def classify_article(article: str, companies: List[str], node_types: List[str], attempt: int,
+                     max_attempt: int, preclassifier=None) -> Tuple[str, str]:
+    """Finds the company at the center of an article and the node type requiring change in one LLM call.
+
+    The answer is a JSON object constrained by a response schema whose `company` and `node_type`
+    fields are enums of the given companies and node types (both extended by "None"), and it is
+    validated against them again. If no valid answer is returned within max_attempt attempts, the
+    separate find_company_at_center and find_node_type calls are used instead.
+
+    If a preclassifier is given, articles it resolves unambiguously skip the LLM call. All others fall
+    through to it, which is also the only way to get node type "None" for articles requiring no change.
+
+    Args:
+        article: Text content of the article
+        companies: List of company names to choose from
+        node_types: List of node types to choose from
+        attempt: Current attempt, starting at 1
+        max_attempt: Attempt at which to fall back to the separate calls
+        preclassifier: Optional preclassifier.PreClassifier
+
+    Returns:
+        Tuple of (company name as in the graph, see company_graph_name, or "None", node type or "None")
+    """
     if "None" not in companies:
         companies.append("None")
+    if "None" not in node_types:
+        node_types.append("None")
+
+    if preclassifier is not None and attempt == 1:
+        resolved = preclassifier.classify(article)
+        if resolved is not None:
+            name, node_type = resolved
+            print(Fore.GREEN + f"Pre-classified article as {name} ({node_type}) without LLM call" + Style.RESET_ALL)
+            return company_graph_name(name), node_type
 
     if attempt >= max_attempt:
+        print(Fore.YELLOW + "Falling back to separate company and node type classification" + Style.RESET_ALL)
+        return find_company_at_center(article, companies, 1, 3), find_node_type(article, node_types)
+
+    prompt = f"""
+    You are a classification assistant. You provide data to keep a Knowledge Graph about a company up to date. 
+    Your task is to analyze a news article and select
+    - the single company which is acting in the article. Please always choose the company which is the acting part.
+    - the SINGLE node_type which is most likely to require a change or update in the knowledge graph.
+    If no company or no node_type seems to be relevant in the article, please return "None" for it.
+    Return a JSON object with the keys 'company' and 'node_type'.
+
+    Instructions:
+    1. Read the provided news article carefully.
+    2. Review the list of possible companies and the list of available node_types. These node_types make up all information in the knowledge graph.
+    3. Select ONE company which is acting in the article.
+    4. Select ONE node_type which has to be modified, added or deleted according to the article.
+
+    Example input:
+
+    Article: "Mercedes-Benz announces new electric vehicle model 'S-Class' with 500-mile range"
+    Possible companies: ["Allianz SE", "Mercedes-Benz", "Volkswagen AG", "None"]
+    Available node_types: ["Company", "Industry_Field", "Manager", "City", "Product_or_Service", "StockMarketIndex", "None"]
+    Output: {{"company": "Mercedes-Benz", "node_type": "Product_or_Service"}}
+    Reasoning: Mercedes-Benz is acting, as they are offering their new product 'S-Class', which means the knowledge graph needs a new node 'S-Class'.
+
+    Article: "Sports Gear AG has been bough by Allianz SE"
+    Possible companies: ["Allianz SE", "Mercedes-Benz", "Volkswagen AG", "None"]
+    Available node_types: ["Company", "Industry_Field", "Manager", "City", "Product_or_Service", "StockMarketIndex", "None"]
+    Output: {{"company": "Allianz SE", "node_type": "Company"}}
+    Reasoning: Allianz SE is buying Sports Gear AG, therefore Allianz SE is the acting company and a Company node is added.
+
+    Article: "Volkswagen AG moved their headquarter from Munich to Berlin"
+    Possible companies: ["Allianz SE", "Mercedes-Benz", "Volkswagen AG", "None"]
+    Available node_types: ["Company", "Industry_Field", "Manager", "City", "Product_or_Service", "StockMarketIndex", "None"]
+    Output: {{"company": "Volkswagen AG", "node_type": "City"}}
+    Reasoning: As their headquarter is changing its location, City is the node_type which requires change.
+
+    Please analyze the following:
+    Article: "{article}"
+    Possible companies: {str(companies)}
+    Available node_types: {str(node_types)}
+    """
+
+    response_schema = {
+        "type": "OBJECT",
+        "properties": {
+            "company": {"type": "STRING", "enum": companies},
+            "node_type": {"type": "STRING", "enum": node_types},
+        },
+        "required": ["company", "node_type"],
+    }
+    result = _generate_result_from_llm(prompt, ResponseSchema=response_schema, max_output_tokens=60, temperature=0.4,
+                                       attempt=attempt)
+
+    try:
+        classification = json.loads(result)
+        name, node_type = classification.get("company"), classification.get("node_type")
+    except (json.JSONDecodeError, AttributeError) as e:
+        print(Fore.RED + f"JSONDecodeError while classifying article: '{e}' with result: '{result}', try again" +
+              Style.RESET_ALL)
+        return classify_article(article, companies, node_types, attempt + 1, max_attempt)
+
+    if name not in companies or node_type not in node_types:
+        print(Fore.RED + f"Invalid classification '{result}', try again" + Style.RESET_ALL)
+        return classify_article(article, companies, node_types, attempt + 1, max_attempt)
+
+    if name == "None":
+        return "None", node_type
+    return company_graph_name(name), node_type
+
+
+def company_graph_name(company: str) -> str:
+    """Name of a listed company in the graph: its Wikidata label, or the listed name if Wikidata has no entry."""
+    name = wikidata_wbsearchentities(company, id_or_name="name")
+    return company if name == "No wikidata entry found" else name
+
+
+def find_company_at_center(article, companies, attempt, max_attempt):
+    if "None" not in companies:
+        companies.append("None")
+
+    if attempt >= max_attempt or (attempt > 1 and llm_accounting.degrade("find_company_at_center retry")):
         return False
 
     prompt = f"""
@@ -248,7 +650,7 @@ def find_company_at_center(article, companies, attempt, max_attempt):
     Possible companies: {str(companies)}        
     """
 
-    name = _generate_result_from_llm(prompt, enum=companies, max_output_tokens=30, temperature=0.4)
+    name = _generate_result_from_llm(prompt, enum=companies, max_output_tokens=30, temperature=0.4, attempt=attempt)
 
     if name not in companies:
         find_company_at_center(article, companies, attempt + 1, max_attempt)
@@ -432,7 +834,7 @@ def llm_sanity_check(added, deleted, relevant_triples, article):
     Only respond with valid JSON. Focus on logical reasoning rather than technical validation.
     """
 
-    response = model.generate_content(prompt, generation_config=genai.GenerationConfig(temperature=0.6)).text
+    response = generate_text(prompt, generation_config={"temperature": 0.6})
 
     try:
         return _parse_llm_reasoning_check_response(response)
@@ -448,140 +850,388 @@ def llm_sanity_check(added, deleted, relevant_triples, article):
 """functions below are helper functions"""
 
 
+def _diff_triples(new_triples: List[Dict], old_triples: List[Dict]) -> Tuple[List[Dict], List[Dict], List[Dict]]:
+    """Splits the triples proposed by the LLM into added, deleted and unchanged triples."""
+    new_triples_set = {json.dumps(t, sort_keys=True) for t in new_triples}
+    old_triples_set = {json.dumps(t, sort_keys=True) for t in old_triples}
+
+    intersection = set(new_triples_set).intersection(set(old_triples_set))
+    intersection = [json.loads(s) for s in intersection]
+    print("unchanged: " + str(intersection))
+
+    added = set(new_triples_set).difference(set(old_triples_set))
+    added = [json.loads(s) for s in added]
+    print("added: " + str(added))
+
+    deleted = set(old_triples_set).difference(set(new_triples_set))
+    if "no triples found" in deleted:
+        deleted = deleted.remove("no triples found")
+    deleted = [json.loads(s) for s in deleted]
+    print("deleted: " + str(deleted))
+
+    return added, deleted, intersection
+
+
+def _apply_changes(article: str, added: List[Dict], deleted: List[Dict], relevant_triples, nodes_to_include: List[str],
+                   session, neighbourhood_cache=None, with_llm_sanity_check: bool = True) -> None:
+    """Runs the sanity checks on the changes of one article and writes them to the graph in one transaction.
+
+    If speculative_checker is enabled, a failed formal sanity check skips the write and the LLM sanity
+    check runs in the background after the write, see sanitychecker.SpeculativeSanityChecker.
+    Otherwise both checks run before the write and their verdicts are only printed.
+    The reasoning sanity check is skipped without with_llm_sanity_check and once the LLM budget is
+    exhausted, see llmaccounting.LLMAccounting.
+    """
+    # These checks can be used to iterate on find_change_triples for a back and forth until checks are passing, although this will require a lot of extra compute
+    with tracer.span("sanity checks"):
+        formal_check = formal_sanity_check(added, deleted, relevant_triples)
+        if formal_check["correct_update"]:
+            print(Fore.GREEN + "Formal sanity check: " + str(formal_check) + Style.RESET_ALL)
+        else:
+            print(Fore.RED + "Formal sanity check: " + str(formal_check) + Style.RESET_ALL)
+
+        speculative = speculative_checker.enabled
+        if speculative and not formal_check["correct_update"]:
+            print(Fore.RED + "Update not written because of the failed formal sanity check" + Style.RESET_ALL)
+            return
+        skip_reasoning_check = not with_llm_sanity_check
+        if not skip_reasoning_check and llm_accounting.degrade("llm_sanity_check"):
+            print(Fore.YELLOW + "LLM budget exhausted, skipping the reasoning sanity check" + Style.RESET_ALL)
+            skip_reasoning_check = True
+        if not skip_reasoning_check and not speculative:
+            reasoning_check = llm_sanity_check(added, deleted, relevant_triples, article)
+            if reasoning_check["correct_update"]:
+                print(Fore.GREEN + "Reasoning sanity check: " + str(reasoning_check) + Style.RESET_ALL)
+            else:
+                print(Fore.RED + "Reasoning sanity check: " + str(reasoning_check) + Style.RESET_ALL)
+
+    nodes, relationships, endings = _prepare_changes(added, deleted, nodes_to_include, session, neighbourhood_cache)
+    if not relationships and not endings:
+        return
+
+    # One managed transaction for the whole article, rolled back as a whole if any statement fails
+    try:
+        with tracer.span("graph write", relationships=len(relationships), endings=len(endings)):
+            written = execute_write(session, _write_changes, nodes, relationships, endings,
+                                    str(datetime.now(timezone.utc)))
+    except Exception as e:
+        print(Fore.RED + f"Graph update of article rolled back: {e}" + Style.RESET_ALL)
+        raise
+
+    for wikidata_id in written["created_nodes"]:
+        notify_node_created(wikidata_id, nodes[wikidata_id]["label"], nodes[wikidata_id]["properties"])
+    for node in nodes.values():  # existing nodes may have been named differently by the LLM
+        entity_index.add(node["wikidata_id"], [node["name"]], node["label"])
+    for rel in written["created"]:
+        source, target = nodes[rel["source_id"]], nodes[rel["target_id"]]
+        print(Fore.GREEN + f"Created relationship {rel['source_name']} -[{rel['rel_type']}]-> {rel['target_name']}" +
+              Style.RESET_ALL)
+        if neighbourhood_cache is not None:
+            neighbourhood_cache.record_relationship_added(
+                rel["rel_id"], rel["rel_type"],
+                {key: source[key] for key in ("wikidata_id", "name", "label")},
+                {key: target[key] for key in ("wikidata_id", "name", "label")})
+    for rel in written["ended"]:
+        print(Fore.GREEN + f"Updated end time for {rel['source_name']} -[{rel['rel_type']}]- {rel['target_name']} "
+                           f"to {rel['end_time']}" + Style.RESET_ALL)
+        if neighbourhood_cache is not None:
+            neighbourhood_cache.record_relationship_ended(rel["rel_id"], rel["end_time"])
+
+    if speculative and not skip_reasoning_check:
+        speculative_checker.submit(article, added, deleted, relevant_triples, written, neighbourhood_cache)
+
+
+def _compensate_changes(written: Dict, on_reject: str, reason: str, driver) -> None:
+    """Undoes ("revert") or quarantines ("quarantine") the changes written by _write_changes in one transaction."""
+    def compensate(tx):
+        if on_reject == "quarantine":
+            tx.run(QUARANTINE_RELATIONSHIPS_QUERY, rel_ids=[rel["rel_id"] for rel in written["created"]],
+                   reason=reason).consume()
+            tx.run(QUARANTINE_ENDINGS_QUERY, relationships=written["ended"], reason=reason).consume()
+            return
+        tx.run(DELETE_RELATIONSHIPS_QUERY, rel_ids=[rel["rel_id"] for rel in written["created"]]).consume()
+        tx.run(REACTIVATE_RELATIONSHIPS_QUERY, relationships=written["ended"]).consume()
+        tx.run(DELETE_ISOLATED_NODES_QUERY, wikidata_ids=written["created_nodes"]).consume()
+
+    execute_write(driver, compensate)
+    action = "Quarantined" if on_reject == "quarantine" else "Reverted"
+    print(Fore.YELLOW + f"{action} {len(written['created'])} created and {len(written['ended'])} ended "
+                        f"relationships rejected by the reasoning sanity check" + Style.RESET_ALL)
+
+
+def _get_triples_by_node_type(company: str, node_types: List[str], driver, neighbourhood_cache=None) -> Dict[
+    str, Optional[List[Dict]]]:
+    """Retrieves the active relationship triples of a company for every node type (except "None")."""
+    triples_by_node_type = {}
+    for node_type in node_types:
+        if node_type == "None":
+            continue
+        if neighbourhood_cache is not None:
+            triples_by_node_type[node_type] = neighbourhood_cache.get_relationship_triples(
+                company, node_label=node_type, active_only=True)
+        else:
+            triples_by_node_type[node_type] = execute_read(driver, lambda tx, label=node_type: get_relationship_triples(
+                company, node_label=label, driver=tx, active_only=True))
+    return triples_by_node_type
+
+
+def _is_valid_triple(triple) -> bool:
+    return isinstance(triple, dict) and set(triple) == {"node_from", "relationship", "node_to"} and \
+        triple["relationship"] in CHANGE_RELATIONSHIP_TYPES and all(isinstance(v, str) for v in triple.values())
+
+
 def _get_and_increment_customID(driver):
     global custom_id
 
-    custom_id = get_latest_custom_id("CustomID", driver)
-    custom_id += 1
+    # An ID handed out here is only persisted once its node is written, so the last allocated one counts as well
+    with _custom_id_lock:
+        custom_id = max(get_latest_custom_id("CustomID", driver), custom_id or 0) + 1
 
     custom_node_id = "CustomID" + str(custom_id)
     return custom_node_id
 
 
-def _add_relationship(triple: Dict, nodes_to_include: List[str], driver) -> None:
-    """Helper function to add new relationship to graph."""
-    try:
-        # Determine node types
-        node_type_from, node_type_to = determine_triple_types(triple, nodes_to_include, 1, 3)
-        if not all([node_type_from, node_type_to]):
-            print(Fore.RED + f"Missing node type for triple {triple}" + Style.RESET_ALL)
-            return
+def _prepare_changes(added: List[Dict], deleted: List[Dict], nodes_to_include: List[str], driver,
+                     neighbourhood_cache=None) -> Tuple[Dict[str, Dict], List[Dict], List[Dict]]:
+    """Resolves everything the write transaction of an article needs before it is opened.
 
-        name_node_from = triple["node_from"]
-        name_node_to = triple["node_to"]
-
-        # Create/get nodes and relationship
-        id_node_from = _get_or_create_node_id(name_node_from, driver)
-        id_node_to = _get_or_create_node_id(name_node_to, driver)
-
-        create_new_node(
-            id_node_from,
-            node_type_from,
-            properties=build_node_properties(id_node_from, node_type_from, name_node_from),
-            driver=driver,
-        )
-
-        create_new_node(
-            id_node_to,
-            node_type_to,
-            properties=build_node_properties(id_node_to, node_type_to, name_node_to),
-            driver=driver,
-        )
-
-        create_relationship(
-            triple["relationship"],
-            id_node_from,
-            id_node_to,
-            str(datetime.now(timezone.utc)),
-            "NA",
-            driver,
-            name_org_node=triple["node_from"],
-            name_rel_node=triple["node_to"]
-        )
-    except KeyError as e:
-        print(Fore.RED + f"Error adding relationship {triple}: {e}" + Style.RESET_ALL)
+    Node types (see TypeResolver), IDs and properties (Wikidata) of added triples and the node IDs of
+    deleted triples are looked up here, so the transaction itself consists of batched statements only.
+    A name occurring in several triples gets a single ID, in particular a single CustomID. Properties
+    are only fetched for the nodes missing from the graph, the only ones _write_changes creates.
 
+    Returns:
+        Tuple of:
+        - nodes by Wikidata ID: {"wikidata_id", "name", "label", "properties"}, properties None for
+          nodes already in the graph
+        - relationships to create: {"rel_type", "source_id", "target_id", "source_name", "target_name"}
+        - relationships to end: {"rel_type", "source_id", "target_id", "source_name", "target_name"}
+    """
+    node_ids = {}  # node name -> ID, shared by all triples of the article
+    nodes, relationships, endings = {}, [], []
+    # All names of the article are matched against the entity index in one batch
+    with tracer.span("entity resolution"):
+        indexed = entity_index.resolve_many({triple[key] for triple in added + deleted
+                                             for key in ("node_from", "node_to") if isinstance(triple.get(key), str)})
+
+    def node_id_of(name: str, create: bool) -> str:
+        if name not in node_ids:
+            with tracer.span("entity resolution"):
+                node_ids[name] = _get_or_create_node_id(name, driver, neighbourhood_cache, indexed) if create else \
+                    _find_node_id(name, driver, neighbourhood_cache, indexed)
+        return node_ids[name]
 
-def _mark_relationship_ended(triple: Dict, driver) -> None:
-    """Helper function to mark relationship as ended."""
-    try:
-        # Find nodes
-        source_id = find_node_by_wikidata_id(triple["node_from"], driver) or \
-                    wikidata_wbsearchentities(triple["node_from"], id_or_name='id')
-        target_id = find_node_by_wikidata_id(triple["node_to"], driver) or \
-                    wikidata_wbsearchentities(triple["node_to"], id_or_name='id')
-
-        # Update end time for active relationships
-        relationships = get_node_relationships(source_id, target_id, driver)
-        for rel in relationships:
-            if rel['rel_end_time'] == "NA":
-                _update_end_time(rel, triple, driver)
+    for triple in added:
+        try:
+            with tracer.span("type determination"):
+                node_type_from, node_type_to = type_resolver.resolve(triple, nodes_to_include, driver,
+                                                                     neighbourhood_cache)
+            if not all([node_type_from, node_type_to]):
+                print(Fore.RED + f"Missing node type for triple {triple}" + Style.RESET_ALL)
+                continue
+
+            ends = []
+            for name, node_type in ((triple["node_from"], node_type_from), (triple["node_to"], node_type_to)):
+                node_id = node_id_of(name, create=True)
+                if node_id not in nodes:
+                    nodes[node_id] = {"wikidata_id": node_id, "name": name, "label": node_type, "properties": None}
+                ends.append(node_id)
+        except KeyError as e:
+            print(Fore.RED + f"Error adding relationship {triple}: {e}" + Style.RESET_ALL)
+            continue
+
+        relationship = {"rel_type": triple["relationship"], "source_id": ends[0], "target_id": ends[1],
+                        "source_name": triple["node_from"], "target_name": triple["node_to"]}
+        if relationship not in relationships:
+            relationships.append(relationship)
+
+    # Properties (a Wikidata request per node) only for the nodes the write transaction will create
+    with tracer.span("node properties"):
+        for node_id in _missing_node_ids(list(nodes), driver, neighbourhood_cache):
+            node = nodes[node_id]
+            try:
+                node["properties"] = build_node_properties(node_id, node["label"], node["name"])
+            except KeyError as e:
+                print(Fore.RED + f"Error adding node {node['name']}: {e}" + Style.RESET_ALL)
+                del nodes[node_id]
+        relationships = [relationship for relationship in relationships
+                         if relationship["source_id"] in nodes and relationship["target_id"] in nodes]
+
+    for triple in deleted:
+        try:
+            ending = {"rel_type": triple["relationship"],
+                      "source_id": node_id_of(triple["node_from"], create=False),
+                      "target_id": node_id_of(triple["node_to"], create=False),
+                      "source_name": triple["node_from"], "target_name": triple["node_to"]}
+        except KeyError as e:
+            print(Fore.RED + f"Error ending relationship {triple}: {e}" + Style.RESET_ALL)
+            continue
+        if ending not in endings:
+            endings.append(ending)
 
+    return nodes, relationships, endings
+
+
+def _write_changes(tx, nodes: Dict[str, Dict], relationships: List[Dict], endings: List[Dict],
+                   timestamp: str) -> Dict[str, List[Dict]]:
+    """Transaction function writing all changes of an article with batched (UNWIND) statements.
+
+    Runs one statement per node label and per relationship type of the added triples plus one for
+    all ended relationships, however many triples the article changes. Missing nodes are created
+    first, then active relationships of the deleted triples are ended and finally the added
+    relationships are created, unless an active relationship of that type already connects the nodes.
+
+    Returns:
+        dict: {"created_nodes": [wikidata_id, ...],
+               "created": [relationship row of _prepare_changes with "rel_id", ...],
+               "ended": [relationship row of _prepare_changes with "rel_id" and "end_time", ...]}
+    """
+    nodes_by_label = {}
+    for node in nodes.values():
+        if node["properties"] is not None:  # None for nodes already in the graph
+            nodes_by_label.setdefault(node["label"], []).append(node["properties"])
+    created_nodes = []
+    for label, properties in nodes_by_label.items():
+        created_nodes += [record["wikidata_id"] for record in
+                          tx.run(BATCH_CREATE_NODES_QUERY.format(label=label), nodes=properties)]
+
+    ended = []
+    if endings:
+        ended = [record["rel"] for record in tx.run(BATCH_END_RELATIONSHIPS_QUERY, endings=endings,
+                                                    end_time=timestamp)]
+
+    relationships_by_type = {}
+    for relationship in relationships:
+        relationships_by_type.setdefault(relationship["rel_type"], []).append(relationship)
+    created = []
+    for rel_type, rows in relationships_by_type.items():
+        created += [record["rel"] for record in tx.run(BATCH_CREATE_RELATIONSHIPS_QUERY.format(rel_type=rel_type),
+                                                       relationships=rows, start_time=timestamp)]
+
+    return {"created_nodes": created_nodes, "created": created, "ended": ended}
+
+
+async def _mark_relationships_ended_async(triples: List[Dict], driver, neighbourhood_cache=None) -> List[Dict]:
+    """Asyncio variant of the ending step of _write_changes for several deleted triples at once.
+
+    The node IDs of all triples are resolved concurrently, then every triple is ended in its own
+    managed write transaction using an AsyncDriver, all awaited concurrently. Like the sync path, only
+    active, not quarantined relationships of the triple's type are ended (BATCH_END_RELATIONSHIPS_QUERY),
+    and the end times are written through to the neighbourhood cache.
+
+    Returns:
+        list: Ended relationship rows like "ended" of _write_changes
+    """
+    endings = []
+    for ending in await _gather_bounded(_ending_async(triple, neighbourhood_cache) for triple in triples):
+        if ending is not None and ending not in endings:
+            endings.append(ending)
+
+    end_time = str(datetime.now(timezone.utc))
+    ended = [rel for rels in await _gather_bounded(_end_relationship_async(ending, end_time, driver)
+                                                   for ending in endings) for rel in rels]
+    for rel in ended:
+        print(Fore.GREEN + f"Updated end time for {rel['source_name']} -[{rel['rel_type']}]- {rel['target_name']} "
+                           f"to {rel['end_time']}" + Style.RESET_ALL)
+        if neighbourhood_cache is not None:
+            neighbourhood_cache.record_relationship_ended(rel["rel_id"], rel["end_time"])
+    return ended
+
+
+async def _ending_async(triple: Dict, neighbourhood_cache=None) -> Optional[Dict]:
+    try:
+        source_id, target_id = await asyncio.gather(_find_node_id_async(triple["node_from"], neighbourhood_cache),
+                                                    _find_node_id_async(triple["node_to"], neighbourhood_cache))
     except KeyError as e:
         print(Fore.RED + f"Error ending relationship {triple}: {e}" + Style.RESET_ALL)
+        return None
+    return {"rel_type": triple["relationship"], "source_id": source_id, "target_id": target_id,
+            "source_name": triple["node_from"], "target_name": triple["node_to"]}
 
 
-def _update_end_time(rel: Dict, triple: Dict, driver) -> None:
-    """Helper function to update relationship end time."""
-    rel_id, end_time = update_relationship_property(
-        rel['rel_id'],
-        "end_time",
-        str(datetime.now(timezone.utc)),
-        driver
-    )
-    if rel_id:
-        print(Fore.GREEN +
-              f"Updated end time for {triple['node_from']} -> {triple['node_to']} to {end_time}" +
-              Style.RESET_ALL)
+async def _end_relationship_async(ending: Dict, end_time: str, driver) -> List[Dict]:
+    async def end(tx):
+        result = await tx.run(BATCH_END_RELATIONSHIPS_QUERY, endings=[ending], end_time=end_time)
+        return [record["rel"] async for record in result]
+
+    async with driver.session() as session:
+        return await session.execute_write(end)
+
 
+async def _find_node_id_async(node_name: str, neighbourhood_cache=None) -> str:
+    """Asyncio variant of _find_node_id, searching Wikidata only if the name is not known locally."""
+    if neighbourhood_cache is not None:
+        node_id = neighbourhood_cache.find_node_id(node_name)
+        if node_id:
+            return node_id
+    return entity_index.resolve(node_name) or await wikidata_wbsearchentities_async(node_name, id_or_name='id')
 
-def _generate_result_from_llm(prompt, enum=None, ResponseSchema=None, temperature=0.5, max_output_tokens=30):
+
+def _generate_result_from_llm(prompt, enum=None, ResponseSchema=None, temperature=0.5, max_output_tokens=30,
+                              attempt=1):
     if enum is not None:
-        result = model.generate_content(prompt,
-                                        generation_config=genai.GenerationConfig(
-                                            response_mime_type="text/x.enum",
-                                            response_schema={
-                                                "type": "STRING",
-                                                "enum": enum,
-                                            },
-                                            temperature=temperature,
-                                            max_output_tokens=max_output_tokens,
-                                        ),
-                                        )
-        return result.text
+        generation_config = {
+            "response_mime_type": "text/x.enum",
+            "response_schema": {
+                "type": "STRING",
+                "enum": enum,
+            },
+        }
     elif ResponseSchema is not None:
-        result = model.generate_content(
-            prompt,
-            generation_config=genai.GenerationConfig(
-                response_mime_type="application/json",
-                response_schema=ResponseSchema,
-                temperature=temperature,
-                max_output_tokens=max_output_tokens
-            ),
-        )
-        return result.text
+        generation_config = {
+            "response_mime_type": "application/json",
+            "response_schema": ResponseSchema,
+        }
     else:
         raise KeyError(f"No enum or ResponseSchema provided")
 
+    generation_config.update(temperature=temperature, max_output_tokens=max_output_tokens)
+    return generate_text(prompt, generation_config=generation_config, attempt=attempt)
+
 
-def _get_or_create_node_id(node_name: str, driver: Driver) -> str:
+def _find_node_id(node_name: str, driver, neighbourhood_cache=None, indexed: Optional[Dict] = None) -> str:
+    """Looks a node name up in the neighbourhood cache (if given), the entity index and finally in Wikidata.
+
+    `indexed` are the results of entity_index.resolve_many for names resolved in a batch beforehand.
+    """
+    if neighbourhood_cache is not None:
+        node_id = neighbourhood_cache.find_node_id(node_name)
+        if node_id:
+            return node_id
+    node_id = indexed.get(node_name) if indexed is not None and node_name in indexed else \
+        entity_index.resolve(node_name)
+    return node_id or wikidata_wbsearchentities(node_name, id_or_name='id')
+
+
+def _missing_node_ids(wikidata_ids: List[str], driver, neighbourhood_cache=None) -> List[str]:
+    """Returns the IDs without a node in the graph, asking Neo4j in one read for those the cache does not know."""
+    unknown = [wikidata_id for wikidata_id in wikidata_ids
+               if neighbourhood_cache is None or not neighbourhood_cache.find_node(wikidata_id)]
+    if not unknown:
+        return []
+    existing = execute_read(driver, lambda tx: {record["wikidata_id"] for record in
+                                                tx.run(EXISTING_NODES_QUERY, wikidata_ids=unknown)})
+    return [wikidata_id for wikidata_id in unknown if wikidata_id not in existing]
+
+
+def _get_or_create_node_id(node_name: str, driver: Driver, neighbourhood_cache=None,
+                           indexed: Optional[Dict] = None) -> str:
     """Gets existing node ID or creates new node with generated ID.
 
-    Attempts to find existing node by Wikidata ID, then searches Wikidata,
-    and finally creates custom ID if needed.
+    Attempts to find existing node in the neighbourhood cache and the entity index,
+    then searches Wikidata, and finally creates custom ID if needed.
 
     Args:
         node_name: Name of node to find/create
         driver: Neo4j driver instance
+        neighbourhood_cache: Optional NeighbourhoodCache to resolve the name locally
+        indexed: Optional names already resolved with entity_index.resolve_many
 
     Returns:
         str: Node ID (either existing or newly created)
     """
     # Try to find existing node or get Wikidata ID
-    node_id = (
-            find_node_by_wikidata_id(node_name, driver) or
-            wikidata_wbsearchentities(node_name, id_or_name='id')
-    )
+    node_id = _find_node_id(node_name, driver, neighbourhood_cache, indexed)
 
     # Generate custom ID if needed
     if node_id == "No wikidata entry found":
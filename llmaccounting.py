@@ -0,0 +1,180 @@
+import json
+import os
+import sys
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+from triplecontext import estimate_tokens
+
+# Functions between the caller of interest and the backend, skipped when attributing a call
+_WRAPPER_FUNCTIONS = {"generate_text", "_generate_result_from_llm"}
+
+
+class LLMAccounting:
+    """Counts the LLM calls, tokens, latency, retries and cache hits of every calling function, and enforces budgets.
+
+    Every call through llmbackend.generate_text is recorded under the function that made it (e.g.
+    find_change_triples). Token counts are the ones reported by the backend where available (Gemini
+    usage metadata), otherwise estimated from the text (triplecontext.estimate_tokens). Calls with an
+    attempt above 1 count as retries; cached answers and failed calls count as calls but are not billed.
+
+    Budgets are optional limits of billed calls and tokens per article (counted within `article()`)
+    and per run. They never interrupt an update: once one is exhausted, the updater skips the LLM
+    steps it can do without, i.e. the reasoning sanity check and retries of failed answers, see
+    `degrade`. The report lists the skipped steps next to the spend.
+
+    Example:
+        >>> llm_accounting.set_budget(max_calls_per_article=6, max_tokens_per_run=2_000_000)
+        >>> with llm_accounting.article():
+        ...     update_neo4j_graph(article, companies, node_types, nodes_to_include, driver)
+        >>> llm_accounting.print_report()
+    """
+
+    def __init__(self, prompt_price_per_million: float = 1.25, response_price_per_million: float = 5.0):
+        self.prompt_price_per_million = prompt_price_per_million  # USD, Gemini 1.5 Pro up to 128k tokens
+        self.response_price_per_million = response_price_per_million
+        self.max_calls_per_article = None
+        self.max_tokens_per_article = None
+        self.max_calls_per_run = None
+        self.max_tokens_per_run = None
+        self.functions = {}  # calling function -> counters, see _new_counters
+        self.degradations = {}  # skipped step -> count
+        self._run = {"calls": 0, "tokens": 0}  # billed, i.e. not answered by the cache
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def set_budget(self, max_calls_per_article: Optional[int] = None, max_tokens_per_article: Optional[int] = None,
+                   max_calls_per_run: Optional[int] = None, max_tokens_per_run: Optional[int] = None):
+        """Sets the limits of billed calls and tokens, None for no limit."""
+        self.max_calls_per_article = max_calls_per_article
+        self.max_tokens_per_article = max_tokens_per_article
+        self.max_calls_per_run = max_calls_per_run
+        self.max_tokens_per_run = max_tokens_per_run
+
+    @contextmanager
+    def article(self):
+        """Counts the calls of the current thread within the block against the per article budget."""
+        previous = getattr(self._local, "article", None)
+        self._local.article = {"calls": 0, "tokens": 0}
+        try:
+            yield
+        finally:
+            self._local.article = previous
+
+    def record(self, function: str, prompt: str, response: Optional[str], seconds: float, attempt: int = 1,
+               cache_hit: bool = False, usage: Optional[Tuple[int, int]] = None):
+        """Records one call.
+
+        Args:
+            function: Name of the calling function, see calling_function
+            prompt: Prompt text
+            response: Answer text, None if the call failed
+            seconds: Latency of the call
+            attempt: Attempt number of retrying callers
+            cache_hit: Whether the answer came from the LLM response cache
+            usage: (prompt tokens, response tokens) as reported by the backend, estimated if None
+        """
+        prompt_tokens, response_tokens = usage or (estimate_tokens(prompt), estimate_tokens(response or ""))
+        with self._lock:
+            counters = self.functions.setdefault(function, _new_counters())
+            counters["calls"] += 1
+            counters["retries"] += attempt > 1
+            counters["failures"] += response is None
+            counters["seconds"] += seconds
+            counters["cache_hits"] += cache_hit
+            if cache_hit or response is None:  # failed calls (e.g. cache misses in strict replay) are not billed
+                return
+            counters["prompt_tokens"] += prompt_tokens
+            counters["response_tokens"] += response_tokens
+            self._run["calls"] += 1
+            self._run["tokens"] += prompt_tokens + response_tokens
+        article = getattr(self._local, "article", None)
+        if article is not None:
+            article["calls"] += 1
+            article["tokens"] += prompt_tokens + response_tokens
+
+    def within_budget(self) -> bool:
+        """Whether neither the budget of the run nor the one of the current article is exhausted."""
+        with self._lock:
+            run_calls, run_tokens = self._run["calls"], self._run["tokens"]
+        article = getattr(self._local, "article", None) or {"calls": 0, "tokens": 0}
+        return not (_exceeds(run_calls, self.max_calls_per_run) or _exceeds(run_tokens, self.max_tokens_per_run) or
+                    _exceeds(article["calls"], self.max_calls_per_article) or
+                    _exceeds(article["tokens"], self.max_tokens_per_article))
+
+    def degrade(self, step: str) -> bool:
+        """Returns True, and counts it, if the optional LLM step `step` has to be skipped because of the budget."""
+        if self.within_budget():
+            return False
+        with self._lock:
+            self.degradations[step] = self.degradations.get(step, 0) + 1
+        return True
+
+    def cost(self) -> float:
+        """Estimated USD spent on billed tokens."""
+        with self._lock:
+            prompt_tokens = sum(counters["prompt_tokens"] for counters in self.functions.values())
+            response_tokens = sum(counters["response_tokens"] for counters in self.functions.values())
+        return (prompt_tokens * self.prompt_price_per_million +
+                response_tokens * self.response_price_per_million) / 1e6
+
+    def report(self) -> Dict:
+        """{"functions": {function: counters}, "billed calls", "billed tokens", "cost", "degradations"}."""
+        with self._lock:
+            functions = {function: dict(counters) for function, counters in self.functions.items()}
+            run = dict(self._run)
+            degradations = dict(self.degradations)
+        return {"functions": functions, "billed calls": run["calls"], "billed tokens": run["tokens"],
+                "cost": self.cost(), "degradations": degradations}
+
+    def print_report(self):
+        report = self.report()
+        print(f"\n--- LLM Cost Report ---")
+        for function, counters in sorted(report["functions"].items(), key=lambda item: -item[1]["prompt_tokens"]):
+            print(f"{function}: {counters['calls']} calls ({counters['cache_hits']} cached, "
+                  f"{counters['retries']} retries, {counters['failures']} failed), "
+                  f"{counters['prompt_tokens']} prompt + {counters['response_tokens']} response tokens, "
+                  f"{counters['seconds']:.1f}s")
+        print(f"Billed: {report['billed calls']} calls, {report['billed tokens']} tokens, "
+              f"estimated cost ${report['cost']:.4f}")
+        if report["degradations"]:
+            print(f"Skipped because of the LLM budget: " +
+                  ", ".join(f"{step} ({count})" for step, count in report["degradations"].items()))
+        print()
+
+    def export_json(self, filepath: str):
+        directory = os.path.dirname(filepath)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(filepath, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=4)
+
+    def reset(self):
+        with self._lock:
+            self.functions = {}
+            self.degradations = {}
+            self._run = {"calls": 0, "tokens": 0}
+
+
+def calling_function() -> str:
+    """Name of the function that made the current LLM call, skipping generate_text and similar wrappers."""
+    frame = sys._getframe(1)
+    while frame is not None and frame.f_code.co_name in _WRAPPER_FUNCTIONS:
+        frame = frame.f_back
+    return frame.f_code.co_name if frame is not None else "unknown"
+
+
+# Accounting of all LLM calls of the process
+llm_accounting = LLMAccounting()
+
+"""functions below are helper functions"""
+
+
+def _new_counters() -> Dict:
+    return {"calls": 0, "cache_hits": 0, "retries": 0, "failures": 0, "prompt_tokens": 0, "response_tokens": 0,
+            "seconds": 0.0}
+
+
+def _exceeds(value: int, limit: Optional[int]) -> bool:
+    return limit is not None and value >= limit
@@ -0,0 +1,313 @@
+import ast
+import configparser
+import json
+import random
+import re
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from llmaccounting import calling_function, llm_accounting
+from llmcache import llm_response_cache
+from tracing import tracer
+
+# Answer of a stub rule: a fixed string or a function of (prompt, generation_config)
+StubAnswer = Union[str, Callable[[str, Optional[Dict]], str]]
+
+
+class LLMBackend:
+    """Interface of the LLM providers used by the updater and the article preprocessing.
+
+    A backend turns a prompt and a plain dict generation config (keys like `temperature`,
+    `max_output_tokens`, `response_mime_type` and `response_schema`) into the text of the answer.
+    Subclasses implement `_generate`; `generate` counts the calls and the time spent in them.
+    """
+
+    model_name = "llm"
+    cacheable = True  # whether answers are stored in the LLM response cache
+
+    def __init__(self):
+        self.calls = 0
+        self.total_seconds = 0.0
+        self._stats_lock = threading.Lock()
+        self._local = threading.local()
+
+    def generate(self, prompt: str, generation_config: Optional[Dict] = None) -> str:
+        start = time.perf_counter()
+        self._local.usage = None
+        try:
+            return self._generate(prompt, generation_config or {})
+        finally:
+            with self._stats_lock:
+                self.calls += 1
+                self.total_seconds += time.perf_counter() - start
+
+    def _generate(self, prompt: str, generation_config: Dict) -> str:
+        raise NotImplementedError
+
+    def last_usage(self) -> Optional[Tuple[int, int]]:
+        """(prompt tokens, response tokens) of the last call of the current thread, None if not reported."""
+        return getattr(self._local, "usage", None)
+
+    def print_stats(self):
+        average = self.total_seconds / self.calls if self.calls else 0.0
+        print(f"\n--- LLM Backend Statistics ({self.model_name}) ---")
+        print(f"Calls: {self.calls}, total time: {self.total_seconds:.2f}s, average: {average:.3f}s\n")
+
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini backend. The SDK is imported and configured on the first call, not at import time."""
+
+    def __init__(self, model_name: str = "gemini-1.5-pro-latest", config_file: str = 'config.ini'):
+        super().__init__()
+        self.model_name = model_name
+        self.config_file = config_file
+        self._model = None
+        self._genai = None
+        self._init_lock = threading.Lock()
+
+    def _generate(self, prompt: str, generation_config: Dict) -> str:
+        model, genai = self._get_model()
+        result = model.generate_content(prompt, generation_config=genai.GenerationConfig(**generation_config))
+        usage = getattr(result, "usage_metadata", None)
+        if usage is not None:
+            self._local.usage = (usage.prompt_token_count, usage.candidates_token_count)
+        return result.text
+
+    def _get_model(self):
+        with self._init_lock:
+            if self._model is None:
+                import google.generativeai as genai
+
+                config = configparser.ConfigParser()
+                config.read(self.config_file)
+                genai.configure(api_key=config['gemini']['api_key'])
+                self._genai = genai
+                self._model = genai.GenerativeModel(self.model_name)
+        return self._model, self._genai
+
+
+class StubBackend(LLMBackend):
+    """Offline, deterministic backend for load tests and profiling of the update pipeline.
+
+    Prompts are matched against `rules`, a list of (regex, answer) pairs checked in order; the
+    answer is either a fixed string or a function of the prompt and the generation config. The
+    default rules recognise the prompts of graphupdater and articles and answer them plausibly:
+    the first listed company mentioned in the article, a keyword based node type, the input triples
+    unchanged, node types derived from the relationship, an approving sanity check and the first
+    sentence as summary. Enum constrained prompts always get an answer from the enum.
+
+    Latency is simulated with `time.sleep(latency + uniform(0, jitter))`, seeded for reproducibility.
+    Stub answers are not written to the LLM response cache.
+
+    Example:
+        >>> set_llm_backend(StubBackend(latency=0.8, jitter=0.4))
+        >>> set_llm_backend(StubBackend(rules=[(r"Possible companies", "Allianz SE")] + default_stub_rules()))
+    """
+
+    model_name = "stub"
+    cacheable = False
+
+    def __init__(self, rules: Optional[List[Tuple[str, StubAnswer]]] = None, latency: float = 0.0,
+                 jitter: float = 0.0, seed: int = 0):
+        super().__init__()
+        self.rules = [(re.compile(pattern, re.DOTALL), answer)
+                      for pattern, answer in (rules if rules is not None else default_stub_rules())]
+        self.latency = latency
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+
+    def _generate(self, prompt: str, generation_config: Dict) -> str:
+        if self.latency or self.jitter:
+            with self._random_lock:
+                delay = self.latency + self._random.uniform(0, self.jitter)
+            time.sleep(delay)
+
+        for pattern, answer in self.rules:
+            if pattern.search(prompt):
+                text = answer(prompt, generation_config) if callable(answer) else answer
+                return _constrain_to_enum(text, generation_config)
+        return _constrain_to_enum("None", generation_config)
+
+
+def default_stub_rules() -> List[Tuple[str, StubAnswer]]:
+    """Rules of the StubBackend answering the prompts of graphupdater and articles."""
+    return [
+        (r"with the key 'articles'", _stub_change_triples_batch),
+        (r"keys 'company' and 'node_type'", _stub_classification),
+        (r"Possible companies:", _stub_company_at_center),
+        (r"select a SINGLE node", _stub_node_type),
+        (r"type_node_from", _stub_triple_types),
+        (r"Output triples:", _stub_change_triples),
+        (r"correct_update", json.dumps({"correct_update": True,
+                                        "reasoning": "Stub backend accepts every update",
+                                        "how_to_correct_the_mistake": ""})),
+        (r"summarization assistant", _stub_summary),
+    ]
+
+
+# Backend used by generate_text, Gemini unless replaced with set_llm_backend
+llm_backend: LLMBackend = GeminiBackend()
+
+
+def set_llm_backend(backend: LLMBackend) -> LLMBackend:
+    """Replaces the backend used by all LLM calls and returns the previous one."""
+    global llm_backend
+    previous, llm_backend = llm_backend, backend
+    return previous
+
+
+def get_llm_backend() -> LLMBackend:
+    return llm_backend
+
+
+def generate_text(prompt: str, generation_config: Optional[Dict] = None, attempt: int = 1) -> str:
+    """Generates the answer to a prompt with the current backend, served from the LLM response cache if possible.
+
+    The call is recorded in llmaccounting.llm_accounting under the function calling generate_text.
+
+    Args:
+        prompt: Prompt text
+        generation_config: Plain dict generation config, e.g. {"temperature": 0.2}
+        attempt: Attempt number of retrying callers, part of the cache key
+
+    Returns:
+        str: Text of the answer
+    """
+    backend, response = llm_backend, None
+    start = time.perf_counter()
+    try:
+        with tracer.span("llm call", backend=backend.model_name, attempt=attempt):
+            response = llm_response_cache.generate(backend, prompt, generation_config=generation_config,
+                                                   attempt=attempt)
+        return response
+    finally:
+        cache_hit = llm_response_cache.last_call_was_hit()
+        llm_accounting.record(calling_function(), prompt, response, time.perf_counter() - start, attempt,
+                              cache_hit=cache_hit, usage=None if cache_hit else backend.last_usage())
+
+
+"""functions below are helper functions"""
+
+
+def _constrain_to_enum(text: str, generation_config: Dict) -> str:
+    """Mimics response_mime_type "text/x.enum": answers outside the enum become "None" or the first option."""
+    schema = generation_config.get("response_schema") if generation_config else None
+    if not isinstance(schema, dict) or "enum" not in schema:
+        return text
+    options = schema["enum"]
+    if text in options:
+        return text
+    return "None" if "None" in options else options[0]
+
+
+def _last_field(prompt: str, field: str) -> str:
+    """Returns the rest of the line after the last occurrence of `field` in the prompt."""
+    matches = re.findall(re.escape(field) + r"(.*)", prompt)
+    return matches[-1].strip() if matches else ""
+
+
+def _parse_literal(text: str, default):
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return default
+
+
+def _last_article(prompt: str) -> str:
+    return _last_field(prompt, "Article:").strip('"')
+
+
+def _stub_company_at_center(prompt: str, generation_config: Dict) -> str:
+    return _stub_pick_company(_last_article(prompt), _parse_literal(_last_field(prompt, "Possible companies:"), []))
+
+
+def _stub_pick_company(article: str, companies: List[str]) -> str:
+    """The first company whose first word is mentioned in the article."""
+    article = article.lower()
+    for company in companies:
+        if company != "None" and company.split()[0].lower() in article:
+            return company
+    return "None"
+
+
+_STUB_NODE_TYPE_KEYWORDS = [
+    (("ceo", "chief executive", "manag"), "Manager"),
+    (("board", "chairman", "supervisory"), "Board_Member"),
+    (("founder", "founded"), "Founder"),
+    (("headquarter", "relocat", "moves to", "moved"), "City"),
+    (("acquir", "bought", "buys", "merger", "stake", "divest", "sells"), "Company"),
+    (("index", "listed", "stock exchange"), "StockMarketIndex"),
+    (("industry", "sector", "market entry"), "Industry_Field"),
+    (("launch", "product", "introduc", "unveil"), "Product_or_Service"),
+]
+
+
+def _stub_node_type(prompt: str, generation_config: Dict) -> str:
+    return _stub_pick_node_type(_last_article(prompt))
+
+
+def _stub_pick_node_type(article: str) -> str:
+    article = article.lower()
+    for keywords, node_type in _STUB_NODE_TYPE_KEYWORDS:
+        if any(keyword in article for keyword in keywords):
+            return node_type
+    return "None"
+
+
+def _stub_classification(prompt: str, generation_config: Dict) -> str:
+    node_types = _parse_literal(_last_field(prompt, "Available node_types:"), [])
+    node_type = _stub_node_type(prompt, generation_config)
+    return json.dumps({"company": _stub_company_at_center(prompt, generation_config),
+                       "node_type": node_type if node_type in node_types else "None"})
+
+
+def _stub_change_triples_batch(prompt: str, generation_config: Dict) -> str:
+    """Answers a batched prompt article by article, keeping the existing triples of the chosen node type."""
+    companies = _parse_literal(_last_field(prompt, "Possible companies:"), [])
+    node_types = _parse_literal(_last_field(prompt, "Available node_types:"), [])
+    existing_triples = json.loads(_last_field(prompt, "Existing triples by node_type:") or "{}")
+    answers = []
+    for entry in json.loads(_last_field(prompt, "Articles:") or "[]"):
+        node_type = _stub_pick_node_type(entry["text"])
+        node_type = node_type if node_type in node_types else "None"
+        answers.append({"article_id": entry["article_id"],
+                        "company": _stub_pick_company(entry["text"], companies),
+                        "node_type": node_type,
+                        "triples": existing_triples.get(node_type, [])})
+    return json.dumps({"articles": answers})
+
+
+_STUB_RELATIONSHIP_TARGET_TYPES = {
+    "OWNS": "Company",
+    "PARTNERS_WITH": "Company",
+    "IS_ACTIVE_IN": "Industry_Field",
+    "IS_MANAGED_BY": "Manager",
+    "WAS_FOUNDED_BY": "Founder",
+    "HAS_BOARD_MEMBER": "Board_Member",
+    "HAS_HEADQUARTER_IN": "City",
+    "OFFERS": "Product_or_Service",
+    "IS_LISTED_IN": "StockMarketIndex",
+}
+
+
+def _stub_triple_types(prompt: str, generation_config: Dict) -> str:
+    triple = _parse_literal(_last_field(prompt, "Input:"), {})
+    node_types = _parse_literal(_last_field(prompt, "Available node_types:"), [])
+    type_node_to = _STUB_RELATIONSHIP_TARGET_TYPES.get(triple.get("relationship") if isinstance(triple, dict) else None,
+                                                       "Product_or_Service")
+    if node_types and type_node_to not in node_types:
+        type_node_to = "Product_or_Service" if "Product_or_Service" in node_types else node_types[0]
+    return json.dumps({"type_node_from": "Company", "type_node_to": type_node_to})
+
+
+def _stub_change_triples(prompt: str, generation_config: Dict) -> str:
+    triples = _parse_literal(_last_field(prompt, "Input triples:"), [])
+    return json.dumps({"triples": triples if isinstance(triples, list) else []})
+
+
+def _stub_summary(prompt: str, generation_config: Dict) -> str:
+    match = re.search(r"the full text of the article (.*?) and then summarize", prompt, re.DOTALL)
+    text = match.group(1).strip() if match else ""
+    return re.split(r"(?<=[.!?])\s", text, maxsplit=1)[0]
@@ -0,0 +1,248 @@
+import atexit
+import dataclasses
+import hashlib
+import json
+import os
+import threading
+import time
+import warnings
+from typing import Dict, Optional, Any
+
+
+class LLMCacheMiss(KeyError):
+    """Raised in strict replay mode when a prompt has no cached response."""
+
+
+class LLMResponseCache:
+    """Content-addressed, disk-backed cache of LLM responses.
+
+    Responses are keyed by a SHA-256 hash of the prompt, the model name and the generation config
+    (and the attempt number for retries, so a retry after an unparsable answer does not get the same
+    answer again and a replay reproduces the original sequence of attempts). The cache is bounded by
+    `max_entries` and `max_bytes`; the least recently used entries are evicted first.
+
+    It is persisted as a JSON snapshot (cache_file) plus an append-only JSON Lines journal next to
+    it: a new response costs one appended line instead of rewriting the whole file under the lock,
+    so concurrent workers are not serialized on the disk. The journal is replayed on load and
+    compacted into the snapshot every `compact_every` responses and at exit (see save).
+
+    In strict replay mode every miss raises LLMCacheMiss instead of calling the model, which makes
+    benchmark reruns fully deterministic and guarantees that no request leaves the machine.
+    """
+
+    def __init__(self, cache_file='files/llm_cache/llm_responses.json', max_entries: int = 20000,
+                 max_bytes: int = 100 * 1024 * 1024, strict_replay: bool = False, enabled: bool = True,
+                 compact_every: int = 1000):
+        self.cache_file = cache_file
+        self.journal_file = os.path.splitext(cache_file)[0] + ".journal.jsonl"
+        self.compact_every = compact_every
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.strict_replay = strict_replay
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.RLock()
+        self._local = threading.local()  # whether the last generate call of a thread was a hit
+        self._cache = None  # loaded on first use, not at import time
+        self._total_bytes = 0
+        self._journal = None  # append handle of journal_file
+        self._journal_entries = 0  # responses in the journal, not yet compacted into the snapshot
+
+    @property
+    def cache(self) -> Dict:
+        """Cached responses, loaded from cache_file on first access."""
+        with self._lock:
+            if self._cache is None:
+                self._ensure_cache_directory()
+                self.cache = self._load_cache()
+                self._evict()  # the journal does not record evictions
+                atexit.register(self.save)
+            return self._cache
+
+    @cache.setter
+    def cache(self, cache_data: Dict):
+        with self._lock:
+            self._cache = cache_data
+            self._total_bytes = sum(entry["size"] for entry in cache_data["responses"].values())
+
+    @staticmethod
+    def make_key(prompt: str, model_name: str, generation_config: Any = None, attempt: int = 1) -> str:
+        """Hashes everything that determines a response into the cache key."""
+        payload = {
+            "prompt": prompt,
+            "model": model_name,
+            "generation_config": _normalize_generation_config(generation_config),
+        }
+        if attempt > 1:
+            payload["attempt"] = attempt
+        serialized = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self.cache["responses"].get(key)
+            if entry is None:
+                return None
+            entry["last_used"] = time.time()
+            return entry["response"]
+
+    def put(self, key: str, response: str, model_name: str):
+        entry = {
+            "response": response,
+            "model": model_name,
+            "created": time.time(),
+            "last_used": time.time(),
+            "size": len(response.encode("utf-8")),
+        }
+        with self._lock:
+            previous = self.cache["responses"].get(key)
+            self._total_bytes += entry["size"] - (previous["size"] if previous else 0)
+            self.cache["responses"][key] = entry
+            self._evict()
+            self._append_to_journal(key, entry)
+            if self._journal_entries >= self.compact_every:
+                self.save()
+
+    def save(self):
+        """Writes the snapshot and empties the journal. Runs every compact_every responses and at exit."""
+        with self._lock:
+            if self._cache is None:
+                return
+            self._save_cache()
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            if os.path.exists(self.journal_file):
+                os.remove(self.journal_file)
+            self._journal_entries = 0
+
+    def generate(self, backend, prompt: str, generation_config: Any = None, attempt: int = 1) -> str:
+        """Returns the answer of `backend.generate`, served from the cache if possible.
+
+        Args:
+            backend: llmbackend.LLMBackend; backends with `cacheable = False` bypass the cache
+            prompt: Prompt text
+            generation_config: Generation config passed on to the backend, part of the cache key
+            attempt: Attempt number of retrying callers, part of the cache key for attempts > 1
+
+        Raises:
+            LLMCacheMiss: In strict replay mode, if the response is not cached
+        """
+        model_name = getattr(backend, "model_name", type(backend).__name__)
+        self._local.last_hit = False
+        if not self.enabled or not getattr(backend, "cacheable", True):
+            return backend.generate(prompt, generation_config)
+
+        key = self.make_key(prompt, model_name, generation_config, attempt)
+        with self._lock:
+            cached = self.get(key)
+            if cached is not None:
+                self.hits += 1
+                self._local.last_hit = True
+                return cached
+            self.misses += 1
+
+        if self.strict_replay:
+            raise LLMCacheMiss(f"No cached LLM response for key {key} (strict replay mode)")
+
+        response = backend.generate(prompt, generation_config)
+        self.put(key, response, model_name)
+        return response
+
+    def last_call_was_hit(self) -> bool:
+        """Whether the last generate call of the current thread was answered from the cache."""
+        return getattr(self._local, "last_hit", False)
+
+    def clear(self):
+        with self._lock:
+            self.cache = {"responses": {}}
+            self.save()
+
+    def print_current_stats(self):
+        total = self.hits + self.misses
+        print(f"\n--- LLM Cache Statistics ---")
+        print(f"Cache Hits: {self.hits}")
+        print(f"Cache Misses: {self.misses}")
+        print(f"Cached responses: {len(self.cache['responses'])}, evicted: {self.evictions}")
+        if total > 0:
+            print(f"Which is a cache hit ratio of {self.hits / total * 100:.3f}%\n")
+
+    def _evict(self):
+        responses = self.cache["responses"]
+        if len(responses) <= self.max_entries and self._total_bytes <= self.max_bytes:
+            return
+
+        for key in sorted(responses, key=lambda k: responses[k]["last_used"]):
+            if len(responses) <= self.max_entries and self._total_bytes <= self.max_bytes:
+                break
+            self._total_bytes -= responses.pop(key)["size"]
+            self.evictions += 1
+
+    def _ensure_cache_directory(self):
+        directory = os.path.dirname(self.cache_file)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+
+    def _load_cache(self) -> Dict:
+        cache_data = {"responses": {}}
+        if os.path.exists(self.cache_file):
+            try:
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    snapshot = json.load(f)
+                if "responses" in snapshot:
+                    cache_data = snapshot
+            except json.JSONDecodeError as e:
+                warnings.warn(f"LLM cache reset due to JSON error: {e}")
+                os.replace(self.cache_file, f"{self.cache_file}.corrupted")
+
+        if os.path.exists(self.journal_file):
+            with open(self.journal_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # a line cut off by a crash
+                    cache_data["responses"][entry.pop("key")] = entry
+                    self._journal_entries += 1
+        return cache_data
+
+    def _append_to_journal(self, key: str, entry: Dict):
+        try:
+            if self._journal is None:
+                self._journal = open(self.journal_file, 'a', encoding='utf-8')
+            self._journal.write(json.dumps({"key": key, **entry}, ensure_ascii=False) + "\n")
+            self._journal.flush()
+            self._journal_entries += 1
+        except Exception as e:
+            print(f"Error appending to LLM cache journal: {e}")
+
+    def _save_cache(self):
+        try:
+            temp_file = f"{self.cache_file}.tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(self.cache, f, ensure_ascii=False)
+            os.replace(temp_file, self.cache_file)
+        except Exception as e:
+            print(f"Error saving LLM cache: {e}")
+
+
+"""functions below are helper functions"""
+
+
+def _normalize_generation_config(generation_config: Any) -> Any:
+    """Turns GenerationConfig objects and dicts into a stable, JSON serializable form."""
+    if generation_config is None:
+        return None
+    if dataclasses.is_dataclass(generation_config):
+        generation_config = dataclasses.asdict(generation_config)
+    elif not isinstance(generation_config, dict):
+        if not hasattr(generation_config, "__dict__"):
+            return str(generation_config)
+        generation_config = vars(generation_config)
+    return {key: value for key, value in generation_config.items() if value is not None}
+
+
+# Initialize the response cache globally, like the Wikidata cache
+llm_response_cache = LLMResponseCache()
@@ -1,50 +1,55 @@
-import configparser
+import argparse
+import asyncio
 import json
+import os
+import tempfile
+import time
+import traceback
 from datetime import datetime, timezone
-import colorama
-from colorama import init, Fore, Style
-from neo4j import GraphDatabase
-
-from articles import preprocess_news, generate_real_articles, save_to_json
-from graphbuilder import reset_graph, build_graph_from_root
-from graphupdater import update_neo4j_graph
-from wikidata.wikidataCache import WikidataCache
-
-# Initialize colorama for colored output
-colorama.init()
+from colorama import Fore, Style
+
+# Only light modules are imported here. The graph builder and updater (and with them Neo4j, numpy
+# and scipy), the deduplicator and the Wikidata cache are imported by the functions using them, so
+# commands like benchmark-stats start quickly and need no credentials, see appcontext.AppContext.
+from appcontext import CONFIG_FILE, AppContext, app_context
+from articlestream import ProgressStore, iter_articles
+from benchmarkstore import BenchmarkStore, benchmark_store_path
+from tracing import tracer
+from llmaccounting import llm_accounting
+from llmcache import llm_response_cache
+from llmbackend import StubBackend, set_llm_backend, get_llm_backend
 
 # Configuration and constants
-CONFIG_FILE = 'config.ini'
 BENCHMARK_FILE = "files/benchmarking_data/synthetic_articles_benchmarked.json"  # Consistent file path
 REAL_ARTICLES_BENCHMARK_FILE = "files/benchmarking_data/real_articles_benchmarked.json"
+BULK_IMPORT_DIR = "files/bulk_import"
+STREAM_PROGRESS_FILE = "files/stream_progress.jsonl"
 
 
 def connect_to_neo4j(config_file=CONFIG_FILE):
     """Establishes a connection to the Neo4j database."""
-    config = configparser.ConfigParser()
-    config.read(config_file)
-    try:
-        driver = GraphDatabase.driver(
-            config['neo4j']['uri'],
-            auth=(config['neo4j']['username'], config['neo4j']['password'])
-        )
-        driver.verify_connectivity()
-        print("Connection successful!")
-        return driver
-    except Exception as e:
-        print(f"Connection failed: {e}")
-        return None
-
-
-def build_knowledge_graph(driver, companies, date_range, included_nodes, search_depth):
+    context = app_context if config_file == app_context.config_file else AppContext(config_file)
+    return context.connect_neo4j()
+
+
+async def connect_to_neo4j_async(config_file=CONFIG_FILE):
+    """Establishes an asyncio connection to the Neo4j database, used by graphbuilder_async."""
+    context = app_context if config_file == app_context.config_file else AppContext(config_file)
+    return await context.connect_neo4j_async()
+
+
+def build_knowledge_graph(driver, companies, date_range, included_nodes, search_depth, planner=None):
     """Builds the initial knowledge graph in Neo4j."""
+    from graphbuilder import reset_graph, build_graph_from_root
+    from wikidata.wikidataCache import WikidataCache
+
     reset_graph(driver)
     print("Resetting graph.")
 
     for company_name in companies:
         print(Fore.GREEN + f"\n--- Started building graph for {company_name} ---\n" + Style.RESET_ALL)
         build_graph_from_root(company_name, "Company", date_range, included_nodes, search_depth,
-                              driver)
+                              driver, planner=planner)
         print(Fore.GREEN + f"\n--- Finished building graph for {company_name} ---\n" + Style.RESET_ALL)
 
     print(
@@ -53,66 +58,284 @@ def build_knowledge_graph(driver, companies, date_range, included_nodes, search_
     WikidataCache.print_current_stats()
 
 
+def build_knowledge_graph_async(companies, date_range, included_nodes, search_depth):
+    """Builds the initial knowledge graph with graphbuilder_async, expanding whole frontiers concurrently."""
+    from graphbuilder_async import build_graph_from_root_async
+    from wikidata.wikidataCache import WikidataCache
+
+    async def build():
+        driver = await connect_to_neo4j_async()
+        if not driver:
+            return
+        try:
+            async with driver.session() as session:
+                await session.run("MATCH(n) DETACH DELETE n")
+            print("Resetting graph.")
+            for company_name in companies:
+                print(Fore.GREEN + f"\n--- Started building graph for {company_name} ---\n" + Style.RESET_ALL)
+                await build_graph_from_root_async(company_name, "Company", date_range, included_nodes, search_depth,
+                                                  driver)
+                print(Fore.GREEN + f"\n--- Finished building graph for {company_name} ---\n" + Style.RESET_ALL)
+        finally:
+            await driver.close()
+
+    asyncio.run(build())
+    print(
+        f"\n--- Successfully finished building neo4j graph for companies {companies} with a depth of {search_depth} ---\n")
+    WikidataCache.strip_cache()
+    WikidataCache.print_current_stats()
+
+
+def export_knowledge_graph(companies, date_range, included_nodes, search_depth, output_dir=BULK_IMPORT_DIR,
+                           planner=None):
+    """Exports the initial knowledge graph as neo4j-admin import CSVs instead of writing it over Bolt.
+
+    Runs the same Wikidata expansion as build_knowledge_graph without needing a database connection.
+    The printed neo4j-admin command loads the files into an empty (stopped) database.
+    """
+    from bulkexport import AdminImportCsvWriter, export_graph_from_root
+    from wikidata.wikidataCache import WikidataCache
+
+    with AdminImportCsvWriter(output_dir) as writer:
+        for company_name in companies:
+            print(Fore.GREEN + f"\n--- Started exporting graph for {company_name} ---\n" + Style.RESET_ALL)
+            export_graph_from_root(company_name, "Company", date_range, included_nodes, search_depth, writer,
+                                   planner=planner)
+            print(Fore.GREEN + f"\n--- Finished exporting graph for {company_name} ---\n" + Style.RESET_ALL)
+
+    print(
+        f"\n--- Successfully exported graph for companies {companies} with a depth of {search_depth} to {output_dir} ---\n")
+    writer.print_stats()
+    WikidataCache.strip_cache()
+    WikidataCache.print_current_stats()
+
+
 def update_knowledge_graph(driver, companies, included_nodes, benchmark_mode=False,
-                           filepath=BENCHMARK_FILE):
-    """Updates the knowledge graph based on articles in a JSON file."""
+                           filepath=BENCHMARK_FILE, batch_size=1, workers=1, deterministic=True, preclassify=False,
+                           speculative_sanity_check=None, deduplicate=False):
+    """Updates the knowledge graph based on articles in a JSON file.
+
+    Benchmark answers are recorded in the BenchmarkStore next to the file (see benchmark_store_path),
+    which also takes over results still kept in the file itself. Articles with a judged update are skipped.
+
+    With a batch_size above 1, up to batch_size articles of the same company are classified and
+    diffed in one LLM call (see update_neo4j_graph_batch) instead of one article per call.
+    With more than one worker, single articles are processed concurrently by a
+    ConcurrentUpdatePipeline, writes stay serialized per company (in file order if deterministic).
+    Benchmark questions are asked after all articles have been processed in that case.
+    With preclassify, articles naming one company and one node type keyword skip the classification LLM call.
+    With speculative_sanity_check ("revert", "quarantine" or "log"), updates passing the formal sanity check
+    are written right away and the LLM sanity check runs in the background, rejected updates are handled
+    as given (see sanitychecker.SpeculativeSanityChecker). Benchmark answers are recorded before the
+    verdicts are in.
+    With deduplicate, near-duplicates of articles updated successfully before, published within the
+    time window of the ArticleDeduplicator, are skipped.
+    """
+    from dedup import ArticleDeduplicator, article_timestamp
+    from graphupdater import update_neo4j_graph, update_neo4j_graph_batch
+    from updatepipeline import ConcurrentUpdatePipeline
 
     print(Fore.LIGHTMAGENTA_EX + f"\n--- Started updating existing neo4j graph ---\n" + Style.RESET_ALL)
+    neighbourhood_cache, preclassifier = _prepare_update(driver, companies, included_nodes, preclassify,
+                                                         speculative_sanity_check)
+    deduplicator = ArticleDeduplicator() if deduplicate else None
+    start_time = time.perf_counter()
+    processed_articles = 0
 
     try:
-        with open(filepath, 'r+', encoding='utf-8') as f:
+        with open(filepath, 'r', encoding='utf-8') as f:
             articles_json = json.load(f)
     except FileNotFoundError:
         print(Fore.RED + f"Error: File not found: {filepath}" + Style.RESET_ALL)
         return
+    benchmark_store = BenchmarkStore(benchmark_store_path(filepath))
+    benchmark_store.import_json(filepath)  # results still kept in the articles file itself
 
+    pending_by_company = {}
     for company, articles in articles_json.items():
         if company in companies:
-            print("---")
+            pending_articles = pending_by_company.setdefault(company, [])
             for article_key, article_data in articles.items():
                 try:
                     # Check if already benchmarked
-                    with open(filepath, 'r', encoding='utf-8') as z:
-                        articles_benchmarked_json = json.load(z)
-                        if articles_benchmarked_json[company][article_key].get("benchmarking", {}).get(
-                                "correct update") is not None:
-                            print(
-                                f"Skipping {company}, {article_key} because it seems to have already been benchmarked")
-                            continue  # Skip to the next article
-
-                    print("---")
-                    print(f"Company: {company}, Article Nr: {article_key}, Article Text: {article_data['text']}")
-                    added, deleted, unchanged = update_neo4j_graph(article_data['text'], companies, included_nodes,
-                                                                   included_nodes, driver=driver)
-
-                    if benchmark_mode:
-                        benchmark_update(filepath, company, article_key, articles_json, added, deleted, unchanged)
+                    if benchmark_store.is_benchmarked(company, article_key):
+                        print(f"Skipping {company}, {article_key} because it seems to have already been benchmarked")
+                        continue  # Skip to the next article
+                    pending_articles.append((article_key, article_data['text']))
 
                 except KeyError as e:
                     raise KeyError(f"Error: Key not found in article data: {e}")
 
-    print(Fore.LIGHTMAGENTA_EX + f"\n--- Finished updating existing neo4j graph ---\n" + Style.RESET_ALL)
-
+    # Near-duplicates are only checked against articles already updated successfully, so a failed
+    # update never causes its copies to be skipped
+    def is_duplicate(company, article_key, article_text):
+        if deduplicator is None:
+            return False
+        original = deduplicator.check((company, article_key), article_text,
+                                      article_timestamp(articles_json[company][article_key].get('date')))
+        if original is not None:
+            print(f"Skipping {company}, {article_key} as a near-duplicate of {original[0]}, {original[1]}")
+        return original is not None
+
+    def index_updated(company, article_key, article_text):
+        if deduplicator is not None:
+            deduplicator.add((company, article_key), article_text,
+                             article_timestamp(articles_json[company][article_key].get('date')))
+
+    def index_result(key, result):
+        if not isinstance(result, Exception):
+            index_updated(*key, articles_json[key[0]][key[1]]['text'])
+
+    if workers > 1:
+        pipeline = ConcurrentUpdatePipeline(companies, included_nodes, included_nodes, driver, neighbourhood_cache,
+                                            max_workers=workers, deterministic=deterministic,
+                                            preclassifier=preclassifier)
+        results = pipeline.run((((company, article_key), article_text)
+                                for company, pending_articles in pending_by_company.items()
+                                for article_key, article_text in pending_articles
+                                if not is_duplicate(company, article_key, article_text)),
+                               on_result=index_result)
+        processed_articles = len(results)
+        pipeline.print_stats()
+
+        if benchmark_mode:
+            for (company, article_key), result in results:
+                if isinstance(result, Exception):
+                    continue
+                print(f"Company: {company}, Article Nr: {article_key}, "
+                      f"Article Text: {articles_json[company][article_key]['text']}")
+                benchmark_update(benchmark_store, company, article_key, *result)
+
+    else:
+        for company, pending_articles in pending_by_company.items():
+            print("---")
+            for batch_start in range(0, len(pending_articles), batch_size):
+                batch = [(article_key, article_text)
+                         for article_key, article_text in pending_articles[batch_start:batch_start + batch_size]
+                         if not is_duplicate(company, article_key, article_text)]
+                if not batch:
+                    continue
+                print("---")
+                for article_key, article_text in batch:
+                    print(f"Company: {company}, Article Nr: {article_key}, Article Text: {article_text}")
+
+                if batch_size > 1:
+                    results = update_neo4j_graph_batch([text for _, text in batch], company, companies,
+                                                       included_nodes, included_nodes, driver=driver,
+                                                       neighbourhood_cache=neighbourhood_cache)
+                else:
+                    results = [update_neo4j_graph(batch[0][1], companies, included_nodes, included_nodes,
+                                                  driver=driver, neighbourhood_cache=neighbourhood_cache,
+                                                  preclassifier=preclassifier)]
+                processed_articles += len(batch)
+                for article_key, article_text in batch:
+                    index_updated(company, article_key, article_text)
+
+                if benchmark_mode:
+                    for (article_key, _), (added, deleted, unchanged) in zip(batch, results):
+                        benchmark_update(benchmark_store, company, article_key, added, deleted, unchanged)
+
+    benchmark_store.close()
+    _finish_update(processed_articles, time.perf_counter() - start_time, neighbourhood_cache, preclassifier,
+                   f" with a batch size of {batch_size}", deduplicator)
+
+
+def stream_knowledge_graph_updates(driver, companies, included_nodes, source, progress_file=STREAM_PROGRESS_FILE,
+                                   workers=1, deterministic=True, follow=False, preclassify=False,
+                                   speculative_sanity_check=None, deduplicate=False):
+    """Updates the knowledge graph from a JSON Lines article feed, processing articles as they arrive.
+
+    Unlike update_knowledge_graph, no articles file is loaded as a whole: the feed (a .jsonl file, "-"
+    for stdin or a spool directory, see articlestream.iter_articles) is consumed lazily, and finished
+    articles are appended to a ProgressStore, so a restarted run skips them. A spool file is only moved
+    to "done" once all its articles are recorded there, so a crash loses none of the articles that
+    were still queued. Articles about companies
+    not in `companies` are skipped without being recorded. With more than one worker the articles are
+    fed through a ConcurrentUpdatePipeline, whose bounded queue keeps the number of articles in memory
+    constant. With deduplicate, near-duplicates of articles updated successfully within the time window
+    of the ArticleDeduplicator are recorded as "duplicate" and skipped.
+    """
+    from dedup import ArticleDeduplicator
+    from graphupdater import update_neo4j_graph
+    from updatepipeline import ConcurrentUpdatePipeline
+
+    print(Fore.LIGHTMAGENTA_EX + f"\n--- Started streaming article updates from {source} ---\n" + Style.RESET_ALL)
+    neighbourhood_cache, preclassifier = _prepare_update(driver, companies, included_nodes, preclassify,
+                                                         speculative_sanity_check)
+    progress = ProgressStore(progress_file)
+    print(f"{len(progress)} articles already processed according to {progress_file}")
+    deduplicator = ArticleDeduplicator() if deduplicate else None
+    start_time = time.perf_counter()
+    processed_articles = 0
+
+    in_flight = {}  # key -> text of the articles being updated, indexed by the deduplicator once they succeed
+
+    def pending_articles():
+        for key, text in iter_articles(source, follow=follow, progress=progress):
+            if key[0] not in companies or progress.is_done(key):
+                progress.skip(key)
+                continue
+            # only successfully updated articles are indexed, so the original of a duplicate is done
+            if deduplicator is not None and deduplicator.check(key, text) is not None:
+                progress.mark_done(key, status="duplicate")
+                continue
+            if deduplicator is not None:
+                in_flight[key] = text
+            yield key, text
+
+    def record(key, result):
+        text = in_flight.pop(key, None)
+        if text is not None and not isinstance(result, Exception):
+            deduplicator.add(key, text)
+        progress.mark_done(key, status="failed" if isinstance(result, Exception) else "updated")
 
-def benchmark_update(filepath, company, article_key, articles_json, added, deleted, unchanged):
-    """Handles the benchmarking logic for a single article update."""
+    try:
+        if workers > 1:
+            pipeline = ConcurrentUpdatePipeline(companies, included_nodes, included_nodes, driver, neighbourhood_cache,
+                                                max_workers=workers, deterministic=deterministic,
+                                                preclassifier=preclassifier)
+            pipeline.run(pending_articles(), on_result=record, keep_results=False)
+            processed_articles = pipeline.stats["articles"]
+            pipeline.print_stats()
+        else:
+            for key, text in pending_articles():
+                print(f"Company: {key[0]}, Article Nr: {key[1]}, Article Text: {text}")
+                try:
+                    result = update_neo4j_graph(text, companies, included_nodes, included_nodes, driver=driver,
+                                                neighbourhood_cache=neighbourhood_cache, preclassifier=preclassifier)
+                except Exception as e:  # like ConcurrentUpdatePipeline, one failing article does not end the stream
+                    print(Fore.RED + f"Error while updating the graph from article {key}: {e}" + Style.RESET_ALL)
+                    traceback.print_exc()
+                    result = e
+                record(key, result)
+                processed_articles += 1
+    finally:
+        progress.close()
+
+    _finish_update(processed_articles, time.perf_counter() - start_time, neighbourhood_cache, preclassifier,
+                   deduplicator=deduplicator)
+
+
+def benchmark_update(benchmark_store, company, article_key, added, deleted, unchanged):
+    """Handles the benchmarking logic for a single article update.
+
+    The answers are recorded in the BenchmarkStore, export them to the articles file with
+    `python main.py export-benchmark`.
+    """
 
-    articles_json[company][article_key].setdefault("benchmarking", {})["model update triples"] = {
-        "unchanged": unchanged, "added": added, "deleted": deleted
-    }
+    benchmarking = {"model update triples": {"unchanged": unchanged, "added": added, "deleted": deleted}}
 
     for question in ["correct update", "wikidata structure"]:
         while True:
             user_input = input(f"Is the {question} for {company} - {article_key} correct? [y/n]: ")
             if user_input.lower() in ('y', 'n'):
-                articles_json[company][article_key]["benchmarking"][question] = user_input.lower() == 'y'
+                benchmarking[question] = user_input.lower() == 'y'
                 break
             else:
                 print("Invalid input. Please enter 'y' or 'n'.")
 
-    with open(filepath, 'w', encoding='utf-8') as f:  # Save after each article in benchmark mode
-        json.dump(articles_json, f, indent=4, ensure_ascii=False)
-        print(f"Successfully saved updates for '{company} - {article_key}' to '{filepath}'")
+    benchmark_store.record(company, article_key, benchmarking)  # Save after each article in benchmark mode
+    print(f"Successfully saved updates for '{company} - {article_key}' to '{benchmark_store.filepath}'")
     print("---")
 
 
@@ -215,16 +438,148 @@ def calculate_benchmark_statistics(filepath: str) -> dict:
     return stats
 
 
-def main():
-    driver = connect_to_neo4j()
+"""functions below are helper functions"""
+
+
+def _prepare_update(driver, companies, included_nodes, preclassify, speculative_sanity_check):
+    """Sets up the caches and optional components shared by all update modes."""
+    from graphupdater import speculative_checker, entity_index
+    from neighbourhoodcache import NeighbourhoodCache
+    from preclassifier import PreClassifier
+
+    neighbourhood_cache = NeighbourhoodCache(driver)
+    entity_index.add_from_wikidata_cache()
+    entity_index.add_from_graph(driver)
+    preclassifier = None
+    if preclassify:
+        preclassifier = PreClassifier(companies, included_nodes)
+        preclassifier.add_aliases_from_graph(driver)
+    if speculative_sanity_check:
+        speculative_checker.enable(driver, on_reject=speculative_sanity_check)
+    return neighbourhood_cache, preclassifier
+
+
+def _finish_update(processed_articles, elapsed, neighbourhood_cache, preclassifier, mode_description="",
+                   deduplicator=None):
+    """Waits for outstanding sanity checks and prints the throughput and the statistics of all components."""
+    from graphupdater import type_resolver, triple_context_builder, speculative_checker, entity_index
+
+    speculative = speculative_checker.enabled
+    if speculative:
+        speculative_checker.disable()  # waits for the outstanding checks
+    if processed_articles:
+        print(f"Processed {processed_articles} articles{mode_description} in {elapsed:.1f}s "
+              f"({processed_articles / elapsed * 60:.1f} articles/min)")
+    neighbourhood_cache.print_stats()
+    if preclassifier is not None:
+        preclassifier.print_stats()
+    if deduplicator is not None:
+        # LLM calls of this process (answered by the backend or the cache) per updated article
+        llm_calls = get_llm_backend().calls + llm_response_cache.hits
+        deduplicator.print_stats(llm_calls / processed_articles if processed_articles else None)
+    entity_index.print_stats()
+    type_resolver.print_stats()
+    triple_context_builder.print_stats()
+    if speculative:
+        speculative_checker.print_stats()
+    llm_response_cache.print_current_stats()
+    get_llm_backend().print_stats()
+    llm_accounting.print_report()
+    tracer.print_stats()
+    print(Fore.LIGHTMAGENTA_EX + f"\n--- Finished updating existing neo4j graph ---\n" + Style.RESET_ALL)
+
+
+def main(argv=None):
+    """Runs the configured pipeline, or one of the benchmark maintenance commands given on the command line."""
+    parser = argparse.ArgumentParser(description="Builds and updates the company knowledge graph.")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser("run", help="build and update the graph as configured in run() (default)")
+    for command, help_text in (("export-benchmark", "write the stored benchmark results into the articles JSON"),
+                               ("import-benchmark", "take over the results kept in the articles JSON"),
+                               ("benchmark-stats", "print statistics of the stored benchmark results")):
+        subparser = subparsers.add_parser(command, help=help_text)
+        subparser.add_argument("--articles", default=BENCHMARK_FILE, help="articles JSON file grouped by company")
+        if command == "export-benchmark":
+            subparser.add_argument("--output", help="output file, defaults to the articles file itself")
+    harness_parser = subparsers.add_parser("harness", help="score the pipeline against golden labels, no Neo4j "
+                                                           "or manual input needed")
+    harness_parser.add_argument("--articles", help="benchmarked articles JSON file, defaults to the golden file")
+    harness_parser.add_argument("--llm", choices=("stub", "replay", "live"), default="stub",
+                                help="StubBackend, strict replay of the LLM response cache, or the live backend")
+    harness_parser.add_argument("--offline-wikidata", action="store_true",
+                                help="answer Wikidata lookups from the cache only")
+    harness_parser.add_argument("--max-articles", type=int)
+    harness_parser.add_argument("--llm-sanity-check", action="store_true",
+                                help="include llm_sanity_check in the sanity check stage")
+    harness_parser.add_argument("--output", help="JSON file the report is written to")
+    harness_parser.add_argument("--preclassifier", action="store_true",
+                                help="measure the precision of the rule-based pre-classifier")
+    args = parser.parse_args(argv)
+    app_context.init_colorama()
+
+    if args.command in (None, "run"):
+        run()
+        return
+
+    if args.command == "harness":
+        from benchmarkharness import GOLDEN_FILE, run_benchmark_harness
+
+        if args.llm == "stub":
+            set_llm_backend(StubBackend())
+        llm_response_cache.strict_replay = args.llm == "replay"
+        app_context.wikidata_cache.offline = args.offline_wikidata
+        run_benchmark_harness(args.articles or GOLDEN_FILE, max_articles=args.max_articles,
+                              with_llm_sanity_check=args.llm_sanity_check, output_filepath=args.output,
+                              with_preclassifier=args.preclassifier)
+        return
+
+    benchmark_store = BenchmarkStore(benchmark_store_path(args.articles))
+    try:
+        if args.command == "export-benchmark":
+            exported = benchmark_store.export_json(args.articles, args.output)
+            print(f"Exported the results of {exported} articles to '{args.output or args.articles}'")
+        elif args.command == "import-benchmark":
+            imported = benchmark_store.import_json(args.articles, overwrite=True)
+            print(f"Imported the results of {imported} articles into '{benchmark_store.filepath}'")
+        elif args.command == "benchmark-stats":
+            with tempfile.TemporaryDirectory() as directory:
+                exported_file = os.path.join(directory, "benchmark.json")
+                benchmark_store.export_json(args.articles, exported_file)
+                calculate_benchmark_statistics(filepath=exported_file)
+    finally:
+        benchmark_store.close()
+
+
+def run():
+    from expansionplanner import ExpansionPlanner
+
+    driver = app_context.neo4j_driver
     if not driver:
         return  # Exit if connection failed
 
     # Configuration
     build_graph = True
+    export_graph = False  # writes neo4j-admin import CSVs instead, for large initial builds
+    async_build = False  # build with the asyncio driver, expanding each level's frontier concurrently
     update_graph = True
     benchmark = True
     benchmark_stats = False
+    llm_strict_replay = False  # only replay cached LLM responses, fail on a cache miss
+    offline_llm = False  # answer all LLM prompts with the local StubBackend, e.g. for load tests
+    update_batch_size = 1  # articles of the same company per LLM call when updating the graph
+    update_workers = 1  # concurrent article workers, writes stay serialized per company
+    preclassify_articles = False  # resolve obvious articles with local rules instead of an LLM call
+    speculative_sanity_check = None  # "revert", "quarantine" or "log": LLM sanity check off the critical path
+    article_stream = None  # JSON Lines feed to update from instead of filepath: a .jsonl file, "-" or a spool dir
+    deduplicate_articles = False  # skip near-duplicates (wire copies, syndicated versions) of earlier articles
+    trace_file = None  # e.g. "files/traces/update.json", or "....otlp.json" for the OpenTelemetry OTLP/JSON format
+    llm_budget = {}  # e.g. {"max_calls_per_article": 6, "max_tokens_per_run": 2_000_000}, see LLMAccounting
+    llm_cost_report_file = None  # e.g. "files/llm_cost_report.json"
+
+    llm_response_cache.strict_replay = llm_strict_replay
+    llm_accounting.set_budget(**llm_budget)
+    if offline_llm:
+        set_llm_backend(StubBackend(latency=0.5, jitter=0.5))
 
     companies = ["Adidas AG", "Airbus SE", "BASF SE", "Vonovia SE"]
     companiesDAX = ["Adidas AG", "Airbus SE", "Allianz SE", "BASF SE", "Bayer AG", "Beiersdorf AG",
@@ -243,16 +598,44 @@ def main():
                       "Product_or_Service", "Employer", "StockMarketIndex", "Financial_Data"]
     search_depth = 1
 
-    if build_graph:
-        build_knowledge_graph(driver, companies, date_range, included_nodes, search_depth)
+    # Budget per company graph; None keeps the level-wise expansion limited by max_branching_factor
+    expansion_budget = None  # e.g. ExpansionBudget(max_nodes=150, max_edges=300, max_requests=400)
+    planner = ExpansionPlanner(expansion_budget) if expansion_budget else None
+
+    if build_graph and async_build:
+        build_knowledge_graph_async(companies, date_range, included_nodes, search_depth)
+    elif build_graph:
+        build_knowledge_graph(driver, companies, date_range, included_nodes, search_depth, planner=planner)
+
+    if export_graph:
+        export_knowledge_graph(companies, date_range, included_nodes, search_depth, planner=planner)
 
     filepath = "files/benchmarking_data/synthetic_articles_benchmarked.json"
     filepath = "files/benchmarking_data/demo_article.json"
 
-    if update_graph:
-        update_knowledge_graph(driver, companies, included_nodes, benchmark_mode=benchmark, filepath=filepath)
+    if update_graph and article_stream:
+        stream_knowledge_graph_updates(driver, companies, included_nodes, article_stream, workers=update_workers,
+                                       preclassify=preclassify_articles,
+                                       speculative_sanity_check=speculative_sanity_check,
+                                       deduplicate=deduplicate_articles)
+    elif update_graph:
+        update_knowledge_graph(driver, companies, included_nodes, benchmark_mode=benchmark, filepath=filepath,
+                               batch_size=update_batch_size, workers=update_workers,
+                               preclassify=preclassify_articles, speculative_sanity_check=speculative_sanity_check,
+                               deduplicate=deduplicate_articles)
+
+    if llm_cost_report_file:
+        llm_accounting.export_json(llm_cost_report_file)
+
+    if trace_file and trace_file.endswith(".otlp.json"):
+        tracer.export_otlp(trace_file)
+    elif trace_file:
+        tracer.export_json(trace_file)
 
     if benchmark_stats:
+        benchmark_store = BenchmarkStore(benchmark_store_path(filepath))
+        benchmark_store.export_json(filepath)
+        benchmark_store.close()
         calculate_benchmark_statistics(filepath=filepath)
 
 
@@ -0,0 +1,215 @@
+import threading
+from colorama import Fore, Style
+from typing import Dict, List, Optional, Union
+
+from graphbuilder import session_scope, _format_node_relationships
+
+NEIGHBOURHOOD_QUERY = """
+    MATCH (n) WHERE n.name = $node_name
+    OPTIONAL MATCH (n)-[r]-(connected) WHERE NOT coalesce(r.quarantined, false)
+    RETURN n.wikidata_id as node_id,
+           labels(n)[0] as node_label,
+           elementId(r) as rel_id,
+           type(r) as rel_type,
+           r.end_time as end_time,
+           startNode(r) = n as outgoing,
+           connected.wikidata_id as connected_id,
+           connected.name as connected_name,
+           labels(connected)[0] as connected_label
+"""
+
+
+class NeighbourhoodCache:
+    """Read-through, in-process mirror of the direct neighbourhood of the companies being updated.
+
+    The first lookup for a company loads all of its relationships (with the names, Wikidata IDs and
+    labels of the connected nodes) in one query. Afterwards the lookups the updater repeats per
+    triple are served locally:
+
+    - get_relationship_triples: the triples passed to the LLM
+    - find_node_id / find_node: name and Wikidata ID lookups of nodes in a loaded neighbourhood
+    - get_node_relationships: relationships between two nodes, including their end time
+
+    Writes of the updater are recorded write-through with record_relationship_added,
+    record_relationship_ended and record_relationship_removed, so the mirror stays consistent
+    without reloading. Anything else changing the graph has to call invalidate(). Quarantined
+    relationships (see sanitychecker.SpeculativeSanityChecker) are not mirrored.
+
+    The cache only ever mirrors relationships incident to a loaded company; nodes that are not
+    part of a loaded neighbourhood are reported as misses and have to be looked up in Neo4j.
+    """
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self._lock = threading.RLock()
+        self._neighbourhoods = {}  # company name -> {"node_ids": set, "relationships": {rel_id: rel}}
+        self._nodes = {}  # wikidata_id -> {"name": str, "label": str}
+        self._node_ids_by_name = {}  # name -> wikidata_id
+
+    def get_relationship_triples(self, node_name: str, node_label: str = None, active_only: bool = False) -> Optional[
+        List[Dict[str, str]]]:
+        """Local counterpart of graphbuilder.get_relationship_triples, loading the neighbourhood on first use."""
+        neighbourhood = self._get_neighbourhood(node_name)
+        with self._lock:
+            relationships = []
+            for rel in neighbourhood["relationships"].values():
+                connected = self._nodes.get(rel["connected_id"], {})
+                if node_label is not None and connected.get("label") != node_label:
+                    continue
+                if active_only and rel["end_time"] != "NA":
+                    continue
+                relationships.append({"node_from": node_name.replace("'", ""),
+                                      "relationship": rel["type"].replace("'", ""),
+                                      "node_to": (connected.get("name") or "").replace("'", "")})
+
+            if relationships:
+                return relationships
+            print(f"No relationships found for node '{node_name}'")
+            return None
+
+    def find_node_id(self, name: str) -> Optional[str]:
+        """Returns the Wikidata ID of a node with this name in any loaded neighbourhood, None on a miss."""
+        with self._lock:
+            node_id = self._node_ids_by_name.get(name)
+            self._count(node_id is not None)
+            return node_id
+
+    def find_node(self, wikidata_id: str) -> Union[Dict, bool]:
+        """Local counterpart of graphbuilder.find_node_by_wikidata_id, False on a miss."""
+        with self._lock:
+            node = self._nodes.get(wikidata_id)
+            self._count(node is not None)
+            return dict(node) if node else False
+
+    def get_node_relationships(self, source_wikidata_id: str, target_wikidata_id: str) -> Optional[list]:
+        """Local counterpart of graphbuilder.get_node_relationships for two nodes.
+
+        Returns:
+            list: Relationships as formatted by get_node_relationships, or None if neither node is the
+                centre of a loaded neighbourhood (a miss, the caller has to ask Neo4j)
+        """
+        with self._lock:
+            for neighbourhood in self._neighbourhoods.values():
+                node_ids = neighbourhood["node_ids"]
+                if source_wikidata_id in node_ids or target_wikidata_id in node_ids:
+                    other_id = target_wikidata_id if source_wikidata_id in node_ids else source_wikidata_id
+                    self._count(True)
+                    return _format_node_relationships([
+                        {"type": rel["type"], "id": rel_id, "end_time": rel["end_time"]}
+                        for rel_id, rel in neighbourhood["relationships"].items()
+                        if rel["connected_id"] == other_id
+                    ])
+            self._count(False)
+            return None
+
+    def record_relationship_added(self, rel_id: str, rel_type: str, source: Dict, target: Dict,
+                                  end_time: str = "NA"):
+        """Write-through of a created relationship.
+
+        Args:
+            rel_id: Neo4j elementId of the new relationship
+            rel_type: Relationship type
+            source: {"wikidata_id", "name", "label"} of the start node
+            target: {"wikidata_id", "name", "label"} of the end node
+            end_time: End time of the relationship
+        """
+        with self._lock:
+            for node in (source, target):
+                self._remember_node(node["wikidata_id"], node["name"], node["label"])
+
+            for neighbourhood in self._neighbourhoods.values():
+                for centre, other, outgoing in ((source, target, True), (target, source, False)):
+                    if centre["wikidata_id"] in neighbourhood["node_ids"]:
+                        neighbourhood["relationships"][rel_id] = {
+                            "type": rel_type, "end_time": end_time, "outgoing": outgoing,
+                            "connected_id": other["wikidata_id"],
+                        }
+
+    def record_relationship_ended(self, rel_id: str, end_time: str):
+        """Write-through of an end time set on a relationship."""
+        with self._lock:
+            for neighbourhood in self._neighbourhoods.values():
+                if rel_id in neighbourhood["relationships"]:
+                    neighbourhood["relationships"][rel_id]["end_time"] = end_time
+
+    def record_relationship_removed(self, rel_id: str):
+        """Write-through of a relationship deleted or quarantined by a compensating transaction."""
+        with self._lock:
+            for neighbourhood in self._neighbourhoods.values():
+                neighbourhood["relationships"].pop(rel_id, None)
+
+    def invalidate(self, node_name: str = None):
+        """Drops the mirrored neighbourhood of one company, or all of them if no name is given.
+
+        Has to be called whenever the graph is changed outside of the updater, e.g. after a rebuild.
+        """
+        with self._lock:
+            if node_name is None:
+                self._neighbourhoods.clear()
+                self._nodes.clear()
+                self._node_ids_by_name.clear()
+            else:
+                self._neighbourhoods.pop(node_name, None)
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def print_stats(self):
+        print(f"\n--- Neighbourhood Cache Statistics ---")
+        print(f"Neighbourhoods loaded: {self.loads}")
+        print(f"Hits: {self.hits}, Misses: {self.misses}")
+        print(f"Which is a hit ratio of {self.hit_rate() * 100:.2f}%\n")
+
+    def _get_neighbourhood(self, node_name: str) -> Dict:
+        with self._lock:
+            if node_name in self._neighbourhoods:
+                self.hits += 1
+                return self._neighbourhoods[node_name]
+            self.misses += 1
+
+        # Loaded without holding the lock, so lookups of other companies are not blocked by the query
+        with session_scope(self.driver) as session:
+            records = list(session.run(NEIGHBOURHOOD_QUERY, node_name=node_name))
+
+        with self._lock:
+            if node_name not in self._neighbourhoods:
+                self._store_neighbourhood(node_name, records)
+            return self._neighbourhoods[node_name]
+
+    def _store_neighbourhood(self, node_name: str, records: list):
+        self.loads += 1
+        neighbourhood = {"node_ids": set(), "relationships": {}}
+        for record in records:
+            neighbourhood["node_ids"].add(record["node_id"])
+            self._remember_node(record["node_id"], node_name, record["node_label"])
+            if record["rel_id"] is None:
+                continue
+
+            self._remember_node(record["connected_id"], record["connected_name"], record["connected_label"])
+            neighbourhood["relationships"][record["rel_id"]] = {
+                "type": record["rel_type"],
+                "end_time": record["end_time"] if record["end_time"] is not None else "NA",
+                "outgoing": record["outgoing"],
+                "connected_id": record["connected_id"],
+            }
+
+        self._neighbourhoods[node_name] = neighbourhood
+        print(Fore.BLUE + f"Loaded neighbourhood of '{node_name}' with {len(neighbourhood['relationships'])} "
+                          f"relationships" + Style.RESET_ALL)
+
+    def _remember_node(self, wikidata_id: str, name: str, label: str):
+        if wikidata_id is None:
+            return
+        self._nodes[wikidata_id] = {"name": name, "label": label}
+        if name is not None:
+            self._node_ids_by_name.setdefault(name, wikidata_id)
+
+    def _count(self, hit: bool):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
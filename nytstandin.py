@@ -0,0 +1,152 @@
+import json
+import threading
+import time
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from articles import NYT_PAGE_SIZE
+
+SEARCH_PATH = "/svc/search/v2/articlesearch.json"
+
+
+class NytStandInServer:
+    """Local stand-in for the NYT Article Search API and the article pages it links to.
+
+    Serves SEARCH_PATH with paginated results in the format of the real API ({"response": {"docs",
+    "meta": {"hits"}}}, NYT_PAGE_SIZE docs per page) and every result's web_url as an HTML page
+    with the article text in <p> elements. A search matches the articles whose company contains
+    the search term (case-insensitive). `latency` seconds are added to every request to mimic the
+    network, so articles.ArticleFetcher can be tested and benchmarked offline.
+
+    Example:
+        >>> with NytStandInServer.from_articles_file("files/benchmarking_data/synthetic_articles.json") as server:
+        ...     with ArticleFetcher(search_url=server.search_url, api_key="test", min_request_interval=0) as fetcher:
+        ...         articles = fetcher.fetch_articles("Adidas AG", max_articles=25)
+    """
+
+    def __init__(self, articles: Dict[str, List[Dict]], latency: float = 0.0, port: int = 0):
+        """
+        Args:
+            articles: Articles by company, each a dict with "text" and optionally "date"
+            latency: Seconds added to every request
+            port: Port to listen on, 0 for a free one
+        """
+        self.latency = latency
+        self.requests = {"search": 0, "article": 0}
+        self._docs = {}  # company -> search result docs
+        self._pages = {}  # path -> article text
+        for company, company_articles in articles.items():
+            docs = self._docs.setdefault(company, [])
+            for idx, article in enumerate(company_articles, 1):
+                path = f"/articles/{_slug(company)}/{idx}.html"
+                self._pages[path] = article["text"]
+                docs.append({"web_url": path, "snippet": article["text"][:80], "abstract": article["text"][:200],
+                             "lead_paragraph": article["text"], "source": "The New York Times",
+                             "pub_date": article.get("date") or "2024-01-01T00:00:00+0000"})
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @classmethod
+    def from_articles_file(cls, filepath: str, **kwargs) -> "NytStandInServer":
+        """Serves the articles of an articles JSON file grouped by company, e.g. the synthetic articles."""
+        with open(filepath, 'r', encoding='utf-8') as f:
+            articles_json = json.load(f)
+        return cls({company: list(articles.values()) for company, articles in articles_json.items()}, **kwargs)
+
+    @property
+    def companies(self) -> List[str]:
+        return list(self._docs)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def search_url(self) -> str:
+        return self.base_url + SEARCH_PATH
+
+    def start(self) -> "NytStandInServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def _search(self, query: Dict[str, List[str]]) -> Optional[Dict]:
+        if not query.get("api-key"):
+            return None
+        term = (query.get("q") or [""])[0].casefold()
+        page = int((query.get("page") or ["0"])[0])
+        docs = [dict(doc, web_url=self.base_url + doc["web_url"])
+                for company, company_docs in self._docs.items() if term in company.casefold()
+                for doc in company_docs]
+        return {"status": "OK", "response": {"docs": docs[page * NYT_PAGE_SIZE:(page + 1) * NYT_PAGE_SIZE],
+                                             "meta": {"hits": len(docs), "offset": page * NYT_PAGE_SIZE}}}
+
+    def _count(self, key: str):
+        with self._lock:
+            self.requests[key] += 1
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keeps connections alive for the pooled session
+
+            def do_GET(self):
+                if server.latency:
+                    time.sleep(server.latency)
+                url = urlparse(self.path)
+                if url.path == SEARCH_PATH:
+                    server._count("search")
+                    result = server._search(parse_qs(url.query))
+                    if result is None:
+                        self._send(401, "application/json", json.dumps({"fault": "Invalid ApiKey"}))
+                    else:
+                        self._send(200, "application/json", json.dumps(result))
+                elif url.path in server._pages:
+                    server._count("article")
+                    self._send(200, "text/html; charset=utf-8", _article_html(server._pages[url.path]))
+                else:
+                    self._send(404, "text/plain", "Not found")
+
+            def _send(self, status: int, content_type: str, body: str):
+                data = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass  # no access log on the console
+
+        return Handler
+
+
+"""functions below are helper functions"""
+
+
+def _slug(company: str) -> str:
+    return "".join(character if character.isalnum() else "-" for character in company.casefold())
+
+
+def _article_html(text: str) -> str:
+    paragraphs = "".join(f"<p>{escape(paragraph)}</p>" for paragraph in text.split("\n") if paragraph.strip())
+    return f"<html><head><title>Article</title></head><body><nav><a href=\"/\">Home</a></nav>" \
+           f"<article>{paragraphs}</article></body></html>"
@@ -0,0 +1,207 @@
+import re
+import threading
+from colorama import Fore, Style
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from wikidata.wikidata import wikidata_wbsearchentities, wikidata_wbgetentities
+from graphbuilder import session_scope
+
+# Keyword patterns implying the node type requiring change. Every pattern needs an action verb next to the noun
+# (e.g. "appoints ... as CEO", not just "CEO") within one clause, as a bare noun says little about what changed.
+# Articles matching patterns of several node types (e.g. an acquisition and a product launch) are left to the LLM.
+NODE_TYPE_KEYWORDS = {
+    "Manager": [
+        r"\b(appoints?|appointed|names?|named|hires?|hired|promotes?|promoted)\b[^,;]{0,60}\b(as|to) (the |its )?(new )?(CEO|CFO|COO|CTO|chief executive|chief financial officer|managing director)\b",
+        r"\b(appoints?|appointed|names?|named)\b[^,;]{0,60}\bnew (CEO|CFO|COO|CTO|chief executive)\b",
+        r"\b(CEO|CFO|COO|CTO|chief executive|managing director)\b[^,;]{0,40}\b(steps? down|stepped down|resigns?|resigned|retires?|retired|(is|was|will be) replaced)\b",
+    ],
+    "Board_Member": [
+        r"\b(appoints?|appointed|names?|named|elects?|elected|nominates?|nominated)\b[^,;]{0,60}\b(to|as) (the |its )?(supervisory board|board of directors|chair(man|woman|person)? of the (supervisory )?board)\b",
+        r"\b(joins?|joined) (the |its )?(supervisory board|board of directors)\b",
+        r"\b(supervisory board member|board member|chair(man|woman|person)? of the (supervisory )?board)\b[^,;]{0,40}\b(steps? down|stepped down|resigns?|resigned|retires?|retired)\b",
+    ],
+    "City": [
+        r"\b(moves?|moved|relocates?|relocated|relocating)\b (its |the )?(headquarters?|head office) (to|from)\b",
+        r"\b(headquarters?|head office)\b[^,;]{0,20}\b(moves?|moved|relocates?|relocated|will move) (to|from)\b",
+    ],
+    "Company": [
+        r"\b(acquires?|acquired|buys|bought|agrees? to (buy|acquire)|agreed to (buy|acquire)|takes? over|took over|completes? (the )?(acquisition|takeover) of|completed (the )?(acquisition|takeover) of|merges? with|merged with) (a |an |the )?((majority |minority |controlling |\d+(\.\d+)? ?% )?stake in )?(?-i:[A-Z])",
+        r"\b(sells?|sold|divests?|divested|spins? off|spun off)\b (its|a|the) (stake in|subsidiary|unit|division|business)\b",
+    ],
+    "StockMarketIndex": [
+        r"\b(joins?|joined|(is|was|will be) (added to|removed from|promoted to|relegated from|dropped from)|drops? out of|dropped out of) (the )?(DAX|MDAX|SDAX|TecDAX|Euro Stoxx 50|S&P 500)\b",
+    ],
+    "Industry_Field": [
+        r"\b(enters?|entered|exits?|exited|withdraws? from|withdrew from)\b (the )?[^,;]{0,30}\b(market|industry|sector)\b",
+    ],
+    "Product_or_Service": [
+        r"\b(launches?|launched|unveils?|unveiled|introduces?|introduced|discontinues?|discontinued)\b[^,;]{0,40}\b(products?|models?|services?|platforms?|drugs?|vehicles?|cars?|aircraft|apps?|software|chips?)\b",
+    ],
+}
+
+# Patterns of articles that are escalated to the LLM even if a node type pattern matches: financial news that
+# usually needs no change at all (share buybacks, results, dividends), references to the past and speculation.
+EXCLUSION_KEYWORDS = [
+    r"\b(buys? back|bought back|buybacks?|share repurchases?|repurchases?)\b",
+    r"\b(results|earnings|quarterly|dividends?|revenues?|profits?|guidance|forecasts?|outlook)\b",
+    r"\b(sales|shares|stocks?) (rose|fell|rises?|falls?|jumped|dropped|climbed|slumped)\b",
+    r"\b(former|formerly|years? (after|ago)|previously|reportedly|rumou?red|considers?|considering|plans? to|may|could|denies|denied)\b",
+]
+
+# Legal forms stripped from company names to derive the short names articles usually use
+_LEGAL_FORM_PATTERN = re.compile(
+    r"\s*(,|\s)\s*(AG & Co\. KGaA|SE & Co\. KGaA|& Co\. KGaA|KGaA|AG|SE|N\.V\.|GmbH|plc|Inc\.?|Holding)$")
+
+
+class PreClassifier:
+    """Resolves obvious articles locally, without the classify_article LLM call.
+
+    An article is resolved only if the match is unambiguous: it mentions exactly one tracked company
+    (by name or alias), matches the keyword patterns of exactly one node type, the company is named
+    in a sentence matching that node type, and no exclusion pattern (buybacks, results, dividends,
+    past events, speculation) matches. Everything else is escalated to the LLM, which is also the
+    only one that can answer node type "None" for articles requiring no change. Company
+    names are matched with one precompiled regex alternation over all aliases (longest alias first,
+    case-sensitive, on word boundaries), which is a single pass over the article regardless of the
+    number of companies.
+
+    Aliases come from the tracked company names themselves (with and without legal form, e.g.
+    "Adidas AG" and "Adidas") and can be extended with the names of the company nodes in the graph
+    (add_aliases_from_graph) and the Wikidata labels and aliases (add_aliases_from_wikidata). An
+    alias shared by several companies counts as a mention of all of them and therefore escalates.
+
+    Example:
+        >>> pre_classifier = PreClassifier(companies, included_nodes)
+        >>> pre_classifier.classify("Adidas AG appoints Bjørn Gulden as new CEO")
+        ('Adidas AG', 'Manager')
+        >>> pre_classifier.classify("Adidas and Puma announce a partnership")  # escalated
+        >>> pre_classifier.classify("BASF buys back shares")  # excluded, escalated
+    """
+
+    def __init__(self, companies: List[str], node_types: List[str],
+                 keywords: Optional[Dict[str, List[str]]] = None, exclusions: Optional[List[str]] = None):
+        self.companies = [company for company in companies if company != "None"]
+        self.node_types = node_types
+        self.stats = {"articles": 0, "resolved": 0, "no_company": 0, "ambiguous_company": 0, "no_node_type": 0,
+                      "ambiguous_node_type": 0, "excluded": 0, "company_not_in_match": 0}
+        self._stats_lock = threading.Lock()
+        self._aliases = {}  # alias -> set of tracked company names
+        self._company_pattern = None
+
+        keywords = keywords if keywords is not None else NODE_TYPE_KEYWORDS
+        self._node_type_patterns = [(node_type, re.compile("|".join(f"(?:{pattern})" for pattern in patterns),
+                                                           re.IGNORECASE | re.DOTALL))
+                                    for node_type, patterns in keywords.items() if node_type in node_types]
+        exclusions = exclusions if exclusions is not None else EXCLUSION_KEYWORDS
+        self._exclusion_pattern = re.compile("|".join(f"(?:{pattern})" for pattern in exclusions) or r"(?!)",
+                                             re.IGNORECASE)
+
+        for company in self.companies:
+            self.add_aliases(company, [company, _strip_legal_form(company)])
+
+    def add_aliases(self, company: str, aliases: Iterable[str]):
+        """Registers additional names under which a tracked company appears in articles."""
+        for alias in aliases:
+            if alias and len(alias) >= 2:
+                self._aliases.setdefault(alias, set()).add(company)
+        self._company_pattern = None
+
+    def add_aliases_from_graph(self, driver):
+        """Adds the names of the tracked companies' nodes in the graph, which are the Wikidata labels."""
+        ids = {wikidata_wbsearchentities(company): company for company in self.companies}
+        with session_scope(driver) as session:
+            records = session.run("MATCH (c:Company) WHERE c.wikidata_id IN $ids RETURN c.wikidata_id as id, "
+                                  "c.name as name", ids=list(ids))
+            for record in records:
+                self.add_aliases(ids[record["id"]], [record["name"], _strip_legal_form(record["name"] or "")])
+
+    def add_aliases_from_wikidata(self):
+        """Adds the English Wikidata labels and aliases of the tracked companies (served from the Wikidata cache)."""
+        for company in self.companies:
+            wikidata_id = wikidata_wbsearchentities(company)
+            if wikidata_id == "No wikidata entry found":
+                continue
+            entity = wikidata_wbgetentities(wikidata_id).get("entities", {}).get(wikidata_id, {})
+            names = [entity.get("labels", {}).get("en", {}).get("value")]
+            names += [alias.get("value") for alias in entity.get("aliases", {}).get("en", [])]
+            self.add_aliases(company, [name for name in names if name] +
+                             [_strip_legal_form(name) for name in names if name])
+
+    def classify(self, article: str) -> Optional[Tuple[str, str]]:
+        """Returns (tracked company name, node type) for an unambiguous article, None to escalate to the LLM."""
+        companies = self.find_companies(article)
+        node_types = self.find_node_types(article)
+
+        if len(companies) != 1:
+            reason = "no_company" if not companies else "ambiguous_company"
+        elif len(node_types) != 1:
+            reason = "no_node_type" if not node_types else "ambiguous_node_type"
+        elif self._exclusion_pattern.search(article):
+            reason = "excluded"
+        elif not self._names_company_in_match(article, next(iter(node_types))):
+            reason = "company_not_in_match"
+        else:
+            reason = "resolved"
+
+        with self._stats_lock:
+            self.stats["articles"] += 1
+            self.stats[reason] += 1
+
+        if reason != "resolved":
+            return None
+        return next(iter(companies)), next(iter(node_types))
+
+    def find_companies(self, article: str) -> Set[str]:
+        companies = set()
+        for match in self._get_company_pattern().finditer(article):
+            companies.update(self._aliases[match.group(0)])
+        return companies
+
+    def find_node_types(self, article: str) -> Set[str]:
+        return {node_type for node_type, pattern in self._node_type_patterns
+                if any(pattern.search(sentence) for sentence in _sentences(article))}
+
+    def avoidance_rate(self) -> float:
+        """Share of articles resolved without an LLM call."""
+        return self.stats["resolved"] / self.stats["articles"] if self.stats["articles"] else 0.0
+
+    def print_stats(self):
+        print(f"\n--- Pre-Classifier Statistics ---")
+        print(f"Articles: {self.stats['articles']}, resolved locally: {self.stats['resolved']} "
+              f"(LLM-call avoidance rate {self.avoidance_rate() * 100:.1f}%)")
+        print(f"Escalated: no company {self.stats['no_company']}, several companies {self.stats['ambiguous_company']}, "
+              f"no node type {self.stats['no_node_type']}, several node types {self.stats['ambiguous_node_type']}, "
+              f"excluded {self.stats['excluded']}, company not in the matching sentence "
+              f"{self.stats['company_not_in_match']}\n")
+
+    def _names_company_in_match(self, article: str, node_type: str) -> bool:
+        """Whether a sentence matching the node type also names the company, i.e. is about the company."""
+        pattern = dict(self._node_type_patterns)[node_type]
+        return any(pattern.search(sentence) and self._get_company_pattern().search(sentence)
+                   for sentence in _sentences(article))
+
+    def _get_company_pattern(self) -> re.Pattern:
+        if self._company_pattern is None:
+            aliases = sorted(self._aliases, key=len, reverse=True)
+            alternation = "|".join(re.escape(alias) for alias in aliases) or r"(?!)"
+            self._company_pattern = re.compile(r"(?<!\w)(?:" + alternation + r")(?!\w)")
+            print(Fore.BLUE + f"Pre-classifier matches {len(aliases)} aliases of {len(self.companies)} companies" +
+                  Style.RESET_ALL)
+        return self._company_pattern
+
+
+"""functions below are helper functions"""
+
+
+def _sentences(article: str) -> List[str]:
+    return [sentence for sentence in re.split(r"(?<=[.!?])\s+", article) if sentence]
+
+
+def _strip_legal_form(name: str) -> str:
+    """'Henkel AG & Co. KGaA' -> 'Henkel', 'Porsche Automobil Holding SE' -> 'Porsche Automobil'."""
+    stripped = name
+    while True:
+        shorter = _LEGAL_FORM_PATTERN.sub("", stripped)
+        if shorter == stripped or not shorter:
+            return stripped
+        stripped = shorter
@@ -0,0 +1,135 @@
+import threading
+import traceback
+from concurrent.futures import Future, ThreadPoolExecutor
+from colorama import Fore, Style
+from typing import Callable, Dict, List, Optional
+
+# Ways to handle a written update rejected by the LLM sanity check
+ON_REJECT_MODES = ("revert", "quarantine", "log")
+
+
+class SpeculativeSanityChecker:
+    """Runs the LLM sanity check of written updates in the background and compensates rejected ones.
+
+    Without it, the updater runs both sanity checks before writing and only prints their verdicts.
+    Once enabled, the formal sanity check alone gates the write and the update is applied right
+    away; the LLM check of the article is submitted to a thread pool and runs while the next articles
+    are processed. If it rejects the update, `compensate(written, on_reject, reason, driver)` undoes it
+    in a compensating transaction:
+
+    - "revert": created relationships (and nodes left without relationships) are deleted, ended
+      relationships are active again
+    - "quarantine": created relationships stay in the graph for manual review with `quarantined = true`
+      and the reasoning of the check as `quarantine_reason`, but every read of the updater (the triple
+      queries of graphbuilder and the NeighbourhoodCache) excludes them, so they no longer feed
+      prompts and sanity checks, and later articles cannot end them. Ended relationships are active again, the rejected end time is kept
+      as `quarantined_end_time`
+    - "log": the rejection is only printed and counted
+
+    The NeighbourhoodCache passed to submit is updated accordingly. Articles processed while a check
+    is still running may already have seen the speculative changes.
+    Call `wait()` before reading results that depend on the verdicts.
+
+    Example:
+        >>> speculative_checker.enable(driver, on_reject="quarantine")
+        >>> update_neo4j_graph(article, companies, node_types, nodes_to_include, driver)
+        >>> speculative_checker.wait()
+    """
+
+    def __init__(self, check: Callable[[List[Dict], List[Dict], Optional[List[Dict]], str], Dict],
+                 compensate: Callable[[Dict, str, str, object], None], max_workers: int = 4):
+        self.check = check
+        self.compensate = compensate
+        self.max_workers = max_workers
+        self.enabled = False
+        self.on_reject = "revert"
+        self.driver = None
+        self.stats = {"checks": 0, "accepted": 0, "rejected": 0, "compensated": 0, "failed": 0}
+        self._executor = None
+        self._futures = []
+        self._lock = threading.Lock()
+
+    def enable(self, driver, on_reject: str = "revert"):
+        """Turns speculative writes on. `driver` is used by the compensating transactions of the workers."""
+        if on_reject not in ON_REJECT_MODES:
+            raise ValueError(f"on_reject must be one of {ON_REJECT_MODES}, not '{on_reject}'")
+        self.driver = driver
+        self.on_reject = on_reject
+        self.enabled = True
+
+    def disable(self):
+        """Waits for the running checks and turns speculative writes off again."""
+        self.wait()
+        self.enabled = False
+
+    def submit(self, article: str, added: List[Dict], deleted: List[Dict], relevant_triples,
+               written: Dict, neighbourhood_cache=None) -> Future:
+        """Schedules the LLM sanity check of an update that has already been written.
+
+        Args:
+            article: Text of the article
+            added: Added triples
+            deleted: Deleted triples
+            relevant_triples: Existing triples the changes were determined from
+            written: Result of the write transaction, see graphupdater._write_changes
+            neighbourhood_cache: Optional NeighbourhoodCache invalidated for the touched nodes on compensation
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix="sanity-check")
+            future = self._executor.submit(self._check_and_compensate, article, added, deleted, relevant_triples,
+                                           written, neighbourhood_cache)
+            self._futures.append(future)
+        return future
+
+    def wait(self):
+        """Blocks until all submitted checks (and their compensations) are done."""
+        with self._lock:
+            futures, self._futures = self._futures, []
+        for future in futures:
+            future.result()
+
+    def print_stats(self):
+        print(f"\n--- Speculative Sanity Check Statistics ---")
+        print(f"LLM sanity checks: {self.stats['checks']} (accepted {self.stats['accepted']}, "
+              f"rejected {self.stats['rejected']}, failed {self.stats['failed']})")
+        print(f"Rejected updates handled with '{self.on_reject}': {self.stats['compensated']}\n")
+
+    def _check_and_compensate(self, article: str, added: List[Dict], deleted: List[Dict], relevant_triples,
+                              written: Dict, neighbourhood_cache=None):
+        try:
+            verdict = self.check(added, deleted, relevant_triples, article)
+        except Exception as e:
+            print(Fore.RED + f"Reasoning sanity check failed, keeping the update: {e}" + Style.RESET_ALL)
+            self._count("failed")
+            return
+
+        self._count("checks")
+        if verdict.get("correct_update"):
+            print(Fore.GREEN + "Reasoning sanity check: " + str(verdict) + Style.RESET_ALL)
+            self._count("accepted")
+            return
+
+        print(Fore.RED + "Reasoning sanity check: " + str(verdict) + Style.RESET_ALL)
+        self._count("rejected")
+        if self.on_reject == "log":
+            return
+        try:
+            self.compensate(written, self.on_reject, verdict.get("reasoning") or "", self.driver)
+        except Exception as e:
+            print(Fore.RED + f"Could not {self.on_reject} the rejected update: {e}" + Style.RESET_ALL)
+            traceback.print_exc()
+            self._count("failed")
+            return
+        self._count("compensated")
+
+        if neighbourhood_cache is not None:
+            for rel in written["created"]:
+                neighbourhood_cache.record_relationship_removed(rel["rel_id"])
+            for rel in written["ended"]:
+                neighbourhood_cache.record_relationship_ended(rel["rel_id"], "NA")
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
@@ -0,0 +1,198 @@
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Dict, Iterator, Optional
+
+
+class LatencyHistogram:
+    """Histogram of durations in exponentially growing buckets, with constant memory however many are recorded.
+
+    Bucket i holds durations up to smallest * growth ** i, and percentiles are interpolated within
+    their bucket, so their error is bounded by the bucket width (about 19% with the default growth of
+    2 ** 0.25). Count, total, min and max are exact.
+    """
+
+    def __init__(self, smallest: float = 1e-5, growth: float = 2 ** 0.25, bucket_count: int = 120):
+        self.smallest = smallest
+        self.growth = growth
+        self.buckets = [0] * bucket_count
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def record(self, seconds: float):
+        index = 0 if seconds <= self.smallest else math.ceil(math.log(seconds / self.smallest, self.growth))
+        self.buckets[min(index, len(self.buckets) - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, fraction: float) -> float:
+        """Duration below which the given fraction of the durations lies, interpolated within its bucket."""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(fraction * self.count))
+        seen = 0
+        for index, bucket in enumerate(self.buckets):
+            if seen + bucket >= rank:
+                lower = self.smallest * self.growth ** (index - 1) if index else 0.0
+                upper = self.smallest * self.growth ** index
+                estimate = lower + (upper - lower) * (rank - seen) / bucket
+                return min(max(estimate, self.min), self.max)
+            seen += bucket
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        return {"count": self.count, "total": self.total, "mean": self.mean(), "min": self.min if self.count else 0.0,
+                "p50": self.percentile(0.5), "p95": self.percentile(0.95), "p99": self.percentile(0.99),
+                "max": self.max}
+
+
+class Tracer:
+    """Lightweight spans around the stages of the update pipeline and its Wikidata, Neo4j and LLM calls.
+
+    `span(name)` times a block. Spans opened inside another span of the same thread become its
+    children and share its trace ID, so the spans of one article (root span "update article") form
+    a trace. The durations of all spans are aggregated into a LatencyHistogram per span name, and
+    the latest `max_spans` finished spans are kept for export, either as JSON (export_json) or in the
+    OpenTelemetry OTLP/JSON format (export_otlp), e.g. to load them into Jaeger.
+
+    Example:
+        >>> with tracer.span("classification", company="Adidas AG"):
+        ...     classify_article(...)
+        >>> tracer.print_stats()
+        >>> tracer.export_otlp("files/traces/update.otlp.json")
+    """
+
+    def __init__(self, max_spans: int = 10000, service_name: str = "kg-graph-updater"):
+        self.max_spans = max_spans
+        self.service_name = service_name
+        self.enabled = True
+        self._histograms = {}  # span name -> LatencyHistogram
+        self._spans = []  # finished spans, oldest first
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Optional[Dict]]:
+        """Times the enclosed block as a span; the yielded span dict takes further "attributes"."""
+        if not self.enabled:
+            yield None
+            return
+        stack = self._local.__dict__.setdefault("stack", [])
+        parent = stack[-1] if stack else None
+        span = {"name": name, "trace_id": parent["trace_id"] if parent else _new_id(16), "span_id": _new_id(8),
+                "parent_id": parent["span_id"] if parent else None, "start_ns": time.time_ns(),
+                "attributes": attributes, "error": None}
+        stack.append(span)
+        start = time.perf_counter()
+        try:
+            yield span
+        except Exception as e:
+            span["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            stack.pop()
+            span["end_ns"] = span["start_ns"] + int(duration * 1e9)
+            self._record(span, duration)
+
+    def traced(self, name: str):
+        """Decorator running every call of a function in a span."""
+        def decorator(function):
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """{span name: {"count", "total", "mean", "min", "p50", "p95", "p99", "max"}} in seconds."""
+        with self._lock:
+            return {name: histogram.summary() for name, histogram in self._histograms.items()}
+
+    def print_stats(self):
+        print(f"\n--- Tracing Statistics (seconds) ---")
+        for name, stats in sorted(self.summary().items(), key=lambda item: -item[1]["total"]):
+            print(f"{name}: {stats['count']} spans, total {stats['total']:.2f}, p50 {stats['p50']:.3f}, "
+                  f"p95 {stats['p95']:.3f}, p99 {stats['p99']:.3f}, max {stats['max']:.3f}")
+        print()
+
+    def export_json(self, filepath: str):
+        """Writes the per span name summary and the kept spans as plain JSON."""
+        with self._lock:
+            spans = list(self._spans)
+        _write_json(filepath, {"summary": self.summary(), "spans": spans})
+
+    def export_otlp(self, filepath: str):
+        """Writes the kept spans as an OTLP/JSON trace export (resourceSpans), readable by OpenTelemetry tools."""
+        with self._lock:
+            spans = list(self._spans)
+        _write_json(filepath, {"resourceSpans": [{
+            "resource": {"attributes": [_otlp_attribute("service.name", self.service_name)]},
+            "scopeSpans": [{"scope": {"name": "tracing"}, "spans": [_otlp_span(span) for span in spans]}],
+        }]})
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+            self._spans = []
+
+    def _record(self, span: Dict, duration: float):
+        with self._lock:
+            self._histograms.setdefault(span["name"], LatencyHistogram()).record(duration)
+            self._spans.append(span)
+            if len(self._spans) > self.max_spans:
+                del self._spans[:len(self._spans) - self.max_spans]
+
+
+# Tracer shared by the updater, the graph helpers, the Wikidata cache and the LLM backends
+tracer = Tracer()
+
+"""functions below are helper functions"""
+
+
+def _new_id(length: int) -> str:
+    return os.urandom(length).hex()
+
+
+def _otlp_span(span: Dict) -> Dict:
+    otlp_span = {"traceId": span["trace_id"], "spanId": span["span_id"], "name": span["name"],
+                 "kind": 1,  # SPAN_KIND_INTERNAL
+                 "startTimeUnixNano": str(span["start_ns"]), "endTimeUnixNano": str(span["end_ns"]),
+                 "attributes": [_otlp_attribute(key, value) for key, value in span["attributes"].items()],
+                 "status": {"code": 2, "message": span["error"]} if span["error"] else {"code": 1}}
+    if span["parent_id"]:
+        otlp_span["parentSpanId"] = span["parent_id"]
+    return otlp_span
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def _write_json(filepath: str, data: Dict):
+    directory = os.path.dirname(filepath)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(filepath, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
@@ -0,0 +1,125 @@
+import json
+import math
+import re
+import threading
+from colorama import Fore, Style
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Words too common in articles and node names to indicate relevance
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have", "in", "is", "it", "its", "of",
+    "on", "or", "that", "the", "to", "was", "were", "will", "with", "ag", "se", "inc", "group", "company",
+}
+
+# Words of an article hinting at the relationship types it is about
+_RELATIONSHIP_CUES = {
+    "IS_MANAGED_BY": ["ceo", "chief", "executive", "manager", "management", "appoint", "resign", "step"],
+    "HAS_BOARD_MEMBER": ["board", "chairman", "chairwoman", "supervisory", "director"],
+    "WAS_FOUNDED_BY": ["founder", "founded"],
+    "HAS_HEADQUARTER_IN": ["headquarter", "headquarters", "relocate", "move", "moves", "moved"],
+    "OWNS": ["acquire", "acquires", "acquired", "acquisition", "buy", "buys", "bought", "stake", "subsidiary",
+             "divest", "sell", "sells", "sold", "merger"],
+    "PARTNERS_WITH": ["partner", "partners", "partnership", "cooperation", "joint", "venture", "alliance"],
+    "IS_ACTIVE_IN": ["industry", "sector", "market", "business"],
+    "OFFERS": ["product", "products", "launch", "launches", "service", "model", "brand", "unveil"],
+    "IS_LISTED_IN": ["index", "dax", "listed", "listing", "stock", "exchange"],
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of a prompt fragment (about four characters per token for English text and JSON)."""
+    return _tokens_of_length(len(text))
+
+
+class TripleContextBuilder:
+    """Selects the existing triples passed to the LLM together with an article.
+
+    The triples are ranked by their similarity to the article and added best first until
+    `token_budget` (estimated with estimate_tokens on the serialized triples) is reached. The default
+    similarity is lexical: words of the connected node's name found in the article, plus a smaller
+    weight for article words hinting at the relationship type. Any other scoring, e.g. cosine
+    similarity of embeddings, can be passed as `similarity(article, triple) -> float`.
+
+    Ended relationships should not be passed in at all (get_relationship_triples with
+    active_only=True); they cannot be changed by an article anymore.
+
+    The updater diffs the LLM's answer only against the selected triples, so relationships that did
+    not make it into the context are neither shown to the LLM nor deleted.
+    """
+
+    def __init__(self, token_budget: int = 1500, max_triples: Optional[int] = None,
+                 similarity: Optional[Callable[[str, Dict], float]] = None, verbose: bool = True):
+        self.token_budget = token_budget
+        self.max_triples = max_triples
+        self.similarity = similarity or lexical_similarity
+        self.verbose = verbose
+        self.stats = {"calls": 0, "triples": 0, "selected_triples": 0, "full_tokens": 0, "context_tokens": 0}
+        self._lock = threading.Lock()
+
+    def build(self, article: str, triples: Optional[List[Dict]]) -> Tuple[Optional[List[Dict]], Dict]:
+        """Returns the triples to pass to the LLM (None if there are none) and a report of this call.
+
+        The report contains the number of triples (`triples`, `selected_triples`) and the estimated
+        tokens of all triples (`full_tokens`) and of the selected ones (`context_tokens`).
+        """
+        triples = triples or []
+        ranked = sorted(enumerate(triples), key=lambda item: (-self.similarity(article, item[1]), item[0]))
+
+        # characters of json.dumps(selected), kept up to date instead of re-serializing the list per triple
+        selected = []
+        context_chars = len("[]")
+        for _, triple in ranked:
+            if self.max_triples is not None and len(selected) >= self.max_triples:
+                break
+            triple_chars = len(json.dumps(triple, ensure_ascii=False)) + (len(", ") if selected else 0)
+            if _tokens_of_length(context_chars + triple_chars) > self.token_budget:
+                continue  # a shorter, lower ranked triple may still fit
+            selected.append(triple)
+            context_chars += triple_chars
+
+        # both estimated on the serialized list, so the selected triples never exceed all triples
+        report = {
+            "triples": len(triples),
+            "selected_triples": len(selected),
+            "full_tokens": estimate_tokens(json.dumps(triples, ensure_ascii=False)),
+            "context_tokens": estimate_tokens(json.dumps(selected, ensure_ascii=False)) if selected else 0,
+        }
+        with self._lock:
+            self.stats["calls"] += 1
+            for key, value in report.items():
+                self.stats[key] += value
+
+        if self.verbose:
+            print(Fore.BLUE + f"Triple context: {report['selected_triples']} of {report['triples']} triples, "
+                              f"~{report['context_tokens']} of ~{report['full_tokens']} tokens "
+                              f"(budget {self.token_budget})" + Style.RESET_ALL)
+        return (selected or None), report
+
+    def print_stats(self):
+        saved = self.stats["full_tokens"] - self.stats["context_tokens"]
+        print(f"\n--- Triple Context Statistics ---")
+        print(f"Calls: {self.stats['calls']}, triples passed to the LLM: {self.stats['selected_triples']} "
+              f"of {self.stats['triples']}")
+        print(f"Estimated context tokens: {self.stats['context_tokens']} instead of {self.stats['full_tokens']} "
+              f"({saved} saved)\n")
+
+
+def lexical_similarity(article: str, triple: Dict) -> float:
+    """Scores how likely an article concerns a triple, based on shared words and relationship cues."""
+    article_words = _words(article)
+    node_words = _words(triple.get("node_to", ""))  # node_from is the company the article is about anyway
+    overlap = len(node_words & article_words) / math.sqrt(len(node_words)) if node_words else 0.0
+    cues = _RELATIONSHIP_CUES.get(triple.get("relationship"), [])
+    cue_hits = sum(1 for cue in cues if cue in article_words)
+    return 2.0 * overlap + 0.5 * min(cue_hits, 2)
+
+
+"""functions below are helper functions"""
+
+
+def _tokens_of_length(characters: int) -> int:
+    return math.ceil(characters / 4)
+
+
+def _words(text: str) -> set:
+    return {word for word in re.findall(r"\w+", text.lower()) if word not in _STOPWORDS and len(word) > 1}
@@ -0,0 +1,116 @@
+import threading
+from colorama import Fore, Style
+from typing import Callable, Dict, List, Optional, Tuple
+
+from graphbuilder import RELATIONSHIP_LABELS, session_scope
+
+NODE_LABEL_BY_NAME_QUERY = """
+    MATCH (n) WHERE n.name = $name
+    RETURN labels(n)[0] as label
+    LIMIT 1
+"""
+
+
+class TypeResolver:
+    """Determines the node types of a triple the updater is about to add, with as few LLM calls as possible.
+
+    Each side of the triple is resolved by the first source that knows it:
+
+    1. graph: the label of an existing node with that name (neighbourhood cache first, then Neo4j)
+    2. schema: the label implied by the relationship type (RELATIONSHIP_LABELS), e.g. IS_MANAGED_BY
+       always points from a Company to a Manager
+    3. cache: the type this name has been resolved to before
+    4. llm: `llm_fallback(triple, nodes_to_include)`, e.g. graphupdater.determine_triple_types, only
+       called if a side is still unresolved
+
+    Only types contained in nodes_to_include are accepted from any source. Resolved names are cached
+    per process, the cache and the statistics are thread-safe.
+    """
+
+    def __init__(self, llm_fallback: Optional[Callable[[Dict, List[str]], Tuple[Optional[str], Optional[str]]]] = None):
+        self.llm_fallback = llm_fallback
+        self.stats = {"graph": 0, "schema": 0, "cache": 0, "llm": 0, "unresolved": 0, "llm_calls": 0}
+        self._names = {}  # node name -> node type
+        self._lock = threading.Lock()
+
+    def resolve(self, triple: Dict, nodes_to_include: List[str], driver=None,
+                neighbourhood_cache=None) -> Tuple[Optional[str], Optional[str]]:
+        """Returns (type of node_from, type of node_to), None for a side no source could resolve.
+
+        Args:
+            triple: {'node_from', 'relationship', 'node_to'}
+            nodes_to_include: Allowed node types
+            driver: Neo4j driver, session or transaction for label lookups, None to skip the graph
+            neighbourhood_cache: Optional NeighbourhoodCache serving label lookups locally
+        """
+        schema_labels = RELATIONSHIP_LABELS.get(triple.get("relationship"), (None, None))
+        types = []
+        for name, schema_label in zip((triple["node_from"], triple["node_to"]), schema_labels):
+            node_type, source = self._resolve_locally(name, schema_label, nodes_to_include, driver,
+                                                      neighbourhood_cache)
+            types.append(node_type)
+            if source:
+                self._count(source)
+
+        if None in types and self.llm_fallback is not None:
+            self._count("llm_calls")
+            llm_types = self.llm_fallback(triple, nodes_to_include) or (None, None)
+            for index, llm_type in enumerate(llm_types):
+                if types[index] is None and llm_type in nodes_to_include:
+                    types[index] = llm_type
+                    self._count("llm")
+
+        for name, node_type in zip((triple["node_from"], triple["node_to"]), types):
+            if node_type is None:
+                self._count("unresolved")
+            else:
+                with self._lock:
+                    self._names[name] = node_type
+        return types[0], types[1]
+
+    def forget(self, name: str = None):
+        """Drops the cached type of one name, or all of them."""
+        with self._lock:
+            if name is None:
+                self._names.clear()
+            else:
+                self._names.pop(name, None)
+
+    def print_stats(self):
+        resolved = sum(self.stats[source] for source in ("graph", "schema", "cache", "llm"))
+        print(f"\n--- Node Type Resolution Statistics ---")
+        print(f"Node types resolved: {resolved} (graph {self.stats['graph']}, schema {self.stats['schema']}, "
+              f"cache {self.stats['cache']}, LLM {self.stats['llm']}), unresolved: {self.stats['unresolved']}")
+        print(f"LLM calls: {self.stats['llm_calls']}\n")
+
+    def _resolve_locally(self, name: str, schema_label: Optional[str], nodes_to_include: List[str], driver,
+                         neighbourhood_cache) -> Tuple[Optional[str], Optional[str]]:
+        graph_label = self._graph_label(name, driver, neighbourhood_cache)
+        if graph_label in nodes_to_include:
+            return graph_label, "graph"
+        if schema_label in nodes_to_include:
+            return schema_label, "schema"
+        with self._lock:
+            cached = self._names.get(name)
+        if cached in nodes_to_include:
+            return cached, "cache"
+        return None, None
+
+    def _graph_label(self, name: str, driver, neighbourhood_cache) -> Optional[str]:
+        if neighbourhood_cache is not None:
+            node_id = neighbourhood_cache.find_node_id(name)
+            if node_id:
+                return (neighbourhood_cache.find_node(node_id) or {}).get("label")
+        if driver is None:
+            return None
+        try:
+            with session_scope(driver) as session:
+                record = session.run(NODE_LABEL_BY_NAME_QUERY, name=name).single()
+            return record["label"] if record else None
+        except Exception as e:
+            print(Fore.YELLOW + f"Could not look up the label of '{name}': {e}" + Style.RESET_ALL)
+            return None
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
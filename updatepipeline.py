@@ -0,0 +1,207 @@
+import queue
+import threading
+import time
+import traceback
+from colorama import Fore, Style
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+
+from graphupdater import classify_article, update_company_neighbourhood
+from llmaccounting import llm_accounting
+from tracing import tracer
+
+# (key, article text), the key is handed back with the result, e.g. (company, article number)
+ArticleItem = Tuple[Any, str]
+
+
+class ConcurrentUpdatePipeline:
+    """Updates the graph from many articles with a pool of worker threads.
+
+    Every article runs through two stages:
+
+    1. classification (classify_article), which only talks to the LLM and runs fully concurrently
+    2. the company segment (update_company_neighbourhood): retrieving the company's triples, the LLM
+       diff and the graph writes. It is serialized per company, so updates of one neighbourhood are
+       never interleaved, while articles about different companies proceed in parallel.
+
+    Articles are fed through a bounded queue: `run` blocks once `queue_size` articles are waiting, so
+    a large (or streamed) input never piles up in memory ahead of the workers.
+
+    With `deterministic=True`, the company segments of articles about the same company run in input
+    order, which makes the resulting graph independent of LLM latencies. An article then waits until
+    all earlier articles have been classified and the earlier ones about its company are written.
+    Without it, articles about the same company are written in the order their classification finishes.
+
+    Results are always returned in input order.
+
+    Example:
+        >>> pipeline = ConcurrentUpdatePipeline(companies, included_nodes, included_nodes, driver,
+        ...                                     neighbourhood_cache, max_workers=8, deterministic=True)
+        >>> results = pipeline.run([(("Adidas AG", "1"), "Adidas AG appoints ...")])
+    """
+
+    def __init__(self, companies: List[str], node_types: List[str], nodes_to_include: List[str], driver,
+                 neighbourhood_cache=None, max_workers: int = 8, queue_size: int = 32, deterministic: bool = False,
+                 preclassifier=None):
+        # classify_article appends "None" to these lists, do it once here instead of concurrently in the workers
+        self.companies = list(companies) + ([] if "None" in companies else ["None"])
+        self.node_types = list(node_types) + ([] if "None" in node_types else ["None"])
+        self.nodes_to_include = nodes_to_include
+        self.driver = driver
+        self.neighbourhood_cache = neighbourhood_cache
+        self.max_workers = max_workers
+        self.queue_size = queue_size
+        self.deterministic = deterministic
+        self.preclassifier = preclassifier
+        self.stats = {}
+
+        self._company_locks = {}
+        self._company_locks_lock = threading.Lock()
+        self._order = threading.Condition()  # guards the ordering state of deterministic mode below
+        self._classified = {}  # sequence number -> company, for classified articles from _first_unclassified on
+        self._first_unclassified = 0  # all articles before this sequence number are classified
+        self._unwritten = {}  # company -> sequence numbers classified for it whose company segment is not done
+
+    def run(self, articles: Iterable[ArticleItem], on_result: Optional[Callable[[Any, Tuple], None]] = None,
+            keep_results: bool = True) -> List[Tuple[Any, Tuple]]:
+        """Processes all articles and returns [(key, (added, deleted, unchanged)), ...] in input order.
+
+        Args:
+            articles: Iterable of (key, article text), consumed lazily
+            on_result: Optional callback called with (key, result) from the worker threads as soon as
+                an article is done, e.g. for progress reporting. It has to be thread-safe. Exceptions it
+                raises are printed and the article is counted as failed.
+            keep_results: If False, results are only passed to on_result and an empty list is returned,
+                so memory stays constant for endless article streams
+
+        Articles whose processing raised an exception get the exception as result instead of a tuple.
+        """
+        work_queue = queue.Queue(maxsize=self.queue_size)
+        results = {}
+        results_lock = threading.Lock()
+        self._classified.clear()
+        self._first_unclassified = 0
+        self._unwritten.clear()
+        self.stats = {"articles": 0, "failed": 0, "queue_waits": 0, "classification_seconds": 0.0,
+                      "company_segment_seconds": 0.0, "lock_wait_seconds": 0.0}
+        stats_lock = threading.Lock()
+
+        def worker():
+            while True:
+                item = work_queue.get()
+                if item is None:
+                    work_queue.task_done()
+                    return
+                sequence, key, article = item
+                try:
+                    result = self._process(sequence, article, stats_lock)
+                except Exception as e:
+                    print(Fore.RED + f"Error while updating the graph from article {key}: {e}" + Style.RESET_ALL)
+                    traceback.print_exc()
+                    result = e
+                    with stats_lock:
+                        self.stats["failed"] += 1
+                    self._mark_written(sequence, None)
+                if keep_results:
+                    with results_lock:
+                        results[sequence] = (key, result)
+                if on_result is not None:
+                    try:
+                        on_result(key, result)
+                    except Exception as e:
+                        # a failing callback must not kill the worker, the producer would block on the full queue
+                        print(Fore.RED + f"Error in on_result for article {key}: {e}" + Style.RESET_ALL)
+                        traceback.print_exc()
+                        if not isinstance(result, Exception):  # failed articles are already counted
+                            with stats_lock:
+                                self.stats["failed"] += 1
+                work_queue.task_done()
+
+        workers = [threading.Thread(target=worker, name=f"update-worker-{index}", daemon=True)
+                   for index in range(self.max_workers)]
+        for thread in workers:
+            thread.start()
+
+        start_time = time.perf_counter()
+        sequence = -1
+        for sequence, (key, article) in enumerate(articles):
+            if work_queue.full():
+                self.stats["queue_waits"] += 1
+            work_queue.put((sequence, key, article))  # blocks while the queue is full (backpressure)
+        for _ in workers:
+            work_queue.put(None)
+        for thread in workers:
+            thread.join()
+
+        self.stats["articles"] = sequence + 1
+        self.stats["seconds"] = time.perf_counter() - start_time
+        return [results[index] for index in range(sequence + 1)] if keep_results else []
+
+    def print_stats(self):
+        articles, seconds = self.stats.get("articles", 0), self.stats.get("seconds", 0.0)
+        print(f"\n--- Update Pipeline Statistics ---")
+        print(f"Articles: {articles} ({self.stats.get('failed', 0)} failed) with {self.max_workers} workers, "
+              f"deterministic order: {self.deterministic}")
+        if seconds > 0:
+            print(f"Wall time: {seconds:.1f}s ({articles / seconds * 60:.1f} articles/min)")
+        print(f"Time in classification: {self.stats.get('classification_seconds', 0.0):.1f}s, "
+              f"in company segments: {self.stats.get('company_segment_seconds', 0.0):.1f}s, "
+              f"waiting for company locks: {self.stats.get('lock_wait_seconds', 0.0):.1f}s")
+        print(f"Producer blocked on a full queue: {self.stats.get('queue_waits', 0)} times\n")
+
+    def _process(self, sequence: int, article: str, stats_lock: threading.Lock) -> Tuple:
+        with tracer.span("update article"), llm_accounting.article():
+            return self._process_article(sequence, article, stats_lock)
+
+    def _process_article(self, sequence: int, article: str, stats_lock: threading.Lock) -> Tuple:
+        start_time = time.perf_counter()
+        with tracer.span("classification"):
+            company, node_type = classify_article(article, self.companies, self.node_types, 1, 3,
+                                                  self.preclassifier)
+        classified_time = time.perf_counter()
+
+        if self.deterministic:
+            self._wait_for_turn(sequence, company)
+        company_lock = self._get_company_lock(company)
+        with company_lock:
+            locked_time = time.perf_counter()
+            try:
+                result = update_company_neighbourhood(article, company, node_type, self.nodes_to_include,
+                                                      self.driver, self.neighbourhood_cache)
+            finally:
+                self._mark_written(sequence, company)
+        end_time = time.perf_counter()
+
+        with stats_lock:
+            self.stats["classification_seconds"] += classified_time - start_time
+            self.stats["lock_wait_seconds"] += locked_time - classified_time
+            self.stats["company_segment_seconds"] += end_time - locked_time
+        return result
+
+    def _get_company_lock(self, company: str) -> threading.Lock:
+        with self._company_locks_lock:
+            return self._company_locks.setdefault(company, threading.Lock())
+
+    def _wait_for_turn(self, sequence: int, company: str):
+        """Blocks until all earlier articles are classified and the earlier ones about `company` are written."""
+        with self._order:
+            self._register_classification(sequence, company)
+            self._order.wait_for(lambda: self._first_unclassified >= sequence and
+                                 min(self._unwritten[company]) == sequence)
+
+    def _mark_written(self, sequence: int, company: Optional[str]):
+        if not self.deterministic:
+            return
+        with self._order:
+            # Failed articles may not have been classified yet, they must not block later ones
+            if sequence >= self._first_unclassified and sequence not in self._classified:
+                self._register_classification(sequence, company)
+            self._unwritten.get(company, set()).discard(sequence)
+            self._order.notify_all()
+
+    def _register_classification(self, sequence: int, company: Optional[str]):
+        self._classified[sequence] = company
+        self._unwritten.setdefault(company, set()).add(sequence)
+        while self._first_unclassified in self._classified:
+            del self._classified[self._first_unclassified]
+            self._first_unclassified += 1
+        self._order.notify_all()
@@ -1,3 +1,4 @@
+import asyncio
 from typing import Dict, Any
 from colorama import Fore, Style
 import json
@@ -38,7 +39,7 @@ def wikidata_wbsearchentities(query_string: str, id_or_name: str = 'id') -> str:
 
     data = wikidata_cache.get_data('wbsearchentities', query_string, params)
 
-    if not data['search']:
+    if not data.get('search'):
         # print(Fore.YELLOW +f"No Wikidata entry found for: {query_string}" + Style.RESET_ALL)
         return "No wikidata entry found"
 
@@ -83,7 +84,7 @@ def wikidata_wbgetentities(entity_id: str, print_output: bool = False) -> Dict[s
         'ids': entity_id,
         'format': 'json',
         'languages': 'en',
-        'props': 'labels|claims'
+        'props': 'labels|aliases|claims'
     }
 
     data = wikidata_cache.get_data('wbgetentities', entity_id, params)
@@ -95,3 +96,17 @@ def wikidata_wbgetentities(entity_id: str, print_output: bool = False) -> Dict[s
         print(f"JSON data written to {filename}")
 
     return data
+
+
+async def wikidata_wbsearchentities_async(query_string: str, id_or_name: str = 'id') -> str:
+    """Asyncio variant of wikidata_wbsearchentities.
+
+    The lookup (and a possible HTTP request on a cache miss) runs in a worker thread,
+    so many searches can be awaited concurrently from the async graph builder.
+    """
+    return await asyncio.to_thread(wikidata_wbsearchentities, query_string, id_or_name)
+
+
+async def wikidata_wbgetentities_async(entity_id: str) -> Dict[str, Any]:
+    """Asyncio variant of wikidata_wbgetentities, see wikidata_wbsearchentities_async."""
+    return await asyncio.to_thread(wikidata_wbgetentities, entity_id)
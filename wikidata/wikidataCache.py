@@ -1,10 +1,12 @@
 import json
 import os
+import threading
 import warnings
 import time
-import requests
 from typing import Dict
 
+from tracing import LatencyHistogram, tracer
+
 os.environ['GRPC_VERBOSITY'] = 'ERROR'
 
 
@@ -12,12 +14,27 @@ class WikidataCache:
     # Class-level counters
     cache_hits = 0
     internet_retrievals = 0
-    request_times = []
+    request_times = LatencyHistogram()  # bounded, unlike the list of all request times kept before
 
     def __init__(self, cache_file='files/wikidata_cache/wikidata.json'):
         self.cache_file = cache_file
-        self._ensure_cache_directory()
-        self.cache = self._load_cache()
+        self.offline = False  # if set, cache misses return an empty result instead of querying Wikidata
+        self._lock = threading.RLock()  # get_data is also called from the update pipeline's and the async builder's worker threads
+        self._cache = None  # loaded on first use, not at import time
+
+    @property
+    def cache(self) -> Dict:
+        """Cached responses by action and key, loaded from cache_file on first access."""
+        with self._lock:
+            if self._cache is None:
+                self._ensure_cache_directory()
+                self._cache = self._load_cache()
+            return self._cache
+
+    @cache.setter
+    def cache(self, cache_data: Dict):
+        with self._lock:
+            self._cache = cache_data
 
     def _init_cache_structure(self) -> Dict:
         cache = {
@@ -78,16 +95,19 @@ class WikidataCache:
             print(f"Error saving cache: {e}")
 
     def get_data(self, action: str, key: str, params: Dict) -> Dict:
-        if action not in self.cache:
-            self.cache[action] = {}
+        with self._lock:
+            if action not in self.cache:
+                self.cache[action] = {}
 
-        cache_dict = self.cache[action]
+            cache_dict = self.cache[action]
 
-        if key in cache_dict:
-            if print_update:
-                print(f"Retrieved from wikidata: {action} - {key}")
-            WikidataCache.cache_hits += 1
-            return cache_dict[key]
+            if key in cache_dict:
+                if print_update:
+                    print(f"Retrieved from wikidata: {action} - {key}")
+                WikidataCache.cache_hits += 1
+                return cache_dict[key]
+            if self.offline:
+                return {}
 
         # Time the request
         start_time = time.time()
@@ -95,22 +115,25 @@ class WikidataCache:
         # Make actual request
         time.sleep(
             0.0)  # no sleep time as this seems to be the fastest, no obvious punishment for making a lot of requests
-        result = _make_request(params)
+        with tracer.span("wikidata request", action=action):
+            result = _make_request(params)
 
         # result = _strip_results(result)
 
         # Calculate request time and store it
         request_time = time.time() - start_time
         # print(f"Request time: {request_time}")
-        WikidataCache.request_times.append(request_time)
+        with self._lock:  # concurrent callers share the histogram
+            WikidataCache.request_times.record(request_time)
 
         if print_update:
             print(f"Retrieved data from wikidata {action} - {key}")
         WikidataCache.internet_retrievals += 1
 
         # Store in wikidata
-        cache_dict[key] = result
-        self._save_cache()
+        with self._lock:
+            cache_dict[key] = result
+            self._save_cache()
         if print_update:
             print(f"Cached new result: {action} - {key}")
         return result
@@ -128,9 +151,9 @@ class WikidataCache:
             print(f"Which is a cache hit ratio of {cache_hit_ratio}%\n\n")
 
         if WikidataCache.internet_retrievals > 0:
-            avg_request_time = sum(WikidataCache.request_times) / len(WikidataCache.request_times)
-            max_request_time = max(WikidataCache.request_times)
-            min_request_time = min(WikidataCache.request_times)
+            avg_request_time = WikidataCache.request_times.mean()
+            max_request_time = WikidataCache.request_times.max
+            min_request_time = WikidataCache.request_times.min
             print(f"Average request time: {avg_request_time:.2f} seconds")
             print(f"Max request time: {max_request_time:.2f} seconds")
             print(f"Min request time: {min_request_time:.2f} seconds")
@@ -171,6 +194,8 @@ class WikidataCache:
 
 
 def _make_request(params: Dict) -> Dict:
+    import requests  # only needed on cache misses
+
     url = 'https://www.wikidata.org/w/api.php'
     try:
         result = requests.get(url, params=params).json()